@@ -0,0 +1,176 @@
+# backtest.py
+"""
+Backtest offline di prob_csv e della combinazione quota/storico sugli storici.
+
+    python backtest.py [--categoria calcio] [--since 2024-08-01]
+                       [--weights 0.4 0.2 5 5] [--api-weight 0.6] [--csv-weight 0.4]
+
+Le partite sono rigiocate in ordine di data: ognuna è valutata solo con le
+partite dei giorni precedenti. Gli aggregati per squadra sono somme
+cumulative calcolate in una passata per categoria, non un filtro dello
+storico per ogni partita.
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import bot
+import history_cache
+import odds_frame
+from schema import ODDS_COLUMNS
+from team_stats import PROB_CSV_WEIGHTS
+
+CALIBRATION_BINS = list(range(0, 101, 10))
+
+
+def _prior(df, keys: list, cols: list, prefix: str):
+    """Somme di cols per chiave (squadra o coppia) delle sole date precedenti a ogni riga."""
+    daily = df.groupby(keys + ["date"], sort=True, observed=True)[cols].sum()
+    before = daily.groupby(level=list(range(len(keys))), sort=False, observed=True).cumsum() - daily
+    before = before.add_prefix(prefix).reset_index()
+    return df[keys + ["date"]].merge(before, on=keys + ["date"], how="left").drop(columns=keys + ["date"])
+
+
+def replay(frame, weights=PROB_CSV_WEIGHTS):
+    """
+    Tabella canonica → stessa tabella (partite con data, in ordine) con
+    prob_csv calcolata come TeamStatsIndex.prob_csv sullo storico precedente
+    e history = partite precedenti usate (0 = nessuno storico).
+    """
+    df = frame[frame["date"].notna()].sort_values("date", kind="stable").reset_index(drop=True)
+    df = df.assign(
+        one=1,
+        win_h=(df["result"] == "H").fillna(False).astype(int),
+        win_a=(df["result"] == "A").fillna(False).astype(int),
+        hg=df["home_score"].astype("float64").fillna(0),
+        hg_cnt=df["home_score"].notna().astype(int),
+        ag=df["away_score"].astype("float64").fillna(0),
+        ag_cnt=df["away_score"].notna().astype(int),
+    )
+    goals = ["hg", "hg_cnt", "ag", "ag_cnt"]
+    h = _prior(df, ["home"], ["one", "win_h"] + goals, "h_")
+    a = _prior(df, ["away"], ["one", "win_a"] + goals, "a_")
+    p = _prior(df, ["home", "away"], ["one"], "p_")
+
+    # stesso sottoinsieme di _union: partite con home in casa OPPURE away in trasferta
+    total = (h["h_one"] + a["a_one"] - p["p_one"]).to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        home_win_rate = np.where(total > 0, h["h_win_h"] / total * 100, 0.0)
+        away_win_rate = np.where(total > 0, a["a_win_a"] / total * 100, 0.0)
+        home_scored = (h["h_hg"] / h["h_hg_cnt"]).to_numpy(dtype="float64")
+        home_conceded = (h["h_ag"] / h["h_ag_cnt"]).to_numpy(dtype="float64")
+        away_scored = (a["a_ag"] / a["a_ag_cnt"]).to_numpy(dtype="float64")
+        away_conceded = (a["a_hg"] / a["a_hg_cnt"]).to_numpy(dtype="float64")
+
+    w_home, w_away, w_hgoals, w_agoals = weights
+    raw = (
+        home_win_rate * w_home +
+        (100 - away_win_rate) * w_away +
+        (home_scored - home_conceded) * w_hgoals +
+        (away_conceded - away_scored) * w_agoals
+    )
+    # come il bot: max(0, min(100, NaN)) vale 100
+    prob = np.where(np.isnan(raw), 100.0, np.clip(raw, 0, 100))
+    has_history = (h["h_one"] + a["a_one"]).to_numpy() > 0
+    df["prob_csv"] = np.where(has_history, prob, np.nan)
+    df["history"] = total
+    return df.drop(columns=["one", "win_h", "win_a", "hg", "hg_cnt", "ag", "ag_cnt"])
+
+
+def calibration(prob, outcome):
+    """Per fascia di prob_csv: partite, probabilità media prevista, frequenza reale."""
+    edges = CALIBRATION_BINS[:-1] + [100.01]   # 100 nell'ultima fascia
+    labels = [f"{lo}-{lo + 10}%" for lo in CALIBRATION_BINS[:-1]]
+    bins = pd.cut(prob, edges, right=False, labels=labels)
+    table = pd.DataFrame({"bin": bins, "prob": prob, "hit": outcome}).groupby("bin", observed=True).agg(
+        n=("hit", "size"), previsto=("prob", "mean"), reale=("hit", "mean"))
+    table["reale"] *= 100
+    return table
+
+
+def bets(df, api_weight: float, csv_weight: float):
+    """
+    Pronostici 1X2 che il bot avrebbe accettato alle quote registrate: come
+    analyze_matches valuta solo l'esito favorito (quota più bassa) di ogni
+    partita, con probabilità = quota e storico combinati e la stessa regola
+    di accettazione del bot (odds_frame.apply_thresholds con MIN_PROB/MIN_QUOTA).
+    Ritorna (puntate, vinte, profitto).
+    """
+    if not set(ODDS_COLUMNS) <= set(df.columns):
+        return 0, 0, 0.0
+    prices = df[ODDS_COLUMNS].astype("float64").to_numpy()
+    valid = (~np.isnan(prices)).sum(axis=1) >= 2   # il bot salta i mercati con meno di due esiti
+    fav = np.argmin(np.where(np.isnan(prices), np.inf, prices), axis=1)
+    price = prices[np.arange(len(df)), fav]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prob_api = np.round(100.0 / price, 1)
+    prob_csv = df["prob_csv"].to_numpy()
+    prob = np.where(np.isnan(prob_csv), prob_api, np.round(prob_api * api_weight + prob_csv * csv_weight, 1))
+    picks = odds_frame.apply_thresholds(pd.DataFrame({"probability": prob, "price": price}), bot.MIN_PROB, bot.MIN_QUOTA)
+    take = valid & (price > 0) & picks["accepted"].to_numpy()
+    result = df["result"].astype("string").fillna("").to_numpy(dtype=object)
+    hit = take & (result == np.array(["H", "D", "A"], dtype=object)[fav])
+    profit = float(np.sum(price[hit] - 1)) - float(take.sum() - hit.sum())
+    return int(take.sum()), int(hit.sum()), profit
+
+
+def run(categoria: str, args):
+    t0 = time.perf_counter()
+    frame = history_cache.load_category(categoria)
+    if frame is None or frame.empty:
+        print(f"\n[{categoria}] nessuno storico utilizzabile.")
+        return
+    df = replay(frame, tuple(args.weights))
+    t_replay = time.perf_counter() - t0
+    if args.since:
+        df = df[df["date"] >= pd.Timestamp(args.since)]
+    df = df[df["history"] >= args.min_history]
+    if df.empty:
+        print(f"\n[{categoria}] nessuna partita con storico precedente.")
+        return
+
+    home_win = (df["result"] == "H").fillna(False).to_numpy()
+    p = df["prob_csv"].to_numpy() / 100
+    brier = float(np.mean((p - home_win) ** 2))
+    base = home_win.mean()
+    brier_base = float(np.mean((base - home_win) ** 2))
+    hit = float(np.mean((p >= 0.5) == home_win)) * 100
+
+    print(f"\n[{categoria}] {len(df)} partite valutate ({df['date'].min():%Y-%m-%d} → {df['date'].max():%Y-%m-%d}), "
+          f"replay in {t_replay * 1000:.0f} ms")
+    print(f"  hit rate (casa sì/no con soglia 50%): {hit:5.1f}%")
+    print(f"  Brier vittoria casa                 : {brier:.4f} (base rate {base * 100:.1f}%: {brier_base:.4f})")
+    n, won, profit = bets(df, args.api_weight, args.csv_weight)
+    if n:
+        print(f"  puntate accettate alle quote storiche: {n}, vinte {won} ({won / n * 100:.1f}%), "
+              f"ROI {profit / n * 100:+.1f}%")
+    else:
+        print("  ROI: n/d (nessuna quota registrata nei file o nessuna puntata sopra soglia)")
+    print("  calibrazione prob_csv → vittoria casa:")
+    for interval, row in calibration(df["prob_csv"], home_win).iterrows():
+        print(f"    {interval:>8}: {int(row['n']):6d} partite, previsto {row['previsto']:5.1f}%, reale {row['reale']:5.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    registry = history_cache.HistoryRegistry(bot.SPORTS.keys(), bot._category_for_sport)
+    groups = dict(registry.categories())
+    parser.add_argument("--categoria", action="append", choices=sorted(groups),
+                        help="categoria da valutare (ripetibile; default tutte)")
+    parser.add_argument("--since", help="valuta solo le partite da questa data (AAAA-MM-GG)")
+    parser.add_argument("--weights", type=float, nargs=4, default=list(PROB_CSV_WEIGHTS),
+                        metavar=("CASA", "OSPITE", "GOL_CASA", "GOL_OSPITE"), help="pesi di prob_csv")
+    parser.add_argument("--api-weight", type=float, default=0.6, help="peso della quota nella probabilità finale")
+    parser.add_argument("--csv-weight", type=float, default=0.4, help="peso dello storico nella probabilità finale")
+    parser.add_argument("--min-history", type=int, default=1, help="partite precedenti minime per valutare")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    for categoria in args.categoria or groups:
+        run(categoria, args)
+    print(f"\nTotale: {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# benchmark.py
+"""
+Micro-benchmark delle parti calde della pipeline.
+
+    python benchmark.py team_stats [--markets 80]
+    python benchmark.py engine [--events 500] [--bookmakers 20] [--goals] [--priors]
+    python benchmark.py job [--slates small medium large] [--bookmakers 20] [--repeat 1]
+"""
+import os
+import sys
+import json
+import time
+import math
+import argparse
+import logging
+import random
+import datetime
+import tempfile
+
+import bot
+import goal_model
+import history_cache
+import league_priors
+import metrics
+import odds_client
+import stand_in
+import telegram_queue
+from dedup_store import DedupStore
+from odds_history import OddsHistory
+from team_stats import TeamStatsIndex, REQUIRED_COLUMNS
+
+
+def _prob_csv_scan(hist_df, home: str, away: str):
+    """Vecchia implementazione: scansione completa di hist_df per ogni mercato."""
+    team_matches = hist_df[(hist_df['home'] == home) | (hist_df['away'] == away)]
+    if team_matches.empty:
+        return None
+    total_matches = len(team_matches)
+    home_wins = len(team_matches[(team_matches['home'] == home) & (team_matches['result'] == 'H')])
+    away_wins = len(team_matches[(team_matches['away'] == away) & (team_matches['result'] == 'A')])
+    home_win_rate = (home_wins / total_matches) * 100
+    away_win_rate = (away_wins / total_matches) * 100
+    home_goals_scored   = team_matches.loc[team_matches['home'] == home, 'home_score'].mean()
+    home_goals_conceded = team_matches.loc[team_matches['home'] == home, 'away_score'].mean()
+    away_goals_scored   = team_matches.loc[team_matches['away'] == away, 'away_score'].mean()
+    away_goals_conceded = team_matches.loc[team_matches['away'] == away, 'home_score'].mean()
+    prob_csv = (
+        (home_win_rate * 0.4) +
+        ((100 - away_win_rate) * 0.2) +
+        ((home_goals_scored - home_goals_conceded) * 5) +
+        ((away_goals_conceded - away_goals_scored) * 5)
+    )
+    return max(0, min(100, prob_csv))
+
+
+def bench_team_stats(args):
+    """Confronta scansione per mercato vs indice (build + lookup per partita) su data/calcio."""
+    markets = args.markets
+    hist_df = bot.load_historical_data("soccer_epl")
+    if hist_df is None or not REQUIRED_COLUMNS.issubset(hist_df.columns):
+        print("Nessuno storico calcio utilizzabile in data/calcio.")
+        return
+
+    pairs = hist_df[["home", "away"]].dropna().drop_duplicates().head(50)
+    fixtures = list(pairs.itertuples(index=False, name=None))
+
+    t0 = time.perf_counter()
+    old = {}
+    for home, away in fixtures:
+        for _ in range(markets):
+            old[(home, away)] = _prob_csv_scan(hist_df, home, away)
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    index = TeamStatsIndex.build(hist_df)
+    t_build = time.perf_counter() - t0
+    new = {}
+    for home, away in fixtures:
+        new[(home, away)] = index.prob_csv(home, away)
+    t_new = time.perf_counter() - t0
+
+    mismatch = [
+        k for k in fixtures
+        if not (old[k] == new[k] or (isinstance(old[k], float) and math.isclose(old[k], new[k])))
+    ]
+    print(f"Storico: {len(hist_df)} righe, {len(fixtures)} partite x {markets} mercati")
+    print(f"  scansione DataFrame : {t_old * 1000:9.1f} ms")
+    print(f"  indice (build {t_build * 1000:.1f} ms): {t_new * 1000:9.1f} ms")
+    print(f"  speedup             : {t_old / t_new:9.1f}x")
+    print(f"  risultati diversi   : {len(mismatch)}")
+
+
+class _MemoryDedup:
+    """Dedup in memoria: il benchmark misura l'analisi, non SQLite."""
+
+    def __init__(self):
+        self.ids = set()
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def add(self, key, commence_time):
+        if key in self.ids:
+            return False
+        self.ids.add(key)
+        return True
+
+    def prune(self):
+        pass
+
+
+def make_payload(sport: str, n_events: int, n_bookmakers: int = 20, seed: int = 0, now=None, teams=None):
+    """Payload sintetico nel formato /v4/sports/<sport>/odds, partite entro 48h."""
+    rnd = random.Random(seed)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    teams = teams or [f"Team {i}" for i in range(40)]
+    soccer = sport.startswith("soccer_")
+    events = []
+    for e in range(n_events):
+        home, away = rnd.sample(teams, 2)
+        start = now + datetime.timedelta(minutes=rnd.randint(10, 47 * 60))
+        bookmakers = []
+        for b in range(n_bookmakers):
+            p_home = rnd.uniform(0.2, 0.7)
+            vig = rnd.uniform(1.03, 1.08)
+
+            def price(p):
+                return round(1 / (p * vig), 2)
+
+            markets = []
+            if soccer:
+                p_draw = rnd.uniform(0.2, 0.3)
+                p_away = max(0.05, 1 - p_home - p_draw)
+                markets.append({"key": "h2h", "outcomes": [
+                    {"name": home, "price": price(p_home)},
+                    {"name": away, "price": price(p_away)},
+                    {"name": "Draw", "price": price(p_draw)}]})
+                p_btts = rnd.uniform(0.4, 0.65)
+                markets.append({"key": "btts", "outcomes": [
+                    {"name": "Yes", "price": price(p_btts)}, {"name": "No", "price": price(1 - p_btts)}]})
+                p_over = rnd.uniform(0.4, 0.6)
+                markets.append({"key": "totals", "outcomes": [
+                    {"name": "Over", "price": price(p_over), "point": 2.5},
+                    {"name": "Under", "price": price(1 - p_over), "point": 2.5},
+                    {"name": "Over", "price": price(p_over - 0.15), "point": 3.5},
+                    {"name": "Under", "price": price(1.15 - p_over), "point": 3.5}]})
+                markets.append({"key": "spreads", "outcomes": [
+                    {"name": home, "price": price(0.5), "point": -0.5},
+                    {"name": away, "price": price(0.5), "point": 0.5}]})
+            else:
+                markets.append({"key": "h2h", "outcomes": [
+                    {"name": home, "price": price(p_home)}, {"name": away, "price": price(1 - p_home)}]})
+                p_over = rnd.uniform(0.4, 0.6)
+                point = rnd.choice([5.5, 8.5, 42.5, 220.5])
+                markets.append({"key": "totals", "outcomes": [
+                    {"name": "Over", "price": price(p_over), "point": point},
+                    {"name": "Under", "price": price(1 - p_over), "point": point}]})
+            bookmakers.append({"key": f"book{b}", "title": f"Book {b}", "markets": markets})
+        events.append({
+            "id": f"{sport}-{seed}-{e}",
+            "sport_key": sport,
+            "commence_time": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "home_team": home,
+            "away_team": away,
+            "bookmakers": bookmakers,
+        })
+    return events
+
+
+def bench_engine(args):
+    """Ciclo annidato vs motore vettoriale su un payload sintetico."""
+    sport = "soccer_italy_serie_a"
+    hist_df = bot.load_historical_data(sport)
+    stats = TeamStatsIndex.build(hist_df)
+    teams = sorted(set(stats.home)) if stats else None
+    payload = make_payload(sport, args.events, args.bookmakers, teams=teams)
+    goals = goal_model.GoalModel.fit(sport, hist_df) if args.goals and hist_df is not None else None
+    priors = league_priors.get_league_priors() if args.priors else None
+    if args.priors and priors is None:
+        print("Prior di lega assenti: eseguire prima python historical_analysis.py")
+
+    # storico quote in memoria: i pick accettati non finiscono nel database del bot
+    saved = bot.sent_predictions, bot.odds_history, bot.ANALYSIS_ENGINE
+    results, times = {}, {}
+    try:
+        for engine in ("loop", "vector"):
+            bot.sent_predictions = _MemoryDedup()
+            bot.odds_history = OddsHistory(":memory:")
+            bot.ANALYSIS_ENGINE = engine
+            t0 = time.perf_counter()
+            results[engine] = bot.analyze_matches(sport, payload, stats=stats, goals=goals, priors=priors)
+            times[engine] = time.perf_counter() - t0
+            if priors is not None:
+                tiers, priors.counters = priors.counters, dict.fromkeys(league_priors.TIERS, 0)
+    finally:
+        bot.sent_predictions, bot.odds_history, bot.ANALYSIS_ENGINE = saved
+
+    same = results["loop"] == results["vector"]
+    rows = sum(len(m["outcomes"]) for e in payload for b in e["bookmakers"] for m in b["markets"])
+    print(f"Payload: {args.events} partite x {args.bookmakers} bookmaker ({rows} esiti)")
+    print(f"  loop   : {times['loop'] * 1000:9.1f} ms")
+    print(f"  vector : {times['vector'] * 1000:9.1f} ms")
+    print(f"  speedup: {times['loop'] / times['vector']:9.1f}x")
+    print(f"  output identico: {same} ({len(results['loop'][0])} accettati, {len(results['loop'][1])} scartati)")
+    if priors is not None:
+        print(f"  livelli prior  : {tiers}")
+
+
+# Palinsesti del benchmark end-to-end: partite in totale, divise tra tutti gli SPORTS
+SLATES = {"small": 20, "medium": 200, "large": 2000}
+
+
+def _slate_teams() -> dict:
+    """Squadre reali dagli storici (cache Parquet) per sport, così l'analisi trova statistiche."""
+    teams = {}
+    registry = history_cache.HistoryRegistry(bot.SPORTS, bot._category_for_sport)
+    for categoria, sports in registry.categories():
+        history = registry.load(categoria)
+        if history.frame is None:
+            continue
+        for sport in sports:
+            league = history.league(sport)
+            names = sorted(set((history.frame if league is None else league)["home"].dropna()))
+            if len(names) >= 2:
+                teams[sport] = names[:40]
+    registry.release()
+    return teams
+
+
+def _run_job(server, workdir: str) -> dict:
+    """
+    Un job() completo contro lo stand-in: quote via HTTP, Telegram finto,
+    dedup/storico quote/cache quote/metriche in workdir (nessun credito, nessun
+    messaggio vero). Ritorna il report di metrics.
+    """
+    bot.ODDS_API_KEY, bot.TELEGRAM_TOKEN, bot.TELEGRAM_CHAT_ID = "bench", "bench", "bench"
+    odds_client.ODDS_API_BASE = server.odds_url
+    odds_client.ODDS_CACHE_DIR = os.path.join(workdir, "odds")
+    telegram_queue.TELEGRAM_API = server.base_url
+    telegram_queue.TELEGRAM_MIN_INTERVAL = 0.0
+    metrics.METRICS_DIR = os.path.join(workdir, "metrics")
+    bot._telegram_queue = None
+    bot.sent_predictions = DedupStore(os.path.join(workdir, "dedup.sqlite"))
+    bot.odds_history = OddsHistory(os.path.join(workdir, "odds_history.sqlite"))
+    bot.job()
+    with open(os.path.join(metrics.METRICS_DIR, "last_job.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def bench_job(args):
+    """job() completo (fetch HTTP → analisi → Telegram) su palinsesti sintetici, tutto in locale."""
+    teams = _slate_teams()
+    with stand_in.StandIn({}) as server:
+        with tempfile.TemporaryDirectory() as workdir:   # riscaldamento: cache storici, import, prior
+            _run_job(server, workdir)
+        for name in args.slates:
+            n_events = SLATES[name]
+            server.odds = stand_in.synthetic_slate(bot.SPORTS, n_events, args.bookmakers, teams=teams)
+            rows = sum(metrics.payload_counts(m)["outcomes"] for m in server.odds.values())
+            reports = []
+            for _ in range(args.repeat):
+                server.messages.clear()
+                with tempfile.TemporaryDirectory() as workdir:
+                    reports.append(_run_job(server, workdir))
+            best = min(reports, key=lambda r: r["duration_s"])
+            totals = {}
+            for st in best["stages"]:
+                totals[st["stage"]] = totals.get(st["stage"], 0.0) + st["ms"]
+            counters = {}
+            for c in best["counters"]:
+                counters[c["name"]] = counters.get(c["name"], 0) + c["value"]
+            print(f"{name}: {n_events} partite su {len(bot.SPORTS)} sport x {args.bookmakers} bookmaker ({rows} esiti)")
+            print(f"  job     : {best['duration_s'] * 1000:9.1f} ms (migliore di {args.repeat}, "
+                  f"picco RSS {best['peak_rss_mb']} MB)")
+            for stage, ms in sorted(totals.items(), key=lambda x: -x[1]):
+                note = " (somma delle richieste in parallelo)" if stage == "odds_request" else ""
+                print(f"    {stage:<15}: {ms:9.1f} ms{note}")
+            print(f"  accettati {counters.get('accepted', 0)}, scartati {counters.get('rejected', 0)}, "
+                  f"messaggi Telegram {len(server.messages)}")
+
+
+BENCHMARKS = {
+    "team_stats": bench_team_stats,
+    "engine": bench_engine,
+    "job": bench_job,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--markets", type=int, default=80, help="mercati per partita (team_stats)")
+    parser.add_argument("--events", type=int, default=500, help="partite nel payload sintetico (engine)")
+    parser.add_argument("--bookmakers", type=int, default=20, help="bookmaker per partita (engine)")
+    parser.add_argument("--goals", action="store_true", help="usa il modello gol per totals/BTTS (engine)")
+    parser.add_argument("--priors", action="store_true", help="usa i prior di lega di processed/ (engine)")
+    parser.add_argument("--slates", nargs="+", choices=list(SLATES), default=list(SLATES),
+                        help="palinsesti da misurare (job)")
+    parser.add_argument("--repeat", type=int, default=1, help="run per palinsesto, vale il migliore (job)")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    BENCHMARKS[args.name](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
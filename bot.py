@@ -1,44 +1,38 @@
 import os
 import time
 import logging
-import requests
+import threading
 import datetime
 import schedule
 import pandas as pd
-import glob
+
+import history_cache
+import historical_analysis
+import league_priors
+import metrics
+import odds_client
+import odds_frame
+import scheduler
+import telegram_commands
+from results_cache import ResultsCache
+from telegram_queue import TelegramQueue
+from dedup_store import DedupStore, prediction_key
+from odds_history import OddsHistory
+from sports import SPORTS, SPORT_PRIORITY
+from team_stats import TeamStatsIndex
 
 # 🔑 Variabili ambiente (Render → Environment)
 ODDS_API_KEY   = os.getenv("ODDS_API_KEY")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
-sent_predictions = set()  # evita duplicati
+sent_predictions = DedupStore()  # evita duplicati (persistente, scade al commence_time)
+odds_history = OddsHistory()     # snapshot delle quote: movimenti di linea e closing line value
+results = ResultsCache()         # ultime partite e pronostici per sport, letti dai comandi Telegram
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 
-# Sports da analizzare
-SPORTS = {
-    "soccer_italy_serie_a": "⚽ Serie A - Italia",
-    "soccer_italy_serie_b": "⚽ Serie B - Italia",
-    "soccer_spain_la_liga": "⚽ La Liga - Spagna",
-    "soccer_spain_segunda_division": "⚽ La Liga 2 - Spagna",
-    "soccer_epl": "⚽ Premier League - Inghilterra",
-    "soccer_efl_champ": "⚽ Championship - Inghilterra",
-    "soccer_germany_bundesliga": "⚽ Bundesliga - Germania",
-    "soccer_germany_bundesliga2": "⚽ Bundesliga 2 - Germania",
-    "soccer_france_ligue_one": "⚽ Ligue 1 - Francia",
-    "soccer_france_ligue_two": "⚽ Ligue 2 - Francia",
-    "soccer_uefa_champs_league": "⚽ Champions League",
-    "soccer_uefa_europa_league": "⚽ Europa League",
-    "basketball_nba": "🏀 NBA",
-    "americanfootball_nfl": "🏈 NFL",
-    "americanfootball_ncaaf": "🏈 NCAA Football",
-    "baseball_mlb": "⚾ MLB - Baseball",
-    "icehockey_nhl": "NHL - Hockey USA",
-    "tennis_atp_shanghai_masters": "ATP Shanghai Masters",
-}
-
 # --- CSV STORICI (Google Drive + GitHub + esterni) ---
 def _category_for_sport(sport_key: str) -> str:
     if sport_key.startswith("soccer_"):
@@ -61,35 +55,23 @@ def load_historical_data(sport_key: str):
       - data/<categoria>/ (GitHub)
       - downloads/<categoria>/ (Google Drive)
       - external_data/<categoria>/ (siti esterni)
+    Il frame concatenato è in cache Parquet (history_cache): i CSV
+    vengono riletti solo se cambia path, dimensione o mtime di un file.
     """
     categoria = _category_for_sport(sport_key)
-
-    paths = []
-    paths.extend(glob.glob(os.path.join("data", categoria, "*.csv")))
-    paths.extend(glob.glob(os.path.join("downloads", categoria, "*.csv")))
-    paths.extend(glob.glob(os.path.join("external_data", categoria, "*.csv")))
-
-    if not paths:
+    full = history_cache.load_category(categoria)
+    if full is None:
         logging.info(f"ℹ️ Nessun CSV trovato per {sport_key}.")
         return None
 
-    dfs = []
-    for p in paths:
-        try:
-            df = pd.read_csv(p)
-            if not df.empty:
-                dfs.append(df)
-        except Exception as e:
-            logging.warning(f"⚠️ Errore lettura {p}: {e}")
-
-    if not dfs:
-        return None
-
-    full = pd.concat(dfs, ignore_index=True)
-    logging.info(f"📂 Storici caricati per {sport_key}: {len(paths)} file, {len(full)} righe.")
+    logging.info(f"📂 Storici caricati per {sport_key}: {len(full)} righe.")
     return full
 # -----------------------------------------------------
 
+# Motore di analisi: "loop" (cicli annidati), "vector" (odds_frame, pandas/NumPy)
+# oppure "consensus" (vettoriale, un pronostico per mercato col consenso tra bookmaker)
+ANALYSIS_ENGINE = os.getenv("ANALYSIS_ENGINE", "loop")
+
 # Parametri filtro
 MIN_PROB = 60.0 #%
 MIN_QUOTA = 1.50 #decimale
@@ -131,48 +113,125 @@ def get_thresholds(sport_key: str):
     return MIN_PROB, MIN_QUOTA
 
 # Funzione invio Telegram
+_telegram_queue = None
+
+def get_telegram_queue():
+    """Coda di invio condivisa (worker in background, batching e retry)."""
+    global _telegram_queue
+    if _telegram_queue is None:
+        _telegram_queue = TelegramQueue(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID)
+    return _telegram_queue
+
 def send_to_telegram(message: str):
+    """Accoda il messaggio: l'invio avviene nel worker, l'analisi non aspetta la rete."""
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         logging.error("⚠️ TELEGRAM_TOKEN o TELEGRAM_CHAT_ID mancanti.")
         return
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
-    try:
-        r = requests.post(url, json=payload, timeout=10)
-        if r.status_code != 200:
-            logging.error(f"Errore Telegram: {r.text}")
-    except Exception as e:
-        logging.error(f"Errore Telegram: {e}")
+    get_telegram_queue().put(message)
+
+def flush_telegram(timeout: float = 120.0):
+    if _telegram_queue is None:
+        return
+    if not _telegram_queue.flush(timeout):
+        logging.warning("⚠️ Coda Telegram non svuotata entro il timeout.")
+    _telegram_queue.log_stats()
 
 # Recupero odds dalle API
 def get_odds(sport: str):
     if not ODDS_API_KEY:
         logging.error("⚠️ ODDS_API_KEY mancante.")
         return []
+    data, _ = odds_client.fetch_odds(sport, ODDS_API_KEY)
+    return data
 
-    if sport.startswith("soccer_"):
-        markets = "h2h,btts,totals,spreads"
-    else:
-        markets = "h2h,totals"
-
-    url = f"https://api.the-odds-api.com/v4/sports/{sport}/odds"
-    params = {
-        "apiKey": ODDS_API_KEY,
-        "regions": "eu",
-        "markets": markets,
-        "oddsFormat": "decimal",
-        "dateFormat": "iso"
-    }
-    try:
-        r = requests.get(url, params=params, timeout=15)
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        logging.error(f"{sport} error: {e}")
-        return []
+def get_all_odds(sports, run=None, ttl=None):
+    """
+    Quote di tutti gli sport: cache su disco (ODDS_CACHE_TTL, o ttl secondi),
+    budget quota e richieste in parallelo (ODDS_CONCURRENCY). Con run
+    (metrics.RunMetrics) registra il tempo di ogni richiesta e la sua
+    provenienza (api/cache/...).
+    Ritorna ({sport: eventi}, {sport: metrica}); la metrica dice da dove
+    arrivano gli eventi (source) e l'eventuale errore della richiesta.
+    """
+    if not ODDS_API_KEY:
+        logging.error("⚠️ ODDS_API_KEY mancante.")
+        return {s: [] for s in sports}, {s: {"sport": s, "source": None, "error": "ODDS_API_KEY mancante"} for s in sports}
+    odds, fetch_metrics = odds_client.fetch_all(sports, ODDS_API_KEY, priority=SPORT_PRIORITY, ttl=ttl)
+    if run is not None:
+        for m in fetch_metrics:
+            run.add_time("odds_request", m["sport"], m["ms"])
+            run.count(f"odds_{m['source']}", 1, m["sport"])
+    return odds, {m["sport"]: m for m in fetch_metrics}
+
+# Messaggi (condivisi dai due motori di analisi)
+def _market_message(sport, home, away, start_time, bookmaker_name, outcome_name, market_key, quota, probability,
+                    accepted=None, extra=None):
+    """
+    Ritorna (accettato, testo) per il pronostico di un mercato.
+    accepted: soglie già calcolate; extra: riga aggiuntiva (es. consenso bookmaker).
+    """
+    base_msg = (
+        f"{SPORTS.get(sport, sport)}\n"
+        f"📌 {home} vs {away}\n"
+        f"📅 {start_time.strftime('%d/%m/%Y %H:%M')}\n"
+        f"🏦 Bookmaker: {bookmaker_name}\n"
+        f"🔮 Pronostico: {outcome_name} ({market_key})\n"
+        f"💰 Quota: {quota}\n"
+        + (f"{extra}\n" if extra else "") +
+        f"📈 Probabilità stimata: {probability}%"
+    )
+    if accepted is None:
+        accepted = probability >= MIN_PROB and quota >= MIN_QUOTA
+    if accepted:
+        return True, "✅ PRONOSTICO TROVATO\n\n" + base_msg
+    motivo = []
+    if probability < MIN_PROB:
+        motivo.append(f"prob {probability}% < {MIN_PROB}%")
+    if quota < MIN_QUOTA:
+        motivo.append(f"quota {quota} < {MIN_QUOTA}")
+    return False, "❌ SCARTATO\n\n" + base_msg + f"\n🚫 Motivo: {', '.join(motivo)}"
+
+def _btts_message(sport, home, away, start_time, prob_btts):
+    """Ritorna (accettato, testo) per il pronostico BTTS da storico."""
+    base_msg = (
+        f"{SPORTS.get(sport, sport)}\n"
+        f"📌 {home} vs {away}\n"
+        f"📅 {start_time.strftime('%d/%m/%Y %H:%M')}\n"
+        f"🔮 Pronostico: Entrambe Segnano (BTTS)\n"
+        f"📈 Probabilità stimata: {prob_btts}%"
+    )
+    if prob_btts >= MIN_PROB:
+        return True, "✅ PRONOSTICO TROVATO\n\n" + base_msg
+    return False, "❌ SCARTATO\n\n" + base_msg + f"\n🚫 Motivo: prob < {MIN_PROB}%"
+
+def _btts_with_prior(sport, home, away, stats, priors, n_games, weight=None):
+    """BTTS storico della coppia, combinato col tasso BTTS della lega se lo storico è scarso."""
+    prob_btts = stats.btts_rate(home, away) if stats is not None else None
+    if priors is None:
+        return prob_btts
+    prob_btts, _ = priors.apply(prob_btts, n_games, priors.prior(sport, "btts", "Yes"), weight)
+    return None if prob_btts is None else round(prob_btts, 1)
 
 # Analisi dei match
-def analyze_matches(sport: str, matches: list, hist_df=None):
+def analyze_matches(sport: str, matches: list, hist_df=None, stats=None, goals=None, priors=None):
+    """
+    stats: TeamStatsIndex già costruito; se manca viene creato da hist_df
+    (una volta per chiamata, non per mercato).
+    goals: modello gol della lega (calcio); per Over/Under 2.5 e BTTS
+    sostituisce prob_csv nella combinazione con la quota.
+    priors: baseline di lega (league_priors) combinate con prob_csv quando lo
+    storico delle due squadre è scarso o assente.
+    Con ANALYSIS_ENGINE=vector usa il motore vettoriale (odds_frame),
+    con ANALYSIS_ENGINE=consensus il consenso tra bookmaker.
+    Ritorna (pronostici, scartati): pronostici = [((casa, trasferta), testo)]
+    con i nomi del payload, scartati = [testo].
+    """
+    if stats is None and hist_df is not None:
+        stats = TeamStatsIndex.build(hist_df)
+    if ANALYSIS_ENGINE in ("vector", "consensus"):
+        return analyze_matches_vectorized(sport, matches, stats=stats, goals=goals, priors=priors,
+                                          use_consensus=(ANALYSIS_ENGINE == "consensus"))
+
     pronostici = []
     scartati   = []
     now = datetime.datetime.now(datetime.timezone.utc)
@@ -190,6 +249,26 @@ def analyze_matches(sport: str, matches: list, hist_df=None):
             away = match.get("away_team", "Away")
 
             any_market_found = False
+            seen = set()   # (mercato, esito) già valutati: conta il primo bookmaker, come nel motore vettoriale
+
+            # CSV (se disponibili): una sola lookup per partita, non per mercato
+            prob_csv = None
+            n_games = n_weight = 0
+            if stats is not None:
+                try:
+                    prob_csv = stats.prob_csv(home, away)
+                    n_games = stats.games(home, away)
+                    n_weight = stats.weight(home, away)
+                except Exception as e:
+                    logging.warning(f"⚠️ Errore calcolo prob CSV per {home} vs {away}: {e}")
+
+            # modello gol (solo calcio): Over/Under 2.5 e BTTS per la partita
+            prob_model = {}
+            if goals is not None:
+                try:
+                    prob_model = goals.market_probabilities(home, away)
+                except Exception as e:
+                    logging.warning(f"⚠️ Errore modello gol per {home} vs {away}: {e}")
 
             for bookmaker in match.get("bookmakers", []):
                 bookmaker_name = bookmaker.get("title", "Sconosciuto")
@@ -215,96 +294,51 @@ def analyze_matches(sport: str, matches: list, hist_df=None):
                     except Exception:
                         continue
 
-                    # CSV (se disponibili)
-                    prob_csv = None
-                    if hist_df is not None:
-                        try:
-                            team_matches = hist_df[
-                                (hist_df['HomeTeam'] == home) | (hist_df['AwayTeam'] == away)
-                            ]
-                            if not team_matches.empty:
-                                total_matches = len(team_matches)
-                                home_wins = len(team_matches[(team_matches['HomeTeam'] == home) & (team_matches['FTR'] == 'H')])
-                                away_wins = len(team_matches[(team_matches['AwayTeam'] == away) & (team_matches['FTR'] == 'A')])
-
-                                home_win_rate = (home_wins / total_matches) * 100 if total_matches > 0 else 0
-                                away_win_rate = (away_wins / total_matches) * 100 if total_matches > 0 else 0
-
-                                home_goals_scored   = team_matches.loc[team_matches['HomeTeam'] == home, 'FTHG'].mean()
-                                home_goals_conceded = team_matches.loc[team_matches['HomeTeam'] == home, 'FTAG'].mean()
-                                away_goals_scored   = team_matches.loc[team_matches['AwayTeam'] == away, 'FTAG'].mean()
-                                away_goals_conceded = team_matches.loc[team_matches['AwayTeam'] == away, 'FTHG'].mean()
-
-                                prob_csv = (
-                                    (home_win_rate * 0.4) +
-                                    ((100 - away_win_rate) * 0.2) +
-                                    ((home_goals_scored - home_goals_conceded) * 5) +
-                                    ((away_goals_conceded - away_goals_scored) * 5)
-                                )
-                                prob_csv = max(0, min(100, prob_csv))
-                        except Exception as e:
-                            logging.warning(f"⚠️ Errore calcolo prob CSV per {home} vs {away}: {e}")
-
-                    # Combina API + CSV
-                    if prob_csv is not None:
-                        probability = round((prob_api * 0.6) + (prob_csv * 0.4), 1)
+                    # Combina API + CSV (o modello gol per totals/btts, o prior di lega se lo storico è scarso)
+                    prob_hist = prob_model.get((market_key, best_outcome.get("name")))
+                    if prob_hist is None:
+                        prob_hist = prob_csv
+                        if priors is not None:
+                            prior = priors.prior(sport, market_key, best_outcome.get("name"),
+                                                 best_outcome.get("point"), home, away)
+                            same = priors.team_outcome(market_key, best_outcome.get("name"), home)
+                            prob_hist, _ = priors.apply(prob_csv, n_games, prior, n_weight, same)
+                    if prob_hist is not None:
+                        probability = round((prob_api * 0.6) + (prob_hist * 0.4), 1)
                     else:
                         probability = prob_api
 
-                    prediction_id = f"{sport}{home}{away}{market_key}{best_outcome.get('name','N/D')}"
-                    base_msg = (
-                        f"{SPORTS.get(sport, sport)}\n"
-                        f"📌 {home} vs {away}\n"
-                        f"📅 {start_time.strftime('%d/%m/%Y %H:%M')}\n"
-                        f"🏦 Bookmaker: {bookmaker_name}\n"
-                        f"🔮 Pronostico: {best_outcome.get('name','N/D')} ({market_key})\n"
-                        f"💰 Quota: {quota}\n"
-                        f"📈 Probabilità stimata: {probability}%"
-                    )
-
-                    if prediction_id not in sent_predictions:
-                        sent_predictions.add(prediction_id)
-                        if probability >= MIN_PROB and quota >= MIN_QUOTA:
-                            pronostici.append("✅ PRONOSTICO TROVATO\n\n" + base_msg)
+                    prediction_id = prediction_key(sport, home, away, market_key, best_outcome.get('name','N/D'))
+                    if prediction_id not in seen and prediction_id not in sent_predictions:
+                        seen.add(prediction_id)
+                        event = (sport, match.get("id"), home, away, start_time)
+                        move = odds_history.move_note(*event, market_key, best_outcome.get('name','N/D'),
+                                                      best_outcome.get("point"))
+                        ok, msg = _market_message(sport, home, away, start_time, bookmaker_name,
+                                                  best_outcome.get('name','N/D'), market_key, quota, probability,
+                                                  extra=move)
+                        if ok:   # solo gli accettati nel dedup: gli scartati si rivalutano al prossimo run
+                            pronostici.append(((home, away), msg))
+                            sent_predictions.add(prediction_id, start_time)
+                            odds_history.record_pick(*event, market_key, best_outcome.get('name','N/D'),
+                                                     bookmaker_name, best_outcome.get("point"), quota)
                         else:
-                            motivo = []
-                            if probability < MIN_PROB:
-                                motivo.append(f"prob {probability}% < {MIN_PROB}%")
-                            if quota < MIN_QUOTA:
-                                motivo.append(f"quota {quota} < {MIN_QUOTA}")
-                            scartati.append("❌ SCARTATO\n\n" + base_msg + f"\n🚫 Motivo: {', '.join(motivo)}")
-
-            if sport.startswith("soccer_") and hist_df is not None:
+                            scartati.append(msg)
+
+            if sport.startswith("soccer_") and (stats is not None or prob_model):
                 try:
-                    team_matches = hist_df[
-                        (hist_df['HomeTeam'] == home) | (hist_df['AwayTeam'] == away)
-                    ]
-                    if not team_matches.empty:
-                        btts_matches = team_matches[(team_matches['FTHG'] > 0) & (team_matches['FTAG'] > 0)]
-                        prob_btts = round((len(btts_matches) / len(team_matches)) * 100, 1)
-
-                        prediction_id_btts = f"{sport}{home}{away}btts_yes"
+                    prob_btts = prob_model.get(("btts", "Yes"))
+                    if prob_btts is None:
+                        prob_btts = _btts_with_prior(sport, home, away, stats, priors, n_games, n_weight)
+                    if prob_btts is not None:
+                        prediction_id_btts = prediction_key(sport, home, away, "btts_yes")
                         if prediction_id_btts not in sent_predictions:
-                            sent_predictions.add(prediction_id_btts)
-                            if prob_btts >= MIN_PROB:
-                                pronostici.append(
-                                    "✅ PRONOSTICO TROVATO\n\n"
-                                    f"{SPORTS.get(sport, sport)}\n"
-                                    f"📌 {home} vs {away}\n"
-                                    f"📅 {start_time.strftime('%d/%m/%Y %H:%M')}\n"
-                                    f"🔮 Pronostico: Entrambe Segnano (BTTS)\n"
-                                    f"📈 Probabilità stimata: {prob_btts}%"
-                                )
+                            ok, msg = _btts_message(sport, home, away, start_time, prob_btts)
+                            if ok:
+                                pronostici.append(((home, away), msg))
+                                sent_predictions.add(prediction_id_btts, start_time)
                             else:
-                                scartati.append(
-                                    "❌ SCARTATO\n\n"
-                                    f"{SPORTS.get(sport, sport)}\n"
-                                    f"📌 {home} vs {away}\n"
-                                    f"📅 {start_time.strftime('%d/%m/%Y %H:%M')}\n"
-                                    f"🔮 Pronostico: Entrambe Segnano (BTTS)\n"
-                                    f"📈 Probabilità stimata: {prob_btts}%\n"
-                                    f"🚫 Motivo: prob < {MIN_PROB}%"
-                                )
+                                scartati.append(msg)
                 except Exception as e:
                     logging.warning(f"⚠️ Errore calcolo BTTS per {home} vs {away}: {e}")
 
@@ -314,36 +348,260 @@ def analyze_matches(sport: str, matches: list, hist_df=None):
 
     return pronostici, scartati
 
-# Job principale
-def job():
-    logging.info("🔍 Controllo nuove partite...")
-    tot_ok, tot_ko = 0, 0
+def analyze_matches_vectorized(sport: str, matches: list, hist_df=None, stats=None, now=None,
+                               use_consensus: bool = False, goals=None, priors=None):
+    """
+    Stesso risultato di analyze_matches, ma il payload viene appiattito in una
+    tabella (odds_frame) e finestra temporale, quote implicite, miglior esito e
+    soglie sono calcolati in blocco. Il ciclo Python resta solo per i
+    pronostici da deduplicare e formattare.
+    use_consensus: un pronostico per mercato (non per bookmaker) alla quota
+    migliore, con la probabilità di consenso senza margine.
+    """
+    if stats is None and hist_df is not None:
+        stats = TeamStatsIndex.build(hist_df)
 
-    for sport in SPORTS.keys():
-        hist_df = load_historical_data(sport)   # 🔹 carica CSV da tutte le fonti
-        matches = get_odds(sport)
-        accettati, rifiutati = analyze_matches(sport, matches, hist_df)
+    pronostici = []
+    scartati   = []
+    events, picks, errors = odds_frame.score(sport, matches, stats, now=now, use_consensus=use_consensus,
+                                              goals=goals, priors=priors)
+
+    by_event = {}
+    if not picks.empty:
+        # a parità di (partita, mercato, esito) conta solo la prima riga (primo
+        # bookmaker, come nel ciclo): le altre si scartano in blocco prima del ciclo
+        picks = picks.drop_duplicates(["event", "market", "outcome"], keep="first")
+        picks = odds_frame.apply_thresholds(picks, MIN_PROB, MIN_QUOTA)
+        by_event = picks.groupby("event", sort=False).indices
+        cols = {c: picks[c].to_numpy() for c in ("bookmaker", "market", "outcome", "price", "probability", "accepted")}
+        cols["point"] = (picks["point"] if "point" in picks else picks["line"]).to_numpy()
+        if use_consensus:
+            cols["extra"] = [
+                f"📊 Consenso: {n} bookmaker, quota mediana {round(m, 2)}"
+                for n, m in zip(picks["n_books"], picks["median_price"])
+            ]
+
+    # partite valide ed errori di parsing nell'ordine del payload, come nel ciclo
+    order = sorted([(ev.event, ev) for ev in events.itertuples(index=False)] + [(i, None) for i in errors],
+                   key=lambda x: x[0])
+    for _, ev in order:
+        if ev is None:
+            scartati.append(f"❌ SCARTATO\n\n{SPORTS.get(sport, sport)}\n⚠️ Errore parsing match.")
+            continue
+        home, away = ev.home, ev.away
+        start_time = ev.commence_time.to_pydatetime()
+        for i in by_event.get(ev.event, ()):
+            market_key = cols["market"][i]
+            outcome = cols["outcome"][i]
+            prediction_id = prediction_key(sport, home, away, market_key, outcome)
+            if prediction_id not in sent_predictions:
+                point = None if pd.isna(cols["point"][i]) else float(cols["point"][i])
+                event = (sport, ev.id, home, away, start_time)
+                extra = [cols["extra"][i]] if use_consensus else []
+                move = odds_history.move_note(*event, market_key, outcome, point)
+                ok, msg = _market_message(sport, home, away, start_time, cols["bookmaker"][i], outcome,
+                                          market_key, float(cols["price"][i]), float(cols["probability"][i]),
+                                          accepted=bool(cols["accepted"][i]),
+                                          extra="\n".join(extra + [move] if move else extra) or None)
+                if ok:
+                    pronostici.append(((home, away), msg))
+                    sent_predictions.add(prediction_id, start_time)
+                    odds_history.record_pick(*event, market_key, outcome, cols["bookmaker"][i], point,
+                                             float(cols["price"][i]))
+                else:
+                    scartati.append(msg)
+
+        model_btts = None if pd.isna(ev.model_btts_yes) else float(ev.model_btts_yes)
+        if sport.startswith("soccer_") and (stats is not None or model_btts is not None):
+            try:
+                prob_btts = model_btts
+                if prob_btts is None:
+                    prob_btts = _btts_with_prior(sport, home, away, stats, priors, ev.n_games, ev.n_weight)
+                if prob_btts is not None:
+                    prediction_id_btts = prediction_key(sport, home, away, "btts_yes")
+                    if prediction_id_btts not in sent_predictions:
+                        ok, msg = _btts_message(sport, home, away, start_time, prob_btts)
+                        if ok:
+                            pronostici.append(((home, away), msg))
+                            sent_predictions.add(prediction_id_btts, start_time)
+                        else:
+                            scartati.append(msg)
+            except Exception as e:
+                logging.warning(f"⚠️ Errore calcolo BTTS per {home} vs {away}: {e}")
+
+    return pronostici, scartati
 
-        for msg in accettati:
-            send_to_telegram(msg)
+# Job principale
+# Profilo opzionale del prossimo run: "cpu" (cProfile), "mem" (tracemalloc) o "all"
+PROFILE_JOB = os.getenv("PROFILE_JOB", "")
+_profile_pending = PROFILE_JOB
 
-        tot_ok += len(accettati)
-        tot_ko += len(rifiutati)
+def job(sports=None, ttl=None, on_odds=None):
+    """
+    Un run cronometrato per fase e sport (metrics); con PROFILE_JOB il primo
+    run è profilato. sports: sottoinsieme da analizzare (default tutti);
+    on_odds riceve le quote appena scaricate e la loro provenienza per sport
+    (scheduler adattivo).
+    """
+    global _profile_pending
+    run = metrics.RunMetrics("job")
+    mode, _profile_pending = _profile_pending, ""
+    try:
+        if mode:
+            with metrics.profile(mode, "job"):
+                _job(run, list(sports or SPORTS), ttl, on_odds)
+        else:
+            _job(run, list(sports or SPORTS), ttl, on_odds)
+    finally:
+        metrics.export(run)
+
+def _job(run, sports_to_run, ttl=None, on_odds=None):
+    logging.info(f"🔍 Controllo nuove partite ({len(sports_to_run)}/{len(SPORTS)} sport)...")
+    tot_ok, tot_ko = 0, 0
+    sent_predictions.prune()
+    odds_history.prune()
+
+    with run.stage("fetch_odds"):
+        odds, sources = get_all_odds(sports_to_run, run, ttl)   # 🔹 fase di fetch concorrente, prima dell'analisi
+    if on_odds is not None:
+        on_odds(odds, sources)
+    for sport, matches in odds.items():
+        with run.stage("odds_history", sport):
+            try:
+                run.count("odds_snapshot_rows", odds_history.record(sport, matches), sport)
+            except Exception as e:
+                logging.warning(f"⚠️ Impossibile salvare lo storico quote {sport}: {e}")
+
+    priors = league_priors.get_league_priors()   # 🔹 letto una volta, riletto solo se rigenerato
+    registry = history_cache.HistoryRegistry(sports_to_run, _category_for_sport)
+    for categoria, sports in registry.categories():
+        with run.stage("load_history", categoria):
+            history = registry.load(categoria)   # 🔹 CSV da tutte le fonti, una volta per categoria
+        if history.frame is not None:
+            info = history.info
+            run.count("history_rows", len(history.frame), categoria)
+            age_h = (time.time() - info["updated_at"]) / 3600 if info["updated_at"] else float("nan")
+            logging.info(
+                f"📂 Storici {categoria}: {len(history.frame)} righe per {len(sports)} sport "
+                f"(versione {info['version']}, {info['files']} file, {info['memory_mb']:.2f} MB, "
+                f"dato più recente di {age_h:.1f}h fa)."
+            )
+        with run.stage("team_stats", categoria):
+            stats = history.stats
+
+        for sport in sports:
+            matches = odds.get(sport, [])
+            for name, n in metrics.payload_counts(matches).items():
+                run.count(name, n, sport)
+            with run.stage("goal_model", sport):
+                goals = history.goal_model(sport)
+            with run.stage("analyze", sport):
+                accettati, rifiutati = analyze_matches(sport, matches, stats=stats, goals=goals, priors=priors)
+            results.update(sport, matches, accettati)
+
+            with run.stage("telegram", sport):
+                for _, msg in accettati:
+                    send_to_telegram(msg)
+
+            run.count("accepted", len(accettati), sport)
+            run.count("rejected", len(rifiutati), sport)
+            tot_ok += len(accettati)
+            tot_ko += len(rifiutati)
+        del history, stats
+        registry.release()   # anche il registro lascia il frame: una sola categoria in memoria alla volta
+    if priors is not None:
+        priors.log_usage()
+    odds_history.log_clv()
 
     logging.info(f"📊 Totale pronostici inviati: {tot_ok}")
     logging.info(f"❌ Eventi scartati: {tot_ko}")
-    if tot_ok == 0:
+    if tot_ok == 0 and len(sports_to_run) == len(SPORTS):   # non a ogni controllo parziale dello scheduler
         send_to_telegram("ℹ️ Nessun match disponibile entro 48h (nessuna quota).")
-
-# --- Schedule fisso ---
+    with run.stage("telegram_flush"):
+        flush_telegram()
+    if _telegram_queue is not None:
+        for name, value in _telegram_queue.stats().items():
+            if name in ("sent", "batches", "retries", "dropped", "pending"):
+                run.count(f"telegram_{name}", value)
+
+# --- Scheduling ---
+# "adaptive": controlli per sport guidati dai calci d'inizio (scheduler.py); "fixed": tre run completi al giorno
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "adaptive")
 schedule_times = ["07:00", "11:00", "17:00"]
-for t in schedule_times:
-    schedule.every().day.at(t).do(job)
 
-if __name__ == "__main__":
-    send_to_telegram("✅ Bot avviato su Render e pronto a cercare pronostici!")
-    logging.info("🤖 Bot avviato. In attesa di invio pronostici...")
-    job()
+def run_fixed():
+    for t in schedule_times:
+        schedule.every().day.at(t).do(job)
     while True:
         schedule.run_pending()
         time.sleep(30)
+
+def run_adaptive():
+    """
+    A ogni tick analizza solo gli sport in scadenza per lo scheduler; le
+    quote scaricate aggiornano i calci d'inizio e quindi il prossimo controllo.
+    """
+    planner = scheduler.KickoffScheduler(SPORTS.keys(), priority=SPORT_PRIORITY)
+    ttl = min(odds_client.ODDS_CACHE_TTL, planner.min_interval)   # chi è in scadenza va riscaricato
+    logging.info(f"🗓️ Scheduler adattivo: budget {planner.budget} crediti/24h, tick {scheduler.SCHED_TICK_SECONDS}s.")
+    while True:
+        due = planner.due()
+        if due:
+            try:
+                job(due, ttl=ttl, on_odds=planner.observe)
+            except Exception as e:
+                logging.error(f"❌ Job fallito: {e}")
+            planner.log_plan()
+        time.sleep(scheduler.SCHED_TICK_SECONDS)
+
+# --- Sync storici in background ---
+SYNC_ON_STARTUP = os.getenv("SYNC_ON_STARTUP", "1") == "1"
+
+def start_background_sync():
+    """
+    Scarica gli storici (download_csv) in un thread, senza bloccare l'avvio:
+    il primo job usa i dati già presenti su disco / in cache. A fine download
+    la cache Parquet di ogni categoria viene ricostruita (e con essa le
+    statistiche di lega di historical_analysis), così i dati nuovi entrano
+    nel job successivo senza riavviare il bot.
+    """
+    def _run():
+        t0 = time.perf_counter()
+        logging.info("🔄 Sync storici avviato in background.")
+        before = {c: history_cache.data_info(c)["version"] for c in set(map(_category_for_sport, SPORTS))}
+        try:
+            import download_csv
+            download_csv.main()
+        except Exception as e:
+            logging.error(f"❌ Sync storici fallito: {e}")
+        changed = []
+        for categoria, version in before.items():
+            if history_cache.data_info(categoria)["version"] != version:
+                history_cache.refresh(categoria)   # ricostruisce cache (e forma) fuori dal job
+                changed.append(categoria)
+        # statistiche di lega precalcolate qui, mai durante il job
+        if changed or not os.path.exists(historical_analysis.LEAGUE_STATS):
+            try:
+                historical_analysis.run_batch(SPORTS.keys(), workers=1)   # niente fork da un processo con thread
+            except Exception as e:
+                logging.error(f"❌ Analisi storica fallita: {e}")
+        logging.info(
+            f"🔄 Sync storici completato in {time.perf_counter() - t0:.1f}s: "
+            f"{', '.join(changed) if changed else 'nessuna categoria cambiata'}."
+        )
+
+    t = threading.Thread(target=_run, name="history-sync", daemon=True)
+    t.start()
+    return t
+
+if __name__ == "__main__":
+    if SYNC_ON_STARTUP:
+        start_background_sync()
+    telegram_commands.start(TELEGRAM_TOKEN, results, SPORTS)
+    send_to_telegram("✅ Bot avviato su Render e pronto a cercare pronostici!")
+    logging.info("🤖 Bot avviato. In attesa di invio pronostici...")
+    if SCHEDULER_MODE == "fixed":
+        job()
+        run_fixed()
+    else:
+        run_adaptive()   # il primo tick controlla tutti gli sport mai visti o scaduti
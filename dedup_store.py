@@ -0,0 +1,87 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import datetime
+import threading
+
+DEDUP_DB = os.getenv("DEDUP_DB", os.path.join("cache", "sent_predictions.sqlite"))
+DEDUP_GRACE_HOURS = float(os.getenv("DEDUP_GRACE_HOURS", "6"))  # conserva l'id dopo il calcio d'inizio
+
+
+def prediction_key(*parts) -> str:
+    """Id strutturato → hash: ('a', 'bc') e ('ab', 'c') non collidono più."""
+    raw = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _to_epoch(value) -> float:
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    return float(value)
+
+
+class DedupStore:
+    """
+    Pronostici già inviati, su SQLite, con scadenza al commence_time della
+    partita (+ DEDUP_GRACE_HOURS). Gli id validi stanno anche in un set in
+    memoria: il controllo è O(1) e la memoria resta limitata alle partite
+    non ancora iniziate.
+    """
+
+    def __init__(self, path: str = None, grace_hours: float = None):
+        self.path = path or DEDUP_DB
+        self.grace = (DEDUP_GRACE_HOURS if grace_hours is None else grace_hours) * 3600
+        self._conn = None
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sent (id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sent_expires ON sent (expires_at)")
+            self._conn.commit()
+            self._ids = {row[0] for row in self._conn.execute("SELECT id FROM sent WHERE expires_at >= ?", (time.time(),))}
+        return self._conn
+
+    def prune(self, now: float = None) -> int:
+        """Elimina gli id scaduti e ricarica il set in memoria. Ritorna quanti ne ha tolti."""
+        now = time.time() if now is None else now
+        conn = self._db()
+        with self._lock:
+            removed = conn.execute("DELETE FROM sent WHERE expires_at < ?", (now,)).rowcount
+            conn.commit()
+            self._ids = {row[0] for row in conn.execute("SELECT id FROM sent")}
+        if removed:
+            logging.info(f"🧹 Dedup: rimossi {removed} pronostici scaduti, {len(self._ids)} attivi.")
+        return removed
+
+    def __contains__(self, key: str) -> bool:
+        self._db()
+        return key in self._ids
+
+    def __len__(self) -> int:
+        self._db()
+        return len(self._ids)
+
+    def add(self, key: str, commence_time) -> bool:
+        """Registra l'id; True se era nuovo, False se già inviato."""
+        conn = self._db()
+        with self._lock:
+            if key in self._ids:
+                return False
+            expires_at = _to_epoch(commence_time) + self.grace
+            conn.execute("INSERT OR IGNORE INTO sent (id, expires_at) VALUES (?, ?)", (key, expires_at))
+            conn.commit()
+            self._ids.add(key)
+            return True
@@ -1,21 +1,28 @@
 import os
 import re
+import json
 import time
 import logging
 import pathlib
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
 
 # Logging
 logging.basicConfig(level=logging.INFO)
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "6"))
+CHUNK_SIZE = 256 * 1024
+
 SESSION = requests.Session()
 SESSION.headers.update({"User-Agent": "Mozilla/5.0"})
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=max(DOWNLOAD_CONCURRENCY, 10)))
 
 OUT_DIR = pathlib.Path("downloads")
+MANIFEST_PATH = OUT_DIR / ".manifest.json"   # ID Drive → dimensione ed ETag del file scaricato
 
 # === INSERISCI QUI i link Google Drive e HTTP ===
 LINKS = {
-    "LINKS = {
     "soccer_italy_serie_a": [
         "https://drive.google.com/file/d/1IwH4OWw8K7d6lA6L_yOHDv0sPWzAjB7R/view?usp=sharing",
         "https://drive.google.com/file/d/1OvFQSfS818GvIrE668IceV2BxWpUwpPH/view?usp=sharing",
@@ -72,7 +79,6 @@ LINKS = {
          "https://drive.google.com/file/d/1XZ_fzreWKgSrt4Fdh6Dzooax3Bc0ZugF/view?usp=drive_link",
     ],
 
-    ],
     "americanfootball_nfl": [
          "https://drive.google.com/file/d/1c6mPo49iqxkl3Z2soKlJrY9wdF3874Jl/view?usp=drive_link",
          "https://drive.google.com/file/d/10HdPiazGdgoHhmAGFZWrltlTdbhHW-jg/view?usp=drive_link",
@@ -101,77 +107,249 @@ def extract_file_id(url: str) -> str | None:
 def build_direct_url(file_id: str) -> str:
     return f"https://drive.google.com/uc?export=download&id={file_id}"
 
-def download_google_drive(url: str, dest_path: str, max_retries: int = 2) -> bool:
-    """Scarica un file da Google Drive con gestione token di conferma."""
+def _category_for_sport(sport_key: str) -> str:
+    """Stesse cartelle di bot.load_historical_data (downloads/<categoria>/)."""
+    for prefix, categoria in (("soccer_", "calcio"), ("basketball_", "basket"), ("americanfootball_", "football"),
+                              ("icehockey_", "hockey"), ("baseball_", "baseball"), ("tennis_", "tennis")):
+        if sport_key.startswith(prefix):
+            return categoria
+    return "misc"
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.warning(f"⚠️ Manifest download non leggibile ({e}): riscarico tutto.")
+        return {}
+
+def save_manifest(manifest: dict):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, MANIFEST_PATH)
+
+def _stream_to_part(r, part_path: str, resume_from: int) -> int:
+    """
+    Scrive la risposta su <dest>.part. Con 206 accoda ai byte già presenti
+    (resume), con 200 riparte da zero. Ritorna i byte scaricati in questa richiesta.
+    """
+    mode = "ab" if resume_from and r.status_code == 206 else "wb"
+    written = 0
+    with open(part_path, mode) as f:
+        for chunk in r.iter_content(CHUNK_SIZE):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+def _drive_get(direct: str, headers: dict):
+    """GET sul link diretto Drive, passando dalla pagina di conferma se serve. None se non risolta."""
+    r = SESSION.get(direct, stream=True, timeout=60, headers=headers)
+    if "text/html" in r.headers.get("Content-Type", ""):
+        m = re.search(r"confirm=([0-9A-Za-z_]+)", r.text)
+        if m:
+            r = SESSION.get(f"{direct}&confirm={m.group(1)}", stream=True, timeout=60, headers=headers)
+    if "text/html" in r.headers.get("Content-Type", ""):
+        r.close()
+        return None
+    return r
+
+def remote_version(url: str) -> dict | None:
+    """
+    Dimensione ed ETag/Last-Modified del file remoto, senza scaricarlo:
+    Drive con una richiesta Range: bytes=0-0 (Content-Range: bytes 0-0/<totale>),
+    gli altri URL con HEAD. None se il server non risponde.
+    """
+    try:
+        file_id = extract_file_id(url) if "drive.google.com" in url else None
+        if file_id:
+            r = _drive_get(build_direct_url(file_id), {"Range": "bytes=0-0"})
+            if r is None:
+                return None
+            r.close()
+        else:
+            r = SESSION.head(url, timeout=30, allow_redirects=True)
+        if r.status_code not in (200, 206):
+            return None
+        total = r.headers.get("Content-Range", "").rpartition("/")[2]
+        if r.status_code == 200:
+            total = r.headers.get("Content-Length", "")
+        return {
+            "size": int(total) if total.isdigit() else None,
+            "etag": r.headers.get("ETag") or r.headers.get("Last-Modified"),
+        }
+    except Exception as e:
+        logging.warning(f"⚠️ Versione remota non disponibile per {url}: {e}")
+        return None
+
+def _same_version(a: dict | None, b: dict | None) -> bool:
+    """Stessa versione se dimensione ed ETag coincidono dove entrambi sono noti."""
+    if not a or not b:
+        return False
+    checks = [(a.get(k), b.get(k)) for k in ("size", "etag") if a.get(k) is not None and b.get(k) is not None]
+    return bool(checks) and all(x == y for x, y in checks)
+
+def _prepare_part(part: str, remote: dict | None) -> int:
+    """
+    Offset da cui riprendere <dest>.part. Accanto al .part è salvata la
+    versione remota per cui è stato iniziato (<dest>.part.json): se il file
+    remoto è cambiato, o la versione non è nota, il .part si butta.
+    """
+    meta_path = part + ".json"
+    if os.path.exists(part):
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                started_for = json.load(f)
+        except (FileNotFoundError, ValueError):
+            started_for = None
+        if not _same_version(started_for, remote):
+            logging.info(f"🗑️ {part}: file remoto cambiato (o versione ignota), riparto da zero.")
+            os.remove(part)
+    if remote:
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(remote, f)
+    elif os.path.exists(meta_path):
+        os.remove(meta_path)
+    return os.path.getsize(part) if os.path.exists(part) else 0
+
+def _finish_part(part: str, dest_path: str):
+    os.replace(part, dest_path)
+    if os.path.exists(part + ".json"):
+        os.remove(part + ".json")
+
+def download_google_drive(url: str, dest_path: str, max_retries: int = 2, remote: dict = None) -> dict:
+    """
+    Scarica un file da Google Drive con gestione token di conferma.
+    Il file viene scritto su <dest>.part e rinominato solo a download completo;
+    un .part lasciato da un tentativo fallito viene ripreso con HTTP Range,
+    ma solo se è della stessa versione remota (remote: {size, etag}).
+    Ritorna {ok, bytes, resumed}.
+    """
+    result = {"ok": False, "bytes": 0, "resumed": False}
     file_id = extract_file_id(url)
     if not file_id:
         logging.error(f"❌ Link non valido: {url}")
-        return False
+        return result
 
     direct = build_direct_url(file_id)
+    part = dest_path + ".part"
+    expected = (remote or {}).get("size")
     for attempt in range(1, max_retries + 1):
         try:
-            r = SESSION.get(direct, stream=True, timeout=60)
-
-            # controllo pagina HTML (richiesta conferma)
-            if "text/html" in r.headers.get("Content-Type", ""):
-                html = r.text
-                m = re.search(r"confirm=([0-9A-Za-z_]+)", html)
-                if m:
-                    confirm_url = f"{direct}&confirm={m.group(1)}"
-                    r = SESSION.get(confirm_url, stream=True, timeout=60)
-
-            if "text/html" in r.headers.get("Content-Type", ""):
+            offset = _prepare_part(part, remote)
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            r = _drive_get(direct, headers)
+            if r is None:
                 logging.error(f"❌ Conferma Google Drive non risolta: {url} (tentativo {attempt})")
                 continue
+            if r.status_code == 416:
+                # Range oltre la fine: il .part è completo solo se ha la dimensione del file remoto
+                r.close()
+                if expected is None or offset != expected:
+                    logging.warning(f"⚠️ {part}: 416 con {offset} byte su {expected}, riparto da zero.")
+                    os.remove(part)
+                    continue
+            else:
+                r.raise_for_status()
+                result["resumed"] = result["resumed"] or (offset > 0 and r.status_code == 206)
+                result["bytes"] += _stream_to_part(r, part, offset)
 
-            with open(dest_path, "wb") as f:
-                for chunk in r.iter_content(32768):
-                    f.write(chunk)
-
+            size = os.path.getsize(part)
+            if expected is not None and size != expected:
+                logging.error(f"❌ {dest_path}: scaricati {size} byte su {expected} (tentativo {attempt})")
+                continue   # il .part resta: il prossimo tentativo riprende da qui
+            _finish_part(part, dest_path)
+            result["ok"] = True
             logging.info(f"✅ Scaricato da Google Drive: {dest_path}")
-            return True
+            return result
         except Exception as e:
             logging.error(f"❌ Errore download GDrive {url}: {e}")
 
-    return False
+    return result
 
-def download_http(url: str, dest_path: str) -> bool:
-    """Scarica file da URL diretto (http/https)."""
+def download_http(url: str, dest_path: str) -> dict:
+    """Scarica file da URL diretto (http/https), con rename atomico a fine download."""
+    result = {"ok": False, "bytes": 0, "resumed": False}
+    part = dest_path + ".part"
     try:
-        r = SESSION.get(url, timeout=60)
-        r.raise_for_status()
-        with open(dest_path, "wb") as f:
-            f.write(r.content)
+        with SESSION.get(url, timeout=60, stream=True) as r:
+            r.raise_for_status()
+            result["bytes"] = _stream_to_part(r, part, 0)
+        os.replace(part, dest_path)
+        result["ok"] = True
         logging.info(f"✅ Scaricato: {dest_path}")
-        return True
     except Exception as e:
         logging.error(f"❌ Errore download {url}: {e}")
-        return False
+    return result
 
-# --- MAIN ---
-def main():
-    ok, fail = 0, 0
-    for sport_key, urls in LINKS.items():
-        base = OUT_DIR / sport_key   # 👈 usa la chiave API come cartella
-        base.mkdir(parents=True, exist_ok=True)
+def _download_one(sport_key: str, url: str, manifest: dict) -> dict:
+    """
+    Un file: salta se la versione remota (dimensione, ETag) è quella già
+    scaricata, altrimenti scarica. Se il server non risponde alla verifica
+    si tiene la copia locale.
+    """
+    file_id = extract_file_id(url) if "drive.google.com" in url else None
+    base = OUT_DIR / _category_for_sport(sport_key)
+    base.mkdir(parents=True, exist_ok=True)
+    if file_id:
+        # nome per ID Drive: "view?usp=sharing" farebbe sovrascrivere i file tra loro
+        dest = base / f"{sport_key}_{file_id}.csv"
+    else:
+        dest = base / f"{sport_key}_{url.split('/')[-1] or 'file.csv'}"
 
+    key = file_id or url
+    stat = {"sport": sport_key, "dest": str(dest), "ok": False, "skipped": False,
+            "resumed": False, "bytes": 0, "seconds": 0.0}
+    known = manifest.get(key)
+    have_local = bool(known) and dest.exists() and dest.stat().st_size == known.get("size")
+    remote = remote_version(url)
+    if have_local and (remote is None or _same_version(known, remote)):
+        stat.update(ok=True, skipped=True)
+        return stat
 
-        for url in urls:
-            filename = url.split("/")[-1] or "file.csv"
-            dest = base / filename
+    t0 = time.perf_counter()
+    if file_id:
+        res = download_google_drive(url, str(dest), remote=remote)
+    else:
+        res = download_http(url, str(dest))
+    stat.update(res)
+    stat["seconds"] = time.perf_counter() - t0
+    if stat["ok"]:
+        manifest[key] = {"dest": str(dest), "size": dest.stat().st_size, "etag": (remote or {}).get("etag")}
+    return stat
 
-            if "drive.google.com" in url:
-                success = download_google_drive(url, str(dest))
-            else:
-                success = download_http(url, str(dest))
+# --- MAIN ---
+def main(max_workers: int = None):
+    workers = max_workers or DOWNLOAD_CONCURRENCY
+    manifest = load_manifest()
+    jobs = [(sport_key, url) for sport_key, urls in LINKS.items() for url in urls]
 
-            if success:
-                ok += 1
-            else:
-                fail += 1
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gdrive") as pool:
+        stats = list(pool.map(lambda job: _download_one(job[0], job[1], manifest), jobs))
+    wall = time.perf_counter() - t0
+    save_manifest(manifest)
+
+    for s in stats:
+        if s["skipped"] or not s["seconds"]:
+            continue
+        mbps = s["bytes"] / s["seconds"] / 1e6 if s["seconds"] else 0
+        resumed = " (ripreso)" if s["resumed"] else ""
+        logging.info(f"⏱️ {s['dest']}: {s['bytes'] / 1e6:.2f} MB in {s['seconds']:.1f}s ({mbps:.2f} MB/s){resumed}")
 
-    logging.info(f"📊 Download completati: ✅ {ok} | ❌ {fail}")
+    ok = sum(1 for s in stats if s["ok"] and not s["skipped"])
+    skipped = sum(1 for s in stats if s["skipped"])
+    fail = sum(1 for s in stats if not s["ok"])
+    total_bytes = sum(s["bytes"] for s in stats)
+    sequential = sum(s["seconds"] for s in stats)
+    logging.info(f"📊 Download completati: ✅ {ok} | ⏭️ {skipped} già presenti | ❌ {fail}")
+    logging.info(
+        f"⏱️ {total_bytes / 1e6:.1f} MB in {wall:.1f}s con {workers} worker "
+        f"(in sequenza: {sequential:.1f}s, {sequential / wall if wall else 0:.1f}x)"
+    )
 
 if __name__ == "__main__":
     main()
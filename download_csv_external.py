@@ -1,8 +1,11 @@
 import os
-import requests
+import csv
+import json
+import time
+import hashlib
 import logging
+import requests
 import schedule
-import time
 import pandas as pd  # ← (1) aggiunta
 
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +16,11 @@ os.makedirs("data/basket", exist_ok=True)
 os.makedirs("data/football", exist_ok=True)
 os.makedirs("data/hockey", exist_ok=True)
 
+# Stato dei download condizionali: ETag / Last-Modified / hash per URL
+MANIFEST_PATH = os.getenv("EXTERNAL_MANIFEST", os.path.join("cache", "external_downloads.json"))
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "Mozilla/5.0"})
+
 # Mappa competizioni → link CSV verificati o utili
 CSV_LINKS = {
     # ⚽ Calcio (football-data.co.uk)
@@ -77,6 +85,15 @@ CSV_LINKS = {
 
 }
 
+def _sniff_delimiter(path: str, sample_size: int = 64 * 1024):
+    """Delimitatore (virgola/punto e virgola/tab) dalle prime righe, None se incerto."""
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            sample = f.read(sample_size)
+        return csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+    except (csv.Error, UnicodeDecodeError):
+        return None
+
 # (2) funzione di pulizia leggera post-download
 def sanitize_csv(path: str, sport_key: str):
     """
@@ -87,13 +104,18 @@ def sanitize_csv(path: str, sport_key: str):
     Non rinomina colonne: i football-data per il calcio sono già conformi.
     """
     try:
-        df = pd.read_csv(
-            path,
-            sep=None,              # autodetect delimitatore
-            engine="python",
-            encoding="utf-8",
-            on_bad_lines="skip"
-        )
+        sep = _sniff_delimiter(path)
+        if sep is not None:
+            # delimitatore già noto: parser C, molto più veloce dello sniffer python
+            df = pd.read_csv(path, sep=sep, encoding="utf-8", on_bad_lines="skip")
+        else:
+            df = pd.read_csv(
+                path,
+                sep=None,              # autodetect delimitatore
+                engine="python",
+                encoding="utf-8",
+                on_bad_lines="skip"
+            )
         df = df.dropna(how="all")
         df.to_csv(path, index=False, encoding="utf-8")
     except UnicodeDecodeError:
@@ -114,7 +136,74 @@ def sanitize_csv(path: str, sport_key: str):
     except Exception as e:
         logging.warning(f"Pulizia CSV non riuscita per {path}: {e}")
 
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.warning(f"Manifest download non leggibile ({e}): riscarico tutto.")
+        return {}
+
+def save_manifest(manifest: dict):
+    os.makedirs(os.path.dirname(MANIFEST_PATH) or ".", exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, MANIFEST_PATH)
+
+def download_if_changed(url: str, dest: str, comp: str, manifest: dict) -> str:
+    """
+    Download condizionale di un CSV. Ritorna "unchanged" o "updated".
+    - invia If-None-Match / If-Modified-Since dal manifest: 304 = niente download;
+    - altrimenti scrive la risposta a blocchi su un file temporaneo calcolando
+      lo sha256: se coincide con l'ultimo scaricato il file non viene toccato
+      e sanitize_csv non riparte.
+    """
+    entry = manifest.get(url, {})
+    headers = {}
+    if os.path.exists(dest) and entry.get("dest") == dest:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    with SESSION.get(url, timeout=30, headers=headers, stream=True) as r:
+        if r.status_code == 304:
+            return "unchanged"
+        r.raise_for_status()
+
+        tmp = dest + ".part"
+        digest = hashlib.sha256()
+        with open(tmp, "wb") as f:
+            for chunk in r.iter_content(64 * 1024):
+                digest.update(chunk)
+                f.write(chunk)
+        sha = digest.hexdigest()
+
+        new_entry = {
+            "dest": dest,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "sha256": sha,
+        }
+
+    if sha == entry.get("sha256") and os.path.exists(dest):
+        os.remove(tmp)
+        manifest[url] = new_entry
+        return "unchanged"
+
+    sanitize_csv(tmp, comp)  # ← (2) chiamata alla pulizia
+    os.replace(tmp, dest)
+    manifest[url] = new_entry
+    return "updated"
+
 def download_all_csv():
+    t0 = time.perf_counter()
+    manifest = load_manifest()
+    updated, unchanged, failed = 0, 0, 0
+
     for comp, links in CSV_LINKS.items():
         if comp.startswith("soccer_"):
             folder = "data/calcio"
@@ -133,15 +222,22 @@ def download_all_csv():
             try:
                 filename = url.split("/")[-1]
                 dest = f"{folder}/{comp}_{filename}"
-                r = requests.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0"})
-                r.raise_for_status()
-                with open(dest, "wb") as f:
-                    f.write(r.content)
-                logging.info(f"✅ Scaricato {comp}: {filename}")
-                sanitize_csv(dest, comp)  # ← (2) chiamata alla pulizia
+                if download_if_changed(url, dest, comp, manifest) == "updated":
+                    updated += 1
+                    logging.info(f"✅ Scaricato {comp}: {filename}")
+                else:
+                    unchanged += 1
+                    logging.info(f"⏭️ Invariato {comp}: {filename}")
             except Exception as e:
+                failed += 1
                 logging.error(f"❌ Errore download {url}: {e}")
 
+    save_manifest(manifest)
+    logging.info(
+        f"📊 CSV esterni: {updated} aggiornati, {unchanged} invariati, {failed} errori "
+        f"in {time.perf_counter() - t0:.1f}s"
+    )
+
 def job():
     print("⏳ Download CSV esterni in corso...")
     download_all_csv()
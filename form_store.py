@@ -0,0 +1,193 @@
+import os
+import json
+import math
+import time
+import logging
+import tempfile
+import pandas as pd
+
+from team_alias import AliasResolver
+from team_stats import PROB_CSV_WEIGHTS
+
+# Statistiche di forma per squadra con decadimento esponenziale nel tempo
+FORM_DIR = os.getenv("FORM_DIR", os.path.join("cache", "form"))
+FORM_HALF_LIFE_DAYS = float(os.getenv("FORM_HALF_LIFE_DAYS", "180"))  # una partita di 6 mesi fa pesa la metà
+FORM_VERSION = 2
+
+# stato per squadra: giorno dell'ultima partita + somme pesate (riportate a quel giorno) + partite senza peso
+_LAST, _W, _WINS, _DRAWS, _FOR, _AGAINST, _BTTS, _OVER, _N, _COUNT = range(10)
+
+
+_EPOCH = pd.Timestamp(0)
+_ONE_DAY = pd.Timedelta(days=1)
+
+
+def _day(ts):
+    """Giorni dall'epoch (con frazione), per Timestamp o Series di date."""
+    return (ts - _EPOCH) / _ONE_DAY
+
+
+class FormStore:
+    """
+    Forma recente di ogni squadra di una categoria: vittorie, pareggi, punti/gol
+    fatti e subiti, BTTS e over 2.5, pesati con emivita FORM_HALF_LIFE_DAYS.
+    Lo stato è salvato su disco e aggiornato solo con le partite nuove (date
+    successive all'ultima elaborata): O(righe nuove) invece di riaggregare
+    tutto lo storico a ogni job. Espone prob_csv/btts_rate come TeamStatsIndex.
+    """
+
+    def __init__(self, categoria: str, half_life: float = None, path: str = None):
+        self.categoria = categoria
+        self.half_life = FORM_HALF_LIFE_DAYS if half_life is None else half_life
+        self.path = path or os.path.join(FORM_DIR, f"{categoria}.json")
+        self.teams = {}
+        self.watermark = None       # data (giorni) dell'ultima partita elaborata
+        self.rows_seen = 0          # partite con data <= watermark già nello stato
+        self._aliases = None
+
+    # --- persistenza ---
+    @classmethod
+    def load(cls, categoria: str, half_life: float = None, path: str = None):
+        store = cls(categoria, half_life, path)
+        try:
+            with open(store.path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") == FORM_VERSION and state.get("half_life") == store.half_life:
+                store.teams = state["teams"]
+                store.watermark = state["watermark"]
+                store.rows_seen = state["rows_seen"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"⚠️ Forma squadre {categoria} non leggibile: {e}")
+        return store
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            state = {"version": FORM_VERSION, "half_life": self.half_life, "watermark": self.watermark,
+                     "rows_seen": self.rows_seen, "teams": self.teams}
+            # tmp unico: il sync in background e il job possono salvare la stessa categoria insieme
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except Exception as e:
+            logging.warning(f"⚠️ Impossibile salvare forma squadre {self.categoria}: {e}")
+
+    # --- aggiornamento ---
+    def update(self, frame) -> int:
+        """
+        Porta lo stato al passo con la tabella canonica. Se le partite già
+        elaborate non coincidono più (file storici riscritti) ricostruisce da
+        zero. Ritorna il numero di partite aggiunte.
+        """
+        if frame is None or frame.empty:
+            return 0
+        t0 = time.perf_counter()
+        df = frame[frame["date"].notna()]
+        days = _day(df["date"])
+        if self.watermark is not None and int((days <= self.watermark).sum()) != self.rows_seen:
+            logging.info(f"♻️ Forma squadre {self.categoria}: storico cambiato, ricostruzione completa.")
+            self.teams, self.watermark, self.rows_seen = {}, None, 0
+        new = df if self.watermark is None else df[days > self.watermark]
+        if new.empty:
+            return 0
+
+        new = new.sort_values("date", kind="stable")
+        for date, home, away, hs, as_, result in zip(
+                new["date"], new["home"], new["away"], new["home_score"], new["away_score"], new["result"]):
+            day = _day(date)
+            hs = None if pd.isna(hs) else float(hs)
+            as_ = None if pd.isna(as_) else float(as_)
+            result = None if pd.isna(result) else result
+            self._add(str(home), day, result == "H", result == "D", hs, as_)
+            self._add(str(away), day, result == "A", result == "D", as_, hs)
+
+        self.watermark = _day(new["date"].max())
+        self.rows_seen = int((days <= self.watermark).sum())
+        self._aliases = None
+        elapsed = (time.perf_counter() - t0) * 1000
+        logging.info(f"📈 Forma squadre {self.categoria}: +{len(new)} partite, {len(self.teams)} squadre in {elapsed:.0f} ms.")
+        return len(new)
+
+    def _add(self, team: str, day: float, win: bool, draw: bool, scored, conceded):
+        s = self.teams.get(team)
+        if s is None:
+            s = self.teams[team] = [day, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0]
+        decay = 0.5 ** (max(0.0, day - s[_LAST]) / self.half_life)
+        for i in range(_W, _COUNT):
+            s[i] *= decay
+        s[_COUNT] += 1
+        s[_LAST] = max(s[_LAST], day)
+        s[_W] += 1
+        s[_WINS] += win
+        s[_DRAWS] += draw
+        if scored is not None and conceded is not None:
+            s[_N] += 1
+            s[_FOR] += scored
+            s[_AGAINST] += conceded
+            s[_BTTS] += scored > 0 and conceded > 0
+            s[_OVER] += scored + conceded > 2.5
+
+    # --- lettura ---
+    def _resolve(self, name):
+        if self._aliases is None:
+            self._aliases = AliasResolver(self.teams, self.categoria)
+        return self._aliases.resolve(name)
+
+    def features(self, team: str, now: float = None) -> dict | None:
+        """Tassi pesati della squadra; weight = peso effettivo delle sue partite ad oggi, games = quante sono."""
+        name = self._resolve(team)
+        s = self.teams.get(name) if name is not None else None
+        if s is None or s[_W] <= 0:
+            return None
+        now = time.time() / 86400 if now is None else now
+        n = s[_N] or math.nan
+        return {
+            "team": name,
+            "weight": s[_W] * 0.5 ** (max(0.0, now - s[_LAST]) / self.half_life),
+            "games": s[_COUNT],
+            "win_rate": s[_WINS] / s[_W],
+            "draw_rate": s[_DRAWS] / s[_W],
+            "scored": s[_FOR] / n,
+            "conceded": s[_AGAINST] / n,
+            "btts_rate": s[_BTTS] / n,
+            "over25_rate": s[_OVER] / n,
+        }
+
+    def prob_csv(self, home: str, away: str):
+        """Stessa formula e pesi di TeamStatsIndex.prob_csv, sui tassi di forma pesati."""
+        h = self.features(home)
+        a = self.features(away)
+        if h is None and a is None:
+            return None
+        w_home, w_away, w_hgoals, w_agoals = PROB_CSV_WEIGHTS
+        prob = (
+            ((h["win_rate"] * 100 if h else 0) * w_home) +
+            ((100 - (a["win_rate"] * 100 if a else 0)) * w_away) +
+            (((h["scored"] - h["conceded"]) if h else 0) * w_hgoals) +
+            (((a["conceded"] - a["scored"]) if a else 0) * w_agoals)
+        )
+        if math.isnan(prob):
+            return None
+        return max(0, min(100, prob))
+
+    def games(self, home: str, away: str) -> int:
+        """Partite delle due squadre senza decadimento: stessa scala di TeamStatsIndex.games per le soglie dei prior."""
+        return sum(f["games"] for f in (self.features(home), self.features(away)) if f is not None)
+
+    def weight(self, home: str, away: str) -> float:
+        """Peso effettivo (partite scontate dal decadimento) delle due squadre, usato nella media col prior."""
+        return sum(f["weight"] for f in (self.features(home), self.features(away)) if f is not None)
+
+    def btts_rate(self, home: str, away: str):
+        rates = [f["btts_rate"] for f in (self.features(home), self.features(away))
+                 if f is not None and not math.isnan(f["btts_rate"])]
+        if not rates:
+            return None
+        return round(sum(rates) / len(rates) * 100, 1)
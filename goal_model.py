@@ -0,0 +1,187 @@
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+from team_alias import AliasResolver
+
+# Modello gol Poisson con correzione Dixon-Coles, un fit per lega
+GOAL_MODEL_DIR = os.getenv("GOAL_MODEL_DIR", os.path.join("cache", "goal_model"))
+GOAL_MODEL_HALF_LIFE_DAYS = float(os.getenv("GOAL_MODEL_HALF_LIFE_DAYS", "365"))
+GOAL_MODEL_MIN_MATCHES = int(os.getenv("GOAL_MODEL_MIN_MATCHES", "100"))
+GOAL_MODEL_VERSION = 1
+MAX_GOALS = 10        # matrice punteggi 0..10 per squadra
+_PRIOR_GAMES = 2.0    # partite "medie" fittizie: evita rating estremi per chi ha giocato poco
+_ITERATIONS = 60
+
+_LOG_FACTORIAL = np.array([math.lgamma(k + 1) for k in range(MAX_GOALS + 1)])
+_GOALS = np.arange(MAX_GOALS + 1)
+
+
+def signature(frame) -> str:
+    """Impronta delle partite di una lega: il fit si rifà solo se cambia."""
+    cols = frame[["date", "home", "away", "home_score", "away_score"]]
+    digest = hashlib.sha1(pd.util.hash_pandas_object(cols, index=False).to_numpy().tobytes())
+    digest.update(f"{GOAL_MODEL_VERSION}:{GOAL_MODEL_HALF_LIFE_DAYS}".encode())
+    return digest.hexdigest()
+
+
+class GoalModel:
+    """
+    Rating attacco/difesa per squadra, vantaggio casa e rho di Dixon-Coles.
+    Gol attesi: casa = home_adv · att[casa] · def[ospite], ospite = att[ospite] · def[casa].
+    """
+
+    def __init__(self, league: str, attack: dict, defence: dict, home_adv: float, rho: float,
+                 matches: int = 0, categoria: str = None):
+        self.league = league
+        self.attack = attack
+        self.defence = defence
+        self.home_adv = home_adv
+        self.rho = rho
+        self.matches = matches
+        self.aliases = AliasResolver(attack, categoria)
+
+    # --- fit ---
+    @classmethod
+    def fit(cls, league: str, frame, categoria: str = None, half_life: float = None):
+        """
+        Fit pesato nel tempo (emivita in giorni dall'ultima partita) con
+        iterazioni proporzionali sulle equazioni di massima verosimiglianza
+        del modello di Maher, poi rho con una ricerca su griglia.
+        """
+        half_life = GOAL_MODEL_HALF_LIFE_DAYS if half_life is None else half_life
+        df = frame.dropna(subset=["date", "home_score", "away_score"])
+        teams = pd.Index(pd.concat([df["home"], df["away"]]).astype(str).unique())
+        h = teams.get_indexer(df["home"].astype(str))
+        a = teams.get_indexer(df["away"].astype(str))
+        hg = df["home_score"].to_numpy(dtype="float64")
+        ag = df["away_score"].to_numpy(dtype="float64")
+        age = (df["date"].max() - df["date"]) / pd.Timedelta(days=1)
+        w = 0.5 ** (age.to_numpy(dtype="float64") / half_life)
+        n = len(teams)
+
+        att = np.ones(n)
+        dfn = np.ones(n)
+        home_adv = max(np.average(hg, weights=w), 0.1) / max(np.average(ag, weights=w), 0.1)
+        scored = np.bincount(h, w * hg, n) + np.bincount(a, w * ag, n)
+        conceded = np.bincount(a, w * hg, n) + np.bincount(h, w * ag, n)
+        for _ in range(_ITERATIONS):
+            exp_att = np.bincount(h, w * home_adv * dfn[a], n) + np.bincount(a, w * dfn[h], n)
+            att = (scored + _PRIOR_GAMES) / (exp_att + _PRIOR_GAMES)
+            exp_def = np.bincount(a, w * home_adv * att[h], n) + np.bincount(h, w * att[a], n)
+            dfn = (conceded + _PRIOR_GAMES) / (exp_def + _PRIOR_GAMES)
+            home_adv = np.sum(w * hg) / np.sum(w * att[h] * dfn[a])
+            scale = att.mean()
+            att /= scale
+            dfn *= scale
+
+        lam = home_adv * att[h] * dfn[a]
+        mu = att[a] * dfn[h]
+        rho = max(np.arange(-0.2, 0.201, 0.01), key=lambda r: np.sum(w * np.log(_tau(hg, ag, lam, mu, r))))
+        return cls(league, dict(zip(teams, att.round(5).tolist())), dict(zip(teams, dfn.round(5).tolist())),
+                   float(home_adv), float(round(rho, 2)), len(df), categoria)
+
+    # --- probabilità ---
+    def expected_goals(self, homes, aways):
+        """Gol attesi (casa, ospite) per liste di squadre; NaN se una squadra è sconosciuta."""
+        home_names = [self.aliases.resolve(x) for x in homes]
+        away_names = [self.aliases.resolve(x) for x in aways]
+        att_h = np.array([self.attack.get(x, np.nan) if x else np.nan for x in home_names])
+        def_h = np.array([self.defence.get(x, np.nan) if x else np.nan for x in home_names])
+        att_a = np.array([self.attack.get(x, np.nan) if x else np.nan for x in away_names])
+        def_a = np.array([self.defence.get(x, np.nan) if x else np.nan for x in away_names])
+        return self.home_adv * att_h * def_a, att_a * def_h
+
+    def probabilities(self, homes, aways, line: float = 2.5):
+        """
+        Per ogni partita (percentuali 0-100): Over/Under sulla linea e BTTS sì/no,
+        da una matrice punteggi (partite × gol casa × gol ospite) calcolata in blocco.
+        """
+        lam, mu = self.expected_goals(homes, aways)
+        known = ~(np.isnan(lam) | np.isnan(mu))
+        out = pd.DataFrame(np.nan, index=range(len(lam)), columns=["over", "under", "btts_yes", "btts_no"])
+        if not known.any():
+            return out
+        lam, mu = lam[known], mu[known]
+        ph = np.exp(_GOALS * np.log(lam)[:, None] - lam[:, None] - _LOG_FACTORIAL)
+        pa = np.exp(_GOALS * np.log(mu)[:, None] - mu[:, None] - _LOG_FACTORIAL)
+        m = ph[:, :, None] * pa[:, None, :]
+        m[:, 0, 0] *= 1 - lam * mu * self.rho
+        m[:, 0, 1] *= 1 + lam * self.rho
+        m[:, 1, 0] *= 1 + mu * self.rho
+        m[:, 1, 1] *= 1 - self.rho
+        np.clip(m, 0, None, out=m)
+        m /= m.sum(axis=(1, 2))[:, None, None]
+        over = m[:, (_GOALS[:, None] + _GOALS[None, :]) > line].sum(axis=1)
+        btts = m[:, 1:, 1:].sum(axis=(1, 2))
+        out.loc[known, "over"] = over * 100
+        out.loc[known, "under"] = (1 - over) * 100
+        out.loc[known, "btts_yes"] = btts * 100
+        out.loc[known, "btts_no"] = (1 - btts) * 100
+        return out.round(1)
+
+    def market_probabilities(self, home: str, away: str) -> dict:
+        """{(mercato, esito): probabilità %} per una partita; vuoto se squadre sconosciute."""
+        p = self.probabilities([home], [away]).iloc[0]
+        if pd.isna(p["over"]):
+            return {}
+        return {("totals", "Over"): float(p["over"]), ("totals", "Under"): float(p["under"]),
+                ("btts", "Yes"): float(p["btts_yes"]), ("btts", "No"): float(p["btts_no"])}
+
+    # --- cache su disco ---
+    def to_dict(self) -> dict:
+        return {"league": self.league, "attack": self.attack, "defence": self.defence,
+                "home_adv": self.home_adv, "rho": self.rho, "matches": self.matches}
+
+
+def _tau(x, y, lam, mu, rho):
+    """Correzione Dixon-Coles per i punteggi bassi."""
+    tau = np.ones_like(lam)
+    tau = np.where((x == 0) & (y == 0), 1 - lam * mu * rho, tau)
+    tau = np.where((x == 0) & (y == 1), 1 + lam * rho, tau)
+    tau = np.where((x == 1) & (y == 0), 1 + mu * rho, tau)
+    tau = np.where((x == 1) & (y == 1), 1 - rho, tau)
+    return np.clip(tau, 1e-10, None)
+
+
+def load_or_fit(league: str, frame, categoria: str = None):
+    """
+    Rating della lega da cache/goal_model/<lega>.json se le partite non sono
+    cambiate, altrimenti nuovo fit (e salvataggio). None se lo storico è troppo corto.
+    """
+    df = frame.dropna(subset=["date", "home_score", "away_score"]) if frame is not None else None
+    if df is None or len(df) < GOAL_MODEL_MIN_MATCHES:
+        return None
+    path = os.path.join(GOAL_MODEL_DIR, f"{league}.json")
+    sig = signature(df)
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("signature") == sig:
+            m = state["model"]
+            return GoalModel(league, m["attack"], m["defence"], m["home_adv"], m["rho"], m["matches"], categoria)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"⚠️ Modello gol {league} non leggibile: {e}")
+
+    t0 = time.perf_counter()
+    model = GoalModel.fit(league, df, categoria)
+    elapsed = (time.perf_counter() - t0) * 1000
+    logging.info(
+        f"🎯 Modello gol {league}: fit su {model.matches} partite, {len(model.attack)} squadre in {elapsed:.0f} ms "
+        f"(vantaggio casa {model.home_adv:.2f}, rho {model.rho:+.2f})."
+    )
+    try:
+        os.makedirs(GOAL_MODEL_DIR, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"signature": sig, "model": model.to_dict()}, f)
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        logging.warning(f"⚠️ Impossibile salvare modello gol {league}: {e}")
+    return model
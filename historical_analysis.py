@@ -1,94 +1,276 @@
 # historical_analysis.py
+"""
+Statistiche di lega precalcolate da tutti gli storici.
+
+    python historical_analysis.py [--workers 4] [--output processed/league_stats.parquet]
+
+Scopre ogni CSV in data/, downloads/ ed external_data/, lo porta alla tabella
+canonica (schema) in parallelo su un pool di processi, toglie le partite
+ripetute in più file (come history_cache) e passa ogni lega all'analizzatore
+del suo sport. Il risultato è un unico file colonnare (una riga per lega)
+che bot.py carica all'avvio.
+"""
 import os
+import glob
+import time
+import argparse
 import logging
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import schema
+from history_cache import SOURCE_DIRS, drop_cross_source_duplicates, league_for_file
+from sports import SPORTS
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 
 # Cartelle
-DATA_DIR = "data"
 OUTPUT_DIR = "processed"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+LEAGUE_STATS = os.getenv("LEAGUE_STATS", os.path.join(OUTPUT_DIR, "league_stats.parquet"))
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(min(4, os.cpu_count() or 1))))
 
-def analyze_soccer(csv_file, league_name):
-    """Analizza dataset di calcio (es. Serie A)"""
-    try:
-        df = pd.read_csv(csv_file)
+NFL_TOTAL_LINE = 42.5   # linea Over/Under NFL più comune
 
-        # Controlla colonne necessarie
-        if not {"HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR"}.issubset(df.columns):
-            logging.warning(f"{league_name}: formato CSV non valido")
-            return None
 
-        stats = {}
+# --- Analizzatori: somme su tutte le partite di una lega ---
+def _base_sums(df) -> dict:
+    played = df.dropna(subset=["home_score", "away_score"])
+    hs = played["home_score"].astype("float64")
+    as_ = played["away_score"].astype("float64")
+    return {
+        "matches": len(df),
+        "home_wins": int((df["result"] == "H").sum()),
+        "draws": int((df["result"] == "D").sum()),
+        "away_wins": int((df["result"] == "A").sum()),
+        "scored_matches": len(played),
+        "home_score_sum": float(hs.sum()),
+        "away_score_sum": float(as_.sum()),
+    }
 
-        # Win rates
-        stats["home_win_rate"] = (df["FTR"] == "H").mean() * 100
-        stats["draw_rate"] = (df["FTR"] == "D").mean() * 100
-        stats["away_win_rate"] = (df["FTR"] == "A").mean() * 100
 
-        # Goal stats
-        stats["avg_home_goals"] = df["FTHG"].mean()
-        stats["avg_away_goals"] = df["FTAG"].mean()
+def soccer_sums(df) -> dict:
+    sums = _base_sums(df)
+    played = df.dropna(subset=["home_score", "away_score"])
+    total = played["home_score"].astype("float64") + played["away_score"].astype("float64")
+    sums["over25"] = int((total > 2.5).sum())
+    sums["btts"] = int(((played["home_score"] > 0) & (played["away_score"] > 0)).sum())
+    return sums
 
-        # Over/Under 2.5
-        stats["over25_rate"] = ((df["FTHG"] + df["FTAG"]) > 2.5).mean() * 100
-        stats["under25_rate"] = ((df["FTHG"] + df["FTAG"]) <= 2.5).mean() * 100
 
-        # Both teams to score
-        stats["btts_rate"] = ((df["FTHG"] > 0) & (df["FTAG"] > 0)).mean() * 100
+def nfl_sums(df) -> dict:
+    sums = _base_sums(df)
+    played = df.dropna(subset=["home_score", "away_score"])
+    total = played["home_score"].astype("float64") + played["away_score"].astype("float64")
+    sums["over_nfl"] = int((total > NFL_TOTAL_LINE).sum())
+    return sums
 
-        # Salva
-        out_file = os.path.join(OUTPUT_DIR, f"{league_name}_soccer_stats.json")
-        pd.Series(stats).to_json(out_file, indent=2)
-        logging.info(f"✅ Salvato {out_file}")
-        return stats
 
-    except Exception as e:
-        logging.error(f"Errore analisi {league_name}: {e}")
-        return None
+# prefisso dello sport → analizzatore (default: solo esiti e punteggi medi)
+ANALYZERS = {
+    "soccer": soccer_sums,
+    "americanfootball": nfl_sums,
+}
 
 
-def analyze_nfl(csv_file, league_name="NFL"):
-    """Analizza dataset NFL"""
+def rates(sums: dict) -> dict:
+    """Somme (anche di più file) → statistiche di lega (colonne della tabella Parquet)."""
+    n = sums["matches"] or float("nan")
+    scored = sums["scored_matches"] or float("nan")
+    stats = {
+        "home_win_rate": sums["home_wins"] / n * 100,
+        "draw_rate": sums["draws"] / n * 100,
+        "away_win_rate": sums["away_wins"] / n * 100,
+        "avg_home_score": sums["home_score_sum"] / scored,
+        "avg_away_score": sums["away_score_sum"] / scored,
+        "avg_total_score": (sums["home_score_sum"] + sums["away_score_sum"]) / scored,
+    }
+    if "over25" in sums:
+        stats["over25_rate"] = sums["over25"] / scored * 100
+        stats["under25_rate"] = 100 - stats["over25_rate"]
+        stats["btts_rate"] = sums["btts"] / scored * 100
+    if "over_nfl" in sums:
+        stats["over42.5_rate"] = sums["over_nfl"] / scored * 100
+        stats["under42.5_rate"] = 100 - stats["over42.5_rate"]
+    return stats
+
+
+def _league(path: str, sport_keys) -> str:
+    """Sport key dal nome file (soccer_epl_2024.csv → soccer_epl), altrimenti nome senza anno."""
+    name = os.path.basename(path)
+    key = league_for_file(name, sport_keys)
+    if key:
+        return key
+    stem = os.path.splitext(name)[0]
+    parts = [p for p in stem.split("_") if not p.isdigit()]
+    return "_".join(parts) or stem
+
+
+def analyze_file(path: str, sport_keys) -> dict:
+    """Lavoro di un processo: un CSV → tabella canonica della sua lega, con tempi ed esito."""
+    t0 = time.perf_counter()
+    league = _league(path, sport_keys)
+    report = {"file": path, "league": league, "adapter": None, "rows": 0, "ms": 0.0, "status": "ok", "frame": None}
     try:
-        df = pd.read_csv(csv_file)
+        raw = pd.read_csv(path)
+        df, adapter = schema.normalize(raw)
+        if df is None:
+            report["status"] = "nessun adapter"
+        elif df.empty:
+            report["status"] = "nessuna partita giocata"
+        else:
+            report["adapter"] = adapter
+            report["rows"] = len(df)
+            report["frame"] = df[schema.CANONICAL_COLUMNS]
+    except Exception as e:
+        report["status"] = f"errore: {e}"
+    report["ms"] = (time.perf_counter() - t0) * 1000
+    return report
 
-        # Controlla colonne necessarie
-        if not {"HomeTeam", "AwayTeam", "HomeScore", "AwayScore"}.issubset(df.columns):
-            logging.warning(f"{league_name}: formato CSV non valido")
-            return None
 
-        stats = {}
+def discover() -> list:
+    """
+    Tutti i CSV delle cartelle sorgente, nell'ordine di history_cache. Le copie
+    non si saltano per nome file: i doppioni si tolgono per contenuto in run_batch.
+    """
+    paths = []
+    for base in SOURCE_DIRS:
+        paths.extend(sorted(glob.glob(os.path.join(base, "**", "*.csv"), recursive=True)))
+    return paths
+
 
-        # Win rates
-        stats["home_win_rate"] = (df["HomeScore"] > df["AwayScore"]).mean() * 100
-        stats["away_win_rate"] = (df["AwayScore"] > df["HomeScore"]).mean() * 100
+def league_matches(frames: list) -> tuple:
+    """
+    Tabelle di una lega (nell'ordine di discover) → (partite, ripetute tolte).
+    Come history_cache: una partita presente in più file conta una volta,
+    nella copia del primo.
+    """
+    return drop_cross_source_duplicates(
+        pd.concat([f.assign(_file=n) for n, f in enumerate(frames)], ignore_index=True))
 
-        # Average points
-        stats["avg_home_points"] = df["HomeScore"].mean()
-        stats["avg_away_points"] = df["AwayScore"].mean()
-        stats["avg_total_points"] = (df["HomeScore"] + df["AwayScore"]).mean()
 
-        # Over/Under 42.5 (esempio NFL comune)
-        stats["over42.5_rate"] = ((df["HomeScore"] + df["AwayScore"]) > 42.5).mean() * 100
-        stats["under42.5_rate"] = ((df["HomeScore"] + df["AwayScore"]) <= 42.5).mean() * 100
+def run_batch(sport_keys=(), workers: int = None, output: str = None):
+    """
+    Analizza tutti i CSV e scrive la tabella per lega (Parquet). Ritorna il
+    DataFrame scritto, o None se non c'è nulla da scrivere.
+    Con workers > 1 usa un pool di processi: solo da un processo senza altri
+    thread (CLI), perché il fork di un processo multithread può bloccarsi su
+    un lock tenuto da un altro thread. Il bot la chiama con workers=1.
+    """
+    output = output or LEAGUE_STATS
+    workers = workers or ANALYSIS_WORKERS
+    paths = discover()
+    t0 = time.perf_counter()
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            reports = list(pool.map(analyze_file, paths, [list(sport_keys)] * len(paths)))
+    else:
+        reports = [analyze_file(p, sport_keys) for p in paths]
+    wall = (time.perf_counter() - t0) * 1000
+
+    for r in reports:
+        icon = "❌" if r["status"].startswith("errore") else ("✅" if r["frame"] is not None else "⏭️")
+        logging.info(f"{icon} {r['file']}: {r['league']} {r['adapter'] or ''} "
+                     f"{r['rows']} partite in {r['ms']:.0f} ms ({r['status']}).")
+
+    frames = {}
+    for r in reports:
+        if r["frame"] is not None:
+            frames.setdefault(r["league"], []).append(r["frame"])
+    rows, duplicates = [], 0
+    for league, league_frames in sorted(frames.items()):
+        df, removed = league_matches(league_frames)
+        duplicates += removed
+        sums = ANALYZERS.get(league.split("_")[0], _base_sums)(df)
+        rows.append({"league": league, "files": len(league_frames), "matches": sums["matches"], **rates(sums)})
+    failed = sum(1 for r in reports if r["status"].startswith("errore"))
+    logging.info(
+        f"📊 Analisi storica: {len(paths)} file, {len(rows)} leghe, {duplicates} partite ripetute tra file tolte, "
+        f"{failed} errori in {wall:.0f} ms (somma per file {sum(r['ms'] for r in reports):.0f} ms, {workers} processi)."
+    )
+    if not rows:
+        return None
 
-        # Salva
-        out_file = os.path.join(OUTPUT_DIR, f"{league_name}_nfl_stats.json")
+    table = pd.DataFrame(rows)
+    table["updated_at"] = pd.Timestamp.now(tz="UTC")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    table.to_parquet(output + ".tmp", index=False)
+    os.replace(output + ".tmp", output)
+    logging.info(f"✅ Salvato {output}")
+    return table
+
+
+def load_league_stats(path: str = None):
+    """Tabella per lega indicizzata per sport key, o None se non ancora generata."""
+    try:
+        return pd.read_parquet(path or LEAGUE_STATS).set_index("league")
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"⚠️ Statistiche di lega non leggibili: {e}")
+        return None
+
+
+# --- Singolo file (formato JSON di prima) ---
+# chiavi dei file JSON di analyze_soccer/analyze_nfl → colonna di rates()
+SOCCER_JSON_KEYS = {
+    "home_win_rate": "home_win_rate",
+    "draw_rate": "draw_rate",
+    "away_win_rate": "away_win_rate",
+    "avg_home_goals": "avg_home_score",
+    "avg_away_goals": "avg_away_score",
+    "over25_rate": "over25_rate",
+    "under25_rate": "under25_rate",
+    "btts_rate": "btts_rate",
+}
+NFL_JSON_KEYS = {
+    "home_win_rate": "home_win_rate",
+    "away_win_rate": "away_win_rate",
+    "avg_home_points": "avg_home_score",
+    "avg_away_points": "avg_away_score",
+    "avg_total_points": "avg_total_score",
+    "over42.5_rate": "over42.5_rate",
+    "under42.5_rate": "under42.5_rate",
+}
+
+
+def _analyze_one(csv_file, league_name, analyzer, suffix, keys):
+    try:
+        df, _ = schema.normalize(pd.read_csv(csv_file))
+        if df is None or df.empty:
+            logging.warning(f"{league_name}: formato CSV non valido")
+            return None
+        all_rates = rates(analyzer(df))
+        stats = {key: all_rates[col] for key, col in keys.items()}
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        out_file = os.path.join(OUTPUT_DIR, f"{league_name}_{suffix}_stats.json")
         pd.Series(stats).to_json(out_file, indent=2)
         logging.info(f"✅ Salvato {out_file}")
         return stats
-
     except Exception as e:
         logging.error(f"Errore analisi {league_name}: {e}")
         return None
 
 
-if __name__ == "__main__":
+def analyze_soccer(csv_file, league_name):
+    """Analizza dataset di calcio (es. Serie A)"""
+    return _analyze_one(csv_file, league_name, soccer_sums, "soccer", SOCCER_JSON_KEYS)
+
+
+def analyze_nfl(csv_file, league_name="NFL"):
+    """Analizza dataset NFL"""
+    return _analyze_one(csv_file, league_name, nfl_sums, "nfl", NFL_JSON_KEYS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS, help="processi in parallelo")
+    parser.add_argument("--output", default=LEAGUE_STATS, help="file Parquet di uscita")
+    args = parser.parse_args(argv)
+
     logging.info("📊 Avvio analisi storica...")
+    run_batch(SPORTS.keys(), args.workers, args.output)
+
 
-    # ESEMPIO: qui puoi inserire i tuoi file locali
-    analyze_soccer("calcio_I1.csv", "SerieA")
-    analyze_nfl("NFL_2017-2025_scores.csv", "NFL")
+if __name__ == "__main__":
+    main()
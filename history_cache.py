@@ -0,0 +1,275 @@
+import os
+import json
+import glob
+import time
+import logging
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+import schema
+import goal_model
+from form_store import FormStore
+from team_stats import TeamStatsIndex
+
+# Cartelle sorgente degli storici (stesso ordine di load_historical_data)
+SOURCE_DIRS = ("data", "downloads", "external_data")
+
+# Cache colonnare (Parquet) dei frame concatenati per categoria
+CACHE_DIR = os.getenv("HISTORY_CACHE_DIR", os.path.join("cache", "history"))
+CACHE_VERSION = 6  # da incrementare quando cambia la normalizzazione
+
+# Componente storica di prob_csv: "index" (tutto lo storico con lo stesso peso)
+# oppure "form" (forma per squadra con decadimento nel tempo, form_store)
+HISTORY_MODEL = os.getenv("HISTORY_MODEL", "index")
+
+# una categoria alla volta: il sync in background e il job non scrivono la stessa cache insieme
+_load_lock = threading.Lock()
+
+
+def source_paths(categoria: str) -> list:
+    paths = []
+    for base in SOURCE_DIRS:
+        paths.extend(sorted(glob.glob(os.path.join(base, categoria, "*.csv"))))
+    return paths
+
+
+def _fingerprint(paths: list) -> list:
+    """Chiave della cache: (path, size, mtime) di ogni file sorgente."""
+    fp = []
+    for p in paths:
+        st = os.stat(p)
+        fp.append([p, st.st_size, st.st_mtime_ns])
+    return fp
+
+
+def _cache_files(categoria: str):
+    base = os.path.join(CACHE_DIR, categoria)
+    return base + ".parquet", base + ".json"
+
+
+def _read_csvs(categoria: str, paths: list):
+    """
+    Legge i CSV e li porta alla tabella canonica (schema.CANONICAL_COLUMNS + source).
+    Ritorna (frame o None, {file senza adapter: colonne}).
+    """
+    dfs, unmatched = [], {}
+    for n, p in enumerate(paths):
+        try:
+            raw = pd.read_csv(p)
+            if raw.empty:
+                continue
+            df, _ = schema.normalize(raw)
+            if df is None:
+                unmatched[os.path.basename(p)] = [str(c) for c in raw.columns]
+            elif not df.empty:
+                df["source"] = os.path.basename(p)
+                df["_file"] = n   # stesso nome file può stare in più cartelle
+                dfs.append(df)
+        except Exception as e:
+            logging.warning(f"⚠️ Errore lettura {p}: {e}")
+    if not dfs:
+        return None, unmatched
+    return pd.concat(dfs, ignore_index=True), unmatched
+
+
+def drop_cross_source_duplicates(df):
+    """
+    Toglie le partite identiche presenti in più file (es. lo stesso CSV in
+    data/ e downloads/): resta la copia del primo file. I doppioni dentro lo
+    stesso file restano, perché senza data possono essere partite diverse.
+    """
+    first = df.groupby(schema.CANONICAL_COLUMNS, dropna=False, sort=False, observed=True)["_file"].transform("first")
+    keep = df["_file"] == first
+    return df[keep].drop(columns="_file").reset_index(drop=True), int((~keep).sum())
+
+
+def _read_cache(categoria: str, fingerprint: list):
+    data_file, meta_file = _cache_files(categoria)
+    try:
+        with open(meta_file, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION or meta.get("sources") != fingerprint:
+            return None
+        if meta.get("empty"):
+            return pd.DataFrame()
+        return pd.read_parquet(data_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"⚠️ Cache storici {categoria} non leggibile: {e}")
+        return None
+
+
+def _write_cache(categoria: str, fingerprint: list, df, unmatched: dict = None):
+    data_file, meta_file = _cache_files(categoria)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        if df is not None:
+            tmp = data_file + ".tmp"
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, data_file)
+        meta = {"version": CACHE_VERSION, "sources": fingerprint, "empty": df is None,
+                "unmatched": unmatched or {}}
+        with open(meta_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_file + ".tmp", meta_file)
+    except Exception as e:
+        logging.warning(f"⚠️ Impossibile salvare cache storici {categoria}: {e}")
+
+
+def refresh(categoria: str):
+    """Ricostruisce la cache della categoria (e la forma squadre, se usata) fuori dal job."""
+    frame = load_category(categoria)
+    if HISTORY_MODEL == "form" and frame is not None:
+        form = FormStore.load(categoria)
+        if form.update(frame):
+            form.save()
+
+
+def data_info(categoria: str) -> dict:
+    """Versione (hash dei sorgenti), numero file e mtime del CSV più recente, senza leggere i dati."""
+    paths = source_paths(categoria)
+    fingerprint = _fingerprint(paths)
+    version = hashlib.sha1(json.dumps(fingerprint).encode("utf-8")).hexdigest()[:10] if paths else None
+    newest = max((fp[2] for fp in fingerprint), default=None)
+    return {"version": version, "files": len(paths), "updated_at": newest / 1e9 if newest else None}
+
+
+def load_category(categoria: str):
+    """
+    Ritorna la tabella partite canonica della categoria (o None).
+    Legge dalla cache Parquet se nessun CSV sorgente è cambiato,
+    altrimenti riparsa i CSV con gli adapter di schema e aggiorna la cache.
+    I file senza adapter sono segnalati solo qui, al primo parsing.
+    """
+    with _load_lock:
+        return _load_category(categoria)
+
+
+def _load_category(categoria: str):
+    paths = source_paths(categoria)
+    if not paths:
+        return None
+
+    t0 = time.perf_counter()
+    fingerprint = _fingerprint(paths)
+    full = _read_cache(categoria, fingerprint)
+    if full is not None:
+        elapsed = (time.perf_counter() - t0) * 1000
+        logging.info(
+            f"⚡ Storici {categoria} da cache (warm): {len(paths)} file, {len(full)} righe, "
+            f"{schema.memory_mb(full):.2f} MB in {elapsed:.0f} ms."
+        )
+        return None if full.empty else full
+
+    full, unmatched = _read_csvs(categoria, paths)
+    schema.log_unmatched(categoria, unmatched)
+    if full is not None:
+        raw_mb = schema.memory_mb(full)
+        full, duplicates = drop_cross_source_duplicates(full)
+        full = schema.compact(full)
+        logging.info(
+            f"🧠 Storici {categoria}: {schema.memory_mb(full):.2f} MB in memoria "
+            f"(prima della compattazione {raw_mb:.2f} MB), {duplicates} righe duplicate tra file tolte."
+        )
+    _write_cache(categoria, fingerprint, full, unmatched)
+    elapsed = (time.perf_counter() - t0) * 1000
+    righe = 0 if full is None else len(full)
+    logging.info(f"🐢 Storici {categoria} da CSV (cold): {len(paths)} file, {righe} righe in {elapsed:.0f} ms.")
+    return full
+
+
+# --- Registro storici per singolo run ---
+def league_for_file(filename: str, sport_keys) -> str | None:
+    """Sport key con il prefisso più lungo nel nome file (es. soccer_epl_2024.csv, basketball_nba-2024-UTC.csv)."""
+    best = None
+    for key in sport_keys:
+        if filename.startswith(key) and filename[len(key):len(key) + 1] in ("_", ".", "-"):
+            if best is None or len(key) > len(best):
+                best = key
+    return best
+
+
+class CategoryHistory:
+    """Frame di una categoria caricato una volta e condiviso dai suoi sport."""
+
+    def __init__(self, categoria: str, frame, sport_keys):
+        self.categoria = categoria
+        self.frame = frame
+        self.info = data_info(categoria)
+        self.info["memory_mb"] = schema.memory_mb(frame) if frame is not None else 0.0
+        self.sport_keys = list(sport_keys)
+        self._stats = None
+        self._stats_built = False
+        self._form = None
+        self._goal_models = {}
+        self._league_rows = {}
+        if frame is not None and "source" in frame.columns:
+            for filename, rows in frame.groupby("source", sort=False).indices.items():
+                league = league_for_file(filename, self.sport_keys)
+                if league:
+                    self._league_rows.setdefault(league, []).append(rows)
+
+    @property
+    def stats(self):
+        # indice squadre (o forma pesata) costruito una sola volta per categoria
+        if not self._stats_built:
+            if HISTORY_MODEL == "form":
+                self._stats = self.form if self.frame is not None else None
+            else:
+                self._stats = TeamStatsIndex.build(self.frame, self.categoria)
+            self._stats_built = True
+        return self._stats
+
+    @property
+    def form(self):
+        """Forma per squadra salvata su disco, allineata alle sole partite nuove."""
+        if self._form is None:
+            self._form = FormStore.load(self.categoria)
+            if self._form.update(self.frame):
+                self._form.save()
+        return self._form
+
+    def goal_model(self, sport_key: str):
+        """Modello gol della lega (solo calcio), dal fit in cache o rifatto se i dati sono cambiati."""
+        if not sport_key.startswith("soccer_"):
+            return None
+        if sport_key not in self._goal_models:
+            self._goal_models[sport_key] = goal_model.load_or_fit(sport_key, self.league(sport_key), self.categoria)
+        return self._goal_models[sport_key]
+
+    def league(self, sport_key: str):
+        """Righe della sola lega (se i nomi file lo permettono), altrimenti None."""
+        rows = self._league_rows.get(sport_key)
+        if not rows:
+            return None
+        return self.frame.take(np.sort(np.concatenate(rows)))
+
+
+class HistoryRegistry:
+    """
+    Raggruppa gli sport per categoria e carica ogni categoria una volta per run.
+    Tiene in memoria una sola categoria alla volta: caricarne una nuova
+    rilascia la precedente.
+    """
+
+    def __init__(self, sport_keys, category_for):
+        self.groups = {}
+        for key in sport_keys:
+            self.groups.setdefault(category_for(key), []).append(key)
+        self.current = None
+
+    def categories(self):
+        return list(self.groups.items())
+
+    def load(self, categoria: str) -> CategoryHistory:
+        if self.current is not None and self.current.categoria == categoria:
+            return self.current
+        self.current = None  # rilascia il frame precedente prima di caricare il nuovo
+        self.current = CategoryHistory(categoria, load_category(categoria), self.groups.get(categoria, []))
+        return self.current
+
+    def release(self):
+        self.current = None
@@ -0,0 +1,167 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+import historical_analysis
+
+# Prior di lega (processed/league_stats.parquet) quando lo storico squadra è scarso
+PRIOR_MIN_GAMES = int(os.getenv("PRIOR_MIN_GAMES", "20"))   # da qui in su vale solo lo storico squadra
+PRIOR_STRENGTH = float(os.getenv("PRIOR_STRENGTH", "10"))   # peso del prior, in partite equivalenti
+
+TIERS = ("squadra", "misto", "lega", "nessuno")
+
+
+def _totals_column(point) -> str:
+    # nomi di historical_analysis.rates: over25_rate (calcio), over42.5_rate (NFL)
+    return "over25_rate" if point == 2.5 else f"over{point}_rate"
+
+
+class LeaguePriors:
+    """
+    Baseline per lega (vittoria casa/pareggio/ospite, over, BTTS) lette una
+    volta dal file di historical_analysis. Per ogni esito combina prob_csv
+    con il prior della lega in base a quante partite ha lo storico squadra:
+      - squadra: almeno PRIOR_MIN_GAMES partite → solo prob_csv;
+      - misto:   meno partite → (w·prob_csv + k·prior) / (w + k), k = PRIOR_STRENGTH,
+                 w = peso dello storico (= n, o minore con la forma a decadimento);
+      - lega:    nessuno storico squadra, o storico che non stima quell'esito → solo il prior;
+      - nessuno: nessun prior per quell'esito → prob_csv così com'è.
+    prob_csv misura la forza della squadra di casa: stima solo la vittoria
+    casa (h2h), per ospite, pareggio e totals vale il prior. Per il BTTS il
+    bot passa il tasso BTTS della coppia, che stima lo stesso esito.
+    """
+
+    def __init__(self, table, min_games: int = None, strength: float = None):
+        self.table = table
+        self.min_games = PRIOR_MIN_GAMES if min_games is None else min_games
+        self.strength = PRIOR_STRENGTH if strength is None else strength
+        self.rows = {} if table is None else table.to_dict(orient="index")
+        self.counters = dict.fromkeys(TIERS, 0)
+
+    # --- prior per esito ---
+    def prior(self, sport: str, market: str, outcome: str, point=None, home: str = None, away: str = None):
+        """Probabilità (0-100) dell'esito secondo la baseline di lega, o None."""
+        row = self.rows.get(sport)
+        if row is None:
+            return None
+        value, under = None, False
+        if market == "h2h":
+            col = ("home_win_rate" if outcome == home else "away_win_rate" if outcome == away
+                   else "draw_rate" if outcome == "Draw" else None)
+            value = row.get(col) if col else None
+        elif market == "totals" and point is not None and outcome in ("Over", "Under"):
+            value, under = row.get(_totals_column(float(point))), outcome == "Under"
+        elif market == "btts" and outcome in ("Yes", "No"):
+            value, under = row.get("btts_rate"), outcome == "No"
+        if value is None or pd.isna(value):
+            return None
+        return 100 - value if under else value
+
+    @staticmethod
+    def team_outcome(market: str, outcome: str, home: str) -> bool:
+        """True se prob_csv stima proprio questo esito (vittoria della squadra di casa)."""
+        return market == "h2h" and outcome == home
+
+    def apply(self, prob_csv, n_games, prior, weight=None, same_outcome: bool = True):
+        """
+        Ritorna (probabilità storica, livello) per un esito; stessa regola di
+        apply_vector. n_games (partite) decide il livello, weight (default
+        n_games) pesa prob_csv nel misto. same_outcome=False: la stima squadra
+        riguarda un altro esito e non si mescola al prior.
+        """
+        if prior is None:
+            tier = "squadra" if prob_csv is not None else "nessuno"
+            self.counters[tier] += 1
+            return prob_csv, tier
+        if not same_outcome or prob_csv is None or n_games <= 0:
+            self.counters["lega"] += 1
+            return prior, "lega"
+        if n_games >= self.min_games:
+            self.counters["squadra"] += 1
+            return prob_csv, "squadra"
+        self.counters["misto"] += 1
+        weight = n_games if weight is None else weight
+        return (weight * prob_csv + self.strength * prior) / (weight + self.strength), "misto"
+
+    # --- versione vettoriale (odds_frame) ---
+    def prior_vector(self, sport: str, market, outcome, point, home, away):
+        """Come prior su array (uno per pick); NaN dove non c'è un prior."""
+        market = np.asarray(market, dtype=object).astype(str)
+        outcome = np.asarray(outcome, dtype=object).astype(str)
+        point = np.asarray(point, dtype="float64")
+        out = np.full(len(market), np.nan)
+        row = self.rows.get(sport)
+        if row is None or not len(market):
+            return out
+        h2h = market == "h2h"
+        out[h2h & (outcome == "Draw")] = row.get("draw_rate", np.nan)
+        out[h2h & (outcome == np.asarray(away, dtype=object).astype(str))] = row.get("away_win_rate", np.nan)
+        out[h2h & (outcome == np.asarray(home, dtype=object).astype(str))] = row.get("home_win_rate", np.nan)
+        totals = (market == "totals") & ~np.isnan(point)
+        for value in np.unique(point[totals]):
+            rate = row.get(_totals_column(float(value)), np.nan)
+            at = totals & (point == value)
+            out[at & (outcome == "Over")] = rate
+            out[at & (outcome == "Under")] = 100 - rate
+        btts = row.get("btts_rate", np.nan)
+        out[(market == "btts") & (outcome == "Yes")] = btts
+        out[(market == "btts") & (outcome == "No")] = 100 - btts
+        return out.astype("float64")
+
+    @staticmethod
+    def team_outcome_vector(market, outcome, home):
+        """Come team_outcome su array."""
+        return ((np.asarray(market, dtype=object).astype(str) == "h2h")
+                & (np.asarray(outcome, dtype=object).astype(str) == np.asarray(home, dtype=object).astype(str)))
+
+    def apply_vector(self, prob_csv, n_games, prior, weight=None, same_outcome=None):
+        """Come apply su array; conta i livelli usati."""
+        prob_csv = np.asarray(prob_csv, dtype="float64")
+        n_games = np.nan_to_num(np.asarray(n_games, dtype="float64"))
+        weight = n_games if weight is None else np.nan_to_num(np.asarray(weight, dtype="float64"))
+        same = np.ones(len(prob_csv), dtype=bool) if same_outcome is None else np.asarray(same_outcome, dtype=bool)
+        has_prior = ~np.isnan(prior)
+        has_csv = ~np.isnan(prob_csv)
+        league = has_prior & (~same | ~has_csv | (n_games <= 0))
+        team = (has_prior & ~league & (n_games >= self.min_games)) | (~has_prior & has_csv)
+        mixed = has_prior & ~league & ~team
+        with np.errstate(invalid="ignore"):
+            blended = (weight * prob_csv + self.strength * prior) / (weight + self.strength)
+        out = np.where(league, prior, np.where(mixed, blended, prob_csv))
+        self.counters["squadra"] += int(team.sum())
+        self.counters["misto"] += int(mixed.sum())
+        self.counters["lega"] += int(league.sum())
+        self.counters["nessuno"] += int((~has_prior & ~has_csv).sum())
+        return out
+
+    def log_usage(self):
+        total = sum(self.counters.values())
+        if not total:
+            return
+        parts = ", ".join(f"{t} {self.counters[t]} ({self.counters[t] / total * 100:.0f}%)" for t in TIERS)
+        logging.info(f"🧮 Prior di lega su {total} esiti: {parts}.")
+        self.counters = dict.fromkeys(TIERS, 0)
+
+
+_cached = None
+_cached_mtime = None
+
+
+def get_league_priors():
+    """
+    Prior di lega del processo: il file si rilegge solo se historical_analysis
+    l'ha rigenerato (mtime cambiata). None se non esiste ancora.
+    """
+    global _cached, _cached_mtime
+    try:
+        mtime = os.stat(historical_analysis.LEAGUE_STATS).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _cached is None or mtime != _cached_mtime:
+        table = historical_analysis.load_league_stats()
+        if table is None:
+            return None
+        _cached, _cached_mtime = LeaguePriors(table), mtime
+        logging.info(f"📚 Prior di lega caricati: {len(table)} leghe.")
+    return _cached
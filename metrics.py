@@ -0,0 +1,221 @@
+import os
+import io
+import json
+import time
+import pstats
+import logging
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource   # non disponibile su Windows
+except ImportError:
+    resource = None
+
+# Strumentazione dei job: tempi per fase e sport, contatori, report JSON/Prometheus
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join("cache", "metrics"))
+METRICS_HISTORY = 500            # run tenuti in runs.jsonl
+PROFILE_TOP = 25                 # righe di hotspot nel dump del profilo
+
+
+def peak_rss_mb():
+    """Picco di memoria residente del processo (MB), o None se non misurabile."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux in KB, macOS in byte
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def payload_counts(matches: list) -> dict:
+    """Eventi, bookmaker, mercati ed esiti (righe scansionate) di un payload Odds API."""
+    bookmakers = markets = outcomes = 0
+    for match in matches:
+        for bookmaker in match.get("bookmakers", []) or []:
+            bookmakers += 1
+            for market in bookmaker.get("markets", []) or []:
+                markets += 1
+                outcomes += len(market.get("outcomes", []) or [])
+    return {"events": len(matches), "bookmakers": bookmakers, "markets": markets, "outcomes": outcomes}
+
+
+class RunMetrics:
+    """
+    Misure di un singolo run del job. Le fasi sono cronometrate con
+    stage(nome, sport) e sommate per (fase, sport); i contatori con count().
+    sport è lo sport key, o la categoria per le fasi condivise (storici);
+    None per le fasi dell'intero run.
+    """
+
+    def __init__(self, name: str = "job"):
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self.stages = {}     # (fase, sport) → {"ms", "calls"}
+        self.counters = {}   # (nome, sport) → valore
+
+    @contextmanager
+    def stage(self, stage: str, sport: str = None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, sport, (time.perf_counter() - t0) * 1000)
+
+    def add_time(self, stage: str, sport: str, ms: float):
+        s = self.stages.setdefault((stage, sport), {"ms": 0.0, "calls": 0})
+        s["ms"] += ms
+        s["calls"] += 1
+
+    def count(self, name: str, n=1, sport: str = None):
+        self.counters[(name, sport)] = self.counters.get((name, sport), 0) + n
+
+    def finish(self) -> dict:
+        """Chiude il run e ritorna il report (dict serializzabile in JSON)."""
+        self.duration = time.perf_counter() - self._t0
+        return self.report()
+
+    def report(self) -> dict:
+        duration = self.duration if self.duration is not None else time.perf_counter() - self._t0
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_s": round(duration, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1) if resource is not None else None,
+            "stages": [{"stage": st, "sport": sp, "ms": round(v["ms"], 2), "calls": v["calls"]}
+                       for (st, sp), v in self.stages.items()],
+            "counters": [{"name": n, "sport": sp, "value": v} for (n, sp), v in self.counters.items()],
+        }
+
+    def log_summary(self, top: int = 5):
+        r = self.report()
+        totals = {}
+        for s in r["stages"]:
+            totals[s["stage"]] = totals.get(s["stage"], 0.0) + s["ms"]
+        by_stage = ", ".join(f"{k} {v:.0f} ms" for k, v in sorted(totals.items(), key=lambda x: -x[1]))
+        slowest = sorted((s for s in r["stages"] if s["sport"]), key=lambda s: -s["ms"])[:top]
+        rss = f", picco RSS {r['peak_rss_mb']:.0f} MB" if r["peak_rss_mb"] is not None else ""
+        logging.info(f"⏱️ Run {self.name} in {r['duration_s']:.1f}s{rss} | {by_stage}")
+        if slowest:
+            logging.info("🐢 Più lenti: " + ", ".join(f"{s['stage']}/{s['sport']} {s['ms']:.0f} ms" for s in slowest))
+
+
+# --- Export ---
+def _atomic_write(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def write_json(report: dict, directory: str = None):
+    """last_<nome>.json con l'ultimo run e una riga in runs.jsonl (ultimi METRICS_HISTORY run)."""
+    directory = directory or METRICS_DIR
+    _atomic_write(os.path.join(directory, f"last_{report['name']}.json"), json.dumps(report, indent=2))
+    history = os.path.join(directory, "runs.jsonl")
+    try:
+        with open(history, encoding="utf-8") as f:
+            lines = f.readlines()[-(METRICS_HISTORY - 1):]
+    except FileNotFoundError:
+        lines = []
+    lines.append(json.dumps(report) + "\n")
+    _atomic_write(history, "".join(lines))
+
+
+def _labels(**labels) -> str:
+    parts = [f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for k, v in labels.items() if v is not None]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def to_prometheus(report: dict) -> str:
+    """Formato testo di Prometheus (textfile collector di node_exporter): gauge dell'ultimo run."""
+    job = report["name"]
+    lines = [
+        "# HELP bot_run_duration_seconds Durata dell'ultimo run.",
+        "# TYPE bot_run_duration_seconds gauge",
+        f"bot_run_duration_seconds{_labels(job=job)} {report['duration_s']}",
+        "# HELP bot_run_timestamp_seconds Inizio dell'ultimo run (epoch).",
+        "# TYPE bot_run_timestamp_seconds gauge",
+        f"bot_run_timestamp_seconds{_labels(job=job)} {report['started_at']:.0f}",
+    ]
+    if report.get("peak_rss_mb") is not None:
+        lines += [
+            "# HELP bot_peak_rss_bytes Picco di memoria residente del processo.",
+            "# TYPE bot_peak_rss_bytes gauge",
+            f"bot_peak_rss_bytes{_labels(job=job)} {int(report['peak_rss_mb'] * 1024 * 1024)}",
+        ]
+    lines += ["# HELP bot_stage_seconds Tempo per fase e sport nell'ultimo run.",
+              "# TYPE bot_stage_seconds gauge"]
+    lines += [f"bot_stage_seconds{_labels(job=job, stage=s['stage'], sport=s['sport'])} {s['ms'] / 1000:.6f}"
+              for s in report["stages"]]
+    lines += ["# HELP bot_run_items Contatori dell'ultimo run (eventi, mercati, righe...).",
+              "# TYPE bot_run_items gauge"]
+    lines += [f"bot_run_items{_labels(job=job, name=c['name'], sport=c['sport'])} {c['value']}"
+              for c in report["counters"]]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(report: dict, directory: str = None):
+    _atomic_write(os.path.join(directory or METRICS_DIR, f"{report['name']}.prom"), to_prometheus(report))
+
+
+def export(run: RunMetrics, directory: str = None) -> dict:
+    """Chiude il run, logga il riepilogo e scrive JSON e Prometheus; errori di scrittura solo a log."""
+    report = run.finish()
+    run.log_summary()
+    try:
+        write_json(report, directory)
+        write_prometheus(report, directory)
+    except Exception as e:
+        logging.warning(f"⚠️ Impossibile salvare le metriche del run: {e}")
+    return report
+
+
+# --- Profilo opzionale di un run ---
+@contextmanager
+def profile(mode: str, name: str = "job", directory: str = None):
+    """
+    mode: "cpu" (cProfile), "mem" (tracemalloc) o "all". A fine blocco salva
+    <nome>_<ora>.prof (apribile con pstats/snakeviz) e un riepilogo testuale
+    degli hotspot, che va anche a log.
+    """
+    directory = directory or METRICS_DIR
+    cpu = mode in ("cpu", "all")
+    mem = mode in ("mem", "all")
+    prof = cProfile.Profile() if cpu else None
+    if mem:
+        tracemalloc.start(10)
+    if prof:
+        prof.enable()
+    try:
+        yield
+    finally:
+        if prof:
+            prof.disable()
+        if mem:   # prima di pstats, che alloca a sua volta
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(directory, f"{name}_{stamp}")
+        out = io.StringIO()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if prof:
+                prof.dump_stats(base + ".prof")
+                out.write(f"== cProfile: prime {PROFILE_TOP} funzioni per tempo cumulativo ==\n")
+                pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            if mem:
+                out.write(f"== tracemalloc: picco {peak / 1024 / 1024:.1f} MB, "
+                          f"ancora allocati {current / 1024 / 1024:.1f} MB ==\n")
+                for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+                    out.write(f"{stat}\n")
+            _atomic_write(base + ".txt", out.getvalue())
+            logging.info(f"🔬 Profilo {mode} salvato in {base}.txt\n{out.getvalue()}")
+        except Exception as e:
+            logging.warning(f"⚠️ Impossibile salvare il profilo: {e}")
+        finally:
+            if mem:
+                tracemalloc.stop()
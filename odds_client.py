@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+# Base URL configurabile: in locale si può puntare a uno stand-in dell'Odds API
+ODDS_API_BASE = os.getenv("ODDS_API_BASE", "https://api.the-odds-api.com/v4")
+ODDS_CONCURRENCY = int(os.getenv("ODDS_CONCURRENCY", "6"))
+ODDS_TIMEOUT = float(os.getenv("ODDS_TIMEOUT", "15"))
+POOL_SIZE = max(ODDS_CONCURRENCY, 32)  # connessioni riutilizzabili (>= worker)
+
+# Cache risposte su disco + budget quota Odds API
+ODDS_CACHE_DIR = os.getenv("ODDS_CACHE_DIR", os.path.join("cache", "odds"))
+ODDS_CACHE_TTL = int(os.getenv("ODDS_CACHE_TTL", "1800"))          # secondi
+ODDS_QUOTA_RESERVE = int(os.getenv("ODDS_QUOTA_RESERVE", "100"))   # crediti da non toccare
+ODDS_REGIONS = "eu"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Sessione HTTP condivisa con pool di connessioni (keep-alive tra le richieste)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+def markets_for(sport: str) -> str:
+    if sport.startswith("soccer_"):
+        return "h2h,btts,totals,spreads"
+    return "h2h,totals"
+
+
+def request_cost(sport: str) -> int:
+    """Crediti Odds API consumati da una richiesta: mercati × regioni."""
+    return len(markets_for(sport).split(",")) * len(ODDS_REGIONS.split(","))
+
+
+class OddsCache:
+    """Ultima risposta per sport su disco (cache/odds/<sport>.json) con timestamp."""
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or ODDS_CACHE_DIR
+
+    def _path(self, sport: str) -> str:
+        return os.path.join(self.cache_dir, f"{sport}.json")
+
+    def get(self, sport: str):
+        """Ritorna (eventi, età in secondi) oppure None."""
+        try:
+            with open(self._path(sport), encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"⚠️ Cache odds {sport} non leggibile: {e}")
+            return None
+        if entry.get("markets") != markets_for(sport):
+            return None
+        return entry["data"], time.time() - entry["fetched_at"]
+
+    def put(self, sport: str, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(sport) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": time.time(), "markets": markets_for(sport), "data": data}, f)
+            os.replace(tmp, self._path(sport))
+        except Exception as e:
+            logging.warning(f"⚠️ Impossibile salvare cache odds {sport}: {e}")
+
+
+class QuotaBudget:
+    """
+    Stato della quota letto dagli header x-requests-remaining / x-requests-used
+    e salvato su disco, così il run successivo parte dall'ultimo valore noto.
+    """
+
+    def __init__(self, cache_dir: str = None, reserve: int = None):
+        self.path = os.path.join(cache_dir or ODDS_CACHE_DIR, "_quota.json")
+        self.reserve = ODDS_QUOTA_RESERVE if reserve is None else reserve
+        self.remaining = None
+        self.used = None
+        self._seen = False   # valori aggiornati da una risposta di questo run
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.remaining = state.get("remaining")
+            self.used = state.get("used")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"⚠️ Stato quota odds non leggibile: {e}")
+
+    def update(self, headers):
+        remaining = headers.get("x-requests-remaining")
+        used = headers.get("x-requests-used")
+        with self._lock:
+            try:
+                # la prima risposta del run sostituisce lo stato salvato (la quota
+                # può essersi rinnovata); poi, con richieste in parallelo, vince
+                # il valore più aggiornato
+                if remaining is not None:
+                    value = int(float(remaining))
+                    self.remaining = value if not self._seen else min(self.remaining, value)
+                if used is not None:
+                    value = int(float(used))
+                    self.used = value if not self._seen or self.used is None else max(self.used, value)
+                if remaining is not None:
+                    self._seen = True
+            except ValueError:
+                pass
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"remaining": self.remaining, "used": self.used, "saved_at": time.time()}, f)
+        except Exception as e:
+            logging.warning(f"⚠️ Impossibile salvare stato quota odds: {e}")
+
+    def plan(self, sports, priority=None):
+        """
+        Divide gli sport in (da_scaricare, rimandati). Con quota sconosciuta
+        scarica tutto; altrimenti serve prima gli sport a priorità alta e
+        rimanda gli altri quando si scenderebbe sotto la riserva.
+        """
+        priority = priority or {}
+        if self.remaining is None:
+            return list(sports), []
+        fetch, deferred = [], []
+        budget = self.remaining
+        for sport in sorted(sports, key=lambda s: -priority.get(s, 0)):
+            cost = request_cost(sport)
+            high = priority.get(sport, 0) > 0
+            if budget - cost >= self.reserve or (high and budget - cost >= 0):
+                fetch.append(sport)
+                budget -= cost
+            else:
+                deferred.append(sport)
+        return fetch, deferred
+
+
+def fetch_odds(sport: str, api_key: str, base_url: str = None, session=None, budget=None):
+    """
+    Una richiesta /sports/<sport>/odds.
+    Ritorna (eventi, metrica) dove metrica = {sport, ms, status, events, error, source}.
+    In caso di errore gli eventi sono [] come nel vecchio get_odds.
+    """
+    url = f"{base_url or ODDS_API_BASE}/sports/{sport}/odds"
+    params = {
+        "apiKey": api_key,
+        "regions": ODDS_REGIONS,
+        "markets": markets_for(sport),
+        "oddsFormat": "decimal",
+        "dateFormat": "iso"
+    }
+    metric = {"sport": sport, "ms": 0.0, "status": None, "events": 0, "error": None, "source": "api"}
+    t0 = time.perf_counter()
+    try:
+        r = (session or get_session()).get(url, params=params, timeout=ODDS_TIMEOUT)
+        metric["status"] = r.status_code
+        if budget is not None:
+            budget.update(r.headers)
+        metric["cost"] = int(float(r.headers.get("x-requests-last", 0) or 0))
+        r.raise_for_status()
+        data = r.json()
+        metric["events"] = len(data)
+        return data, metric
+    except Exception as e:
+        metric["error"] = str(e)
+        logging.error(f"{sport} error: {e}")
+        return [], metric
+    finally:
+        metric["ms"] = (time.perf_counter() - t0) * 1000
+
+
+def fetch_all(sports, api_key: str, max_workers: int = None, base_url: str = None,
+              priority=None, ttl: int = None, cache=None, budget=None):
+    """
+    Quote di tutti gli sport. Ritorna ({sport: eventi}, [metriche]).
+      - risposte più giovani di ttl secondi arrivano dalla cache su disco;
+      - gli sport restanti sono pianificati sul budget di quota (priority:
+        sport → peso, > 0 = alta priorità) e quelli rimandati usano l'ultima
+        risposta in cache, anche scaduta;
+      - le richieste reali partono in parallelo (al massimo max_workers).
+    """
+    sports = list(sports)
+    ttl = ODDS_CACHE_TTL if ttl is None else ttl
+    cache = cache or OddsCache()
+    budget = budget or QuotaBudget()
+
+    odds, metrics, to_fetch = {}, [], []
+    cached = {s: cache.get(s) for s in sports}
+    for s in sports:
+        hit = cached[s]
+        if hit is not None and hit[1] < ttl:
+            odds[s] = hit[0]
+            metrics.append({"sport": s, "ms": 0.0, "status": None, "events": len(hit[0]), "error": None, "source": "cache"})
+        else:
+            to_fetch.append(s)
+
+    to_fetch, deferred = budget.plan(to_fetch, priority)
+    for s in deferred:
+        stale = cached[s][0] if cached[s] is not None else []
+        odds[s] = stale
+        metrics.append({"sport": s, "ms": 0.0, "status": None, "events": len(stale), "error": None, "source": "deferred"})
+    if deferred:
+        logging.warning(f"🪫 Quota odds bassa ({budget.remaining} rimaste): rimandati {', '.join(deferred)}.")
+
+    workers = max(1, min(max_workers or ODDS_CONCURRENCY, len(to_fetch) or 1))
+    session = get_session()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="odds") as pool:
+        futures = {s: pool.submit(fetch_odds, s, api_key, base_url, session, budget) for s in to_fetch}
+        for s, f in futures.items():
+            data, m = f.result()
+            if m["error"] is None:
+                cache.put(s, data)
+            elif cached[s] is not None:
+                data = cached[s][0]   # errore API: meglio l'ultima risposta nota che niente
+                m["source"] = "stale"
+            odds[s] = data
+            metrics.append(m)
+    wall = (time.perf_counter() - t0) * 1000
+    budget.save()
+
+    fetched = [m for m in metrics if m["source"] in ("api", "stale")]
+    for m in fetched:
+        logging.info(f"⏱️ Odds {m['sport']}: {m['ms']:.0f} ms, HTTP {m['status']}, {m['events']} eventi.")
+    if fetched:
+        slowest = max(fetched, key=lambda m: m["ms"])
+        total = sum(m["ms"] for m in fetched)
+        logging.info(
+            f"🌐 Odds: {len(fetched)} richieste in {wall:.0f} ms "
+            f"(somma richieste {total:.0f} ms, più lenta {slowest['sport']} {slowest['ms']:.0f} ms, {workers} worker)."
+        )
+
+    hits = sum(1 for m in metrics if m["source"] == "cache")
+    spent = sum(m.get("cost", 0) for m in fetched)
+    hit_rate = (hits / len(sports) * 100) if sports else 0
+    logging.info(
+        f"📦 Cache odds: {hits}/{len(sports)} hit ({hit_rate:.0f}%), {len(fetched)} richieste API, "
+        f"{len(deferred)} rimandati | quota usata nel run: {spent}, "
+        f"rimanente: {budget.remaining if budget.remaining is not None else 'n/d'}"
+    )
+    return {s: odds[s] for s in sports}, metrics
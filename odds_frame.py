@@ -0,0 +1,322 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Colonne della tabella "lunga" delle quote: una riga per esito
+ODDS_COLUMNS = ["sport", "event", "bookmaker", "market", "point", "outcome", "price", "n_outcomes", "group"]
+# Esiti coperti dal modello gol (goal_model) → colonna di events con la probabilità
+MODEL_MARKETS = {("totals", "Over"): "model_over", ("totals", "Under"): "model_under",
+                 ("btts", "Yes"): "model_btts_yes", ("btts", "No"): "model_btts_no"}
+
+
+def flatten_odds(sport: str, matches: list):
+    """
+    Come _flatten_python, ma se possibile lascia a pyarrow l'esplosione delle
+    liste annidate (partita → bookmaker → mercato → esito), in C++ invece che
+    con un ciclo Python per esito. Payload con tipi inattesi usano il percorso
+    Python, che conta le partite malformate.
+    """
+    if matches:
+        try:
+            return _flatten_arrow(sport, matches)
+        except (pa.ArrowException, TypeError, ValueError, KeyError):
+            pass
+    return _flatten_python(sport, matches)
+
+
+def _field(arr, name: str, default=None):
+    """Campo di uno StructArray; se manca in tutto il payload, colonna di null/default."""
+    if arr.type.get_field_index(name) >= 0:
+        values = pc.struct_field(arr, name)
+    else:
+        values = pa.nulls(len(arr))
+    if default is not None:
+        values = pc.fill_null(values.cast(pa.string()), default)
+    return values
+
+
+def _categorical(values, index=None):
+    """
+    Stringhe come pd.Categorical: niente oggetti Python per riga. Con index i
+    valori (per bookmaker o per mercato) vengono ripetuti sulle righe esito.
+    """
+    encoded = pc.dictionary_encode(values)
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    if index is not None:
+        codes = codes[index]
+    return pd.Categorical.from_codes(codes, categories=encoded.dictionary.to_pandas().astype(object))
+
+
+def _flatten_arrow(sport: str, matches: list):
+    ev = pa.array(matches)
+    if not pa.types.is_struct(ev.type):
+        raise TypeError("payload non è una lista di oggetti")
+
+    ct = _field(ev, "commence_time")
+    has_ct = pc.fill_null(pc.greater(pc.utf8_length(ct.cast(pa.string())), 0), False)
+    keep = np.flatnonzero(has_ct.to_numpy(zero_copy_only=False))
+    ev = ev.take(pa.array(keep, type=pa.int64()))
+
+    events = pd.DataFrame({
+        "event": keep.astype(np.int64),
+        "id": _field(ev, "id").to_pandas(),
+        "home": _field(ev, "home_team", "Home").to_pandas(),
+        "away": _field(ev, "away_team", "Away").to_pandas(),
+        "commence_time": pd.to_datetime(_field(ev, "commence_time").to_pandas().astype(object),
+                                        utc=True, format="ISO8601", errors="coerce"),
+    })
+
+    empty = pa.array([], type=pa.list_(pa.struct([])))
+    bookmakers = _field(ev, "bookmakers") if ev.type.get_field_index("bookmakers") >= 0 else empty
+    if len(keep) == 0 or pa.types.is_null(bookmakers.type) or len(pc.list_flatten(bookmakers)) == 0:
+        odds = pd.DataFrame({c: pd.Series(dtype=float if c in ("point", "price") else object) for c in ODDS_COLUMNS})
+    else:
+        books = pc.list_flatten(bookmakers)
+        book_event = keep[pc.list_parent_indices(bookmakers).to_numpy()]
+        markets_l = _field(books, "markets")
+        markets = pc.list_flatten(markets_l)
+        market_book = pc.list_parent_indices(markets_l).to_numpy()
+        outcomes_l = _field(markets, "outcomes")
+        outcomes = pc.list_flatten(outcomes_l)
+        outcome_market = pc.list_parent_indices(outcomes_l).to_numpy()
+        n_outcomes = pc.fill_null(pc.list_value_length(outcomes_l), 0).to_numpy(zero_copy_only=False)
+
+        market_of = outcome_market
+        book_of = market_book[market_of]
+        odds = pd.DataFrame({
+            "sport": sport,
+            "event": book_event[book_of].astype(np.int64),
+            "bookmaker": _categorical(_field(books, "title", "Sconosciuto"), book_of),
+            "market": _categorical(_field(markets, "key", ""), market_of),
+            "point": pd.to_numeric(_field(outcomes, "point").to_pandas(), errors="coerce").to_numpy(),
+            "outcome": _categorical(_field(outcomes, "name", "N/D")),
+            "price": pd.to_numeric(_field(outcomes, "price").to_pandas(), errors="coerce").to_numpy(),
+            "n_outcomes": n_outcomes[market_of].astype(np.int64),
+            "group": (market_of + 1).astype(np.int64),
+        })
+
+    errors = events.loc[events["commence_time"].isna(), "event"].tolist()
+    events = events[events["commence_time"].notna()].reset_index(drop=True)
+    events.attrs["errors"] = errors
+    return events, odds
+
+
+def _flatten_python(sport: str, matches: list):
+    """
+    Appiattisce il JSON di get_odds in due tabelle:
+      - events: una riga per partita (event, id, home, away, commence_time)
+      - odds:   una riga per esito (sport, event, bookmaker, market, point, outcome, price)
+    `event` è la posizione della partita nel payload, `group` identifica il
+    singolo mercato di un bookmaker; n_outcomes è il numero di esiti del
+    mercato prima di qualsiasi filtro. Le posizioni delle partite malformate
+    sono in events.attrs["errors"].
+    """
+    ev_rows, rows = [], []
+    errors = []
+    group = 0
+
+    for i, match in enumerate(matches):
+        try:
+            ct = match.get("commence_time")
+            if not ct:
+                continue
+            match_rows = []
+            for bookmaker in match.get("bookmakers", []):
+                bookmaker_name = bookmaker.get("title", "Sconosciuto")
+                for market in bookmaker.get("markets", []):
+                    outcomes = market.get("outcomes", [])
+                    market_key = market.get("key", "")
+                    n = len(outcomes)
+                    group += 1
+                    match_rows.extend(
+                        (i, bookmaker_name, market_key, o.get("point"), o.get("name", "N/D"), o.get("price"), n, group)
+                        for o in outcomes
+                    )
+            ev_rows.append((i, match.get("id"), match.get("home_team", "Home"), match.get("away_team", "Away"), ct))
+        except Exception:
+            errors.append(i)
+            continue
+        rows.extend(match_rows)
+
+    events = pd.DataFrame.from_records(ev_rows, columns=["event", "id", "home", "away", "commence_time"])
+    events["event"] = events["event"].astype(np.int64)
+    events["commence_time"] = pd.to_datetime(events["commence_time"].astype(object), utc=True,
+                                             format="ISO8601", errors="coerce")
+    errors = sorted(errors + events.loc[events["commence_time"].isna(), "event"].tolist())
+    events = events[events["commence_time"].notna()].reset_index(drop=True)
+    events.attrs["errors"] = errors
+
+    odds = pd.DataFrame.from_records(rows, columns=[c for c in ODDS_COLUMNS if c != "sport"])
+    odds.insert(0, "sport", sport)
+    odds["event"] = odds["event"].astype(np.int64)
+    odds["group"] = odds["group"].astype(np.int64)
+    odds["n_outcomes"] = odds["n_outcomes"].astype(np.int64)
+    odds["point"] = pd.to_numeric(odds["point"], errors="coerce")
+    odds["price"] = pd.to_numeric(odds["price"], errors="coerce")
+    return events, odds
+
+
+def filter_window(events, now=None, days: int = 2):
+    """Partite che iniziano tra adesso e adesso + days giorni."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    start = pd.Timestamp(now)
+    end = start + pd.Timedelta(days=days)
+    ct = events["commence_time"]
+    return events[(ct > start) & (ct < end)].reset_index(drop=True)
+
+
+def valid_markets(sport: str, odds, events):
+    """
+    Esiti utilizzabili, con le stesse regole del ciclo in analyze_matches:
+      - solo partite in `events`, mercati con almeno 2 esiti;
+      - per il calcio, dei totals si tengono solo gli esiti a 2.5;
+      - mercati con quote mancanti o non positive scartati.
+    """
+    df = odds[odds["event"].isin(events["event"]) & (odds["n_outcomes"] >= 2)]
+    if sport.startswith("soccer_"):
+        df = df[(df["market"] != "totals") | (df["point"] == 2.5)]
+    if df.empty:
+        return df
+
+    group = df["group"].to_numpy()
+    bad = ~(df["price"] > 0)   # NaN o <= 0
+    bad_groups = np.unique(group[bad.to_numpy()])
+    return df[~np.isin(group, bad_groups)]
+
+
+def best_prices(sport: str, odds, events):
+    """Per ogni (partita, bookmaker, mercato) l'esito con la quota più bassa."""
+    df = valid_markets(sport, odds, events)
+    if df.empty:
+        return df
+    # idxmin prende il primo minimo, come min(..., key=...)
+    return df.loc[df.groupby("group", sort=True)["price"].idxmin()]
+
+
+def consensus(sport: str, odds, events):
+    """
+    Aggregazione tra bookmaker per (partita, mercato, linea, esito):
+      - best_price / best_bookmaker: quota più alta disponibile;
+      - median_price: quota mediana;
+      - consensus_prob: media delle probabilità senza margine (1/quota
+        normalizzate sul singolo mercato di ogni bookmaker);
+      - n_books: bookmaker che quotano l'esito.
+    La linea è |point| (totals 2.5 = Over/Under 2.5, spreads ±0.5 = stessa linea).
+    """
+    df = valid_markets(sport, odds, events)
+    if df.empty:
+        return pd.DataFrame(columns=["event", "market", "line", "outcome", "best_price", "best_bookmaker",
+                                     "median_price", "consensus_prob", "n_books"])
+
+    df = df.assign(line=df["point"].abs().fillna(0.0), inv=1.0 / df["price"])
+    book_market = df.groupby(["group", "line"], sort=False, observed=True)
+    df = df.assign(
+        fair=df["inv"] / book_market["inv"].transform("sum"),
+        n_line=book_market["inv"].transform("size"),
+    )
+    df = df[df["n_line"] >= 2]   # linea con un solo esito: niente margine da togliere
+
+    keys = ["event", "market", "line", "outcome"]
+    grouped = df.groupby(keys, sort=False, observed=True)
+    out = grouped.agg(
+        best_price=("price", "max"),
+        median_price=("price", "median"),
+        consensus_prob=("fair", "mean"),
+        n_books=("group", "nunique"),
+    )
+    out["best_bookmaker"] = df.loc[grouped["price"].idxmax(), "bookmaker"].to_numpy()
+    return out.reset_index()
+
+
+def _with_history(events, stats):
+    if stats is not None and not events.empty:
+        events["prob_csv"] = [stats.prob_csv(h, a) for h, a in zip(events["home"], events["away"])]
+        events["n_games"] = [stats.games(h, a) for h, a in zip(events["home"], events["away"])]
+        events["n_weight"] = [stats.weight(h, a) for h, a in zip(events["home"], events["away"])]
+    else:
+        events["prob_csv"] = None
+        events["n_games"] = 0
+        events["n_weight"] = 0
+    events["prob_csv"] = pd.to_numeric(events["prob_csv"], errors="coerce")
+    return events
+
+
+def _with_goal_model(events, goals):
+    """Probabilità del modello gol per partita (Over/Under 2.5, BTTS); NaN senza modello."""
+    if goals is not None and not events.empty:
+        table = goals.probabilities(events["home"].astype(str), events["away"].astype(str))
+        for col, name in zip(MODEL_MARKETS.values(), ("over", "under", "btts_yes", "btts_no")):
+            events[col] = table[name].to_numpy()
+    else:
+        for col in MODEL_MARKETS.values():
+            events[col] = np.nan
+    return events
+
+
+def score(sport: str, matches: list, stats=None, now=None, api_weight: float = 0.6, csv_weight: float = 0.4,
+          use_consensus: bool = False, goals=None, priors=None):
+    """
+    Pipeline vettoriale: flatten → finestra 48h → miglior quota per mercato →
+    probabilità implicita e combinazione con lo storico.
+    Con use_consensus una riga per (partita, mercato, linea): l'esito favorito
+    secondo il consenso, alla quota migliore, con prob_api = probabilità di
+    consenso senza margine invece di 1/quota del singolo bookmaker.
+    Con goals (goal_model.GoalModel) Over/Under 2.5 e BTTS usano la
+    probabilità del modello gol al posto di prob_csv nella combinazione.
+    Con priors (league_priors.LeaguePriors) gli altri esiti combinano
+    prob_csv con la baseline di lega quando lo storico squadra è scarso.
+    Ritorna (events, picks, errors); picks ha una riga per mercato con
+    quota, prob_api e probability, errors le posizioni delle partite malformate.
+    """
+    events, odds = flatten_odds(sport, matches)
+    errors = events.attrs.get("errors", [])
+    events = _with_goal_model(_with_history(filter_window(events, now), stats), goals)
+
+    if use_consensus:
+        table = consensus(sport, odds, events)
+        if table.empty:
+            return events, table, errors
+        # esito favorito (probabilità di consenso più alta) per mercato e linea
+        fav = table.loc[table.groupby(["event", "market", "line"], sort=False, observed=True)["consensus_prob"].idxmax()]
+        picks = fav.rename(columns={"best_price": "price", "best_bookmaker": "bookmaker"})
+        picks = picks.sort_values("event", kind="stable").reset_index(drop=True)
+        picks["prob_api"] = np.round(picks["consensus_prob"] * 100.0, 1)
+    else:
+        picks = best_prices(sport, odds, events)
+        if picks.empty:
+            return events, picks, errors
+        picks = picks.copy()
+        picks["prob_api"] = np.round(100.0 / picks["price"], 1)
+
+    model_cols = list(MODEL_MARKETS.values())
+    picks = picks.merge(events[["event", "home", "away", "commence_time", "prob_csv", "n_games", "n_weight"] + model_cols],
+                        on="event", how="left")
+    hist = picks["prob_csv"]
+    model = pd.Series(np.nan, index=picks.index)
+    if goals is not None:
+        for (market, outcome), col in MODEL_MARKETS.items():
+            mask = (picks["market"] == market) & (picks["outcome"] == outcome)
+            model = model.where(~mask, picks[col])
+    if priors is not None:
+        rest = model.isna().to_numpy()
+        sub = picks[rest]
+        point = sub["point"] if "point" in sub else sub["line"]
+        prior = priors.prior_vector(sport, sub["market"], sub["outcome"], point, sub["home"], sub["away"])
+        hist = hist.astype("float64").copy()
+        same = priors.team_outcome_vector(sub["market"], sub["outcome"], sub["home"])
+        hist.loc[rest] = priors.apply_vector(sub["prob_csv"], sub["n_games"], prior, sub["n_weight"], same)
+    hist = model.fillna(hist)
+    combined = np.round(picks["prob_api"] * api_weight + hist * csv_weight, 1)
+    picks["probability"] = combined.where(hist.notna(), picks["prob_api"])
+    return events, picks, errors
+
+
+def apply_thresholds(picks, min_prob: float, min_quota: float):
+    """Colonne booleane accepted / low_prob / low_quota calcolate in blocco."""
+    picks = picks.copy()
+    picks["low_prob"] = picks["probability"] < min_prob
+    picks["low_quota"] = picks["price"] < min_quota
+    picks["accepted"] = ~(picks["low_prob"] | picks["low_quota"])
+    return picks
@@ -0,0 +1,282 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+import statistics
+
+from dedup_store import prediction_key, _to_epoch
+
+# Storico delle quote scaricate: movimenti di linea e closing line value
+ODDS_HISTORY_DB = os.getenv("ODDS_HISTORY_DB", os.path.join("cache", "odds_history.sqlite"))
+ODDS_HISTORY_DAYS = float(os.getenv("ODDS_HISTORY_DAYS", "30"))          # partite iniziate da più giorni: eliminate
+ODDS_HISTORY_COMPACT_HOURS = float(os.getenv("ODDS_HISTORY_COMPACT_HOURS", "6"))  # dopo l'inizio: solo apertura e chiusura
+ODDS_MOVE_PCT = float(os.getenv("ODDS_MOVE_PCT", "5"))                   # variazione % dall'apertura segnalata
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    eid INTEGER PRIMARY KEY,
+    event_key TEXT NOT NULL UNIQUE,
+    sport TEXT NOT NULL,
+    home TEXT, away TEXT,
+    commence_time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_commence ON events (commence_time);
+CREATE TABLE IF NOT EXISTS lines (
+    line_id INTEGER PRIMARY KEY,
+    eid INTEGER NOT NULL,
+    market TEXT NOT NULL, outcome TEXT NOT NULL, bookmaker TEXT NOT NULL, point REAL NOT NULL,
+    first_price REAL NOT NULL, first_ts INTEGER NOT NULL,
+    price REAL NOT NULL, ts INTEGER NOT NULL,
+    UNIQUE (eid, market, outcome, bookmaker, point)
+);
+CREATE TABLE IF NOT EXISTS prices (
+    line_id INTEGER NOT NULL, ts INTEGER NOT NULL, price REAL NOT NULL,
+    PRIMARY KEY (line_id, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS picks (
+    line_id INTEGER PRIMARY KEY,
+    price REAL NOT NULL, ts INTEGER NOT NULL,
+    closing_price REAL
+);
+"""
+
+
+def event_key(sport: str, event_id, home: str, away: str, commence_time) -> str:
+    """Id Odds API della partita; senza id, hash di sport, squadre e inizio."""
+    return str(event_id) if event_id else prediction_key(sport, home, away, int(_to_epoch(commence_time)))
+
+
+def _point(value) -> float:
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class OddsHistory:
+    """
+    Ogni risposta dell'Odds API salvata su SQLite in forma compatta:
+      - lines: una riga per (partita, mercato, esito, bookmaker, linea) con
+        quota di apertura e ultima quota;
+      - prices: serie storica (line_id, ts, quota), solo quando la quota
+        cambia; la chiave primaria è l'indice delle interrogazioni per partita;
+      - picks: quote dei pronostici inviati, per il closing line value.
+    prune() elimina le partite più vecchie di ODDS_HISTORY_DAYS e riduce a
+    apertura + chiusura le serie delle partite già iniziate.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or ODDS_HISTORY_DB
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")   # effettivo solo su un file nuovo
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    # --- scrittura ---
+    def record(self, sport: str, matches: list, fetched_at: float = None) -> int:
+        """Aggiunge uno snapshot del payload; ritorna quante quote nuove o cambiate ha scritto."""
+        ts = int(fetched_at if fetched_at is not None else time.time())
+        conn = self._db()
+        written = 0
+        with self._lock:
+            for match in matches:
+                ct = match.get("commence_time") if isinstance(match, dict) else None
+                if not ct:
+                    continue
+                try:
+                    commence = _to_epoch(ct)
+                except ValueError:
+                    continue
+                home, away = match.get("home_team"), match.get("away_team")
+                key = event_key(sport, match.get("id"), home, away, ct)
+                conn.execute(
+                    "INSERT INTO events (event_key, sport, home, away, commence_time) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (event_key) DO UPDATE SET commence_time = excluded.commence_time",
+                    (key, sport, home, away, commence),
+                )
+                eid = conn.execute("SELECT eid FROM events WHERE event_key = ?", (key,)).fetchone()[0]
+                latest = {
+                    (m, o, b, p): (line_id, price)
+                    for line_id, m, o, b, p, price in conn.execute(
+                        "SELECT line_id, market, outcome, bookmaker, point, price FROM lines WHERE eid = ?", (eid,))
+                }
+                new_lines, changed = [], []
+                for bookmaker in match.get("bookmakers", []) or []:
+                    book = bookmaker.get("title", "Sconosciuto")
+                    for market in bookmaker.get("markets", []) or []:
+                        mkey = market.get("key", "")
+                        for o in market.get("outcomes", []) or []:
+                            try:
+                                price = float(o["price"])
+                            except (KeyError, TypeError, ValueError):
+                                continue
+                            k = (mkey, o.get("name", "N/D"), book, _point(o.get("point")))
+                            prev = latest.get(k)
+                            if prev is None:
+                                new_lines.append((eid, *k, price, ts, price, ts))
+                            elif prev[1] != price:
+                                changed.append((prev[0], price))
+                if new_lines:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO lines (eid, market, outcome, bookmaker, point, first_price, first_ts, "
+                        "price, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", new_lines)
+                    conn.execute(
+                        "INSERT OR IGNORE INTO prices (line_id, ts, price) "
+                        "SELECT line_id, ts, price FROM lines WHERE eid = ? AND ts = ? AND first_ts = ?", (eid, ts, ts))
+                if changed:
+                    conn.executemany("UPDATE lines SET price = ?, ts = ? WHERE line_id = ?",
+                                     [(price, ts, line_id) for line_id, price in changed])
+                    conn.executemany("INSERT OR REPLACE INTO prices (line_id, ts, price) VALUES (?, ?, ?)",
+                                     [(line_id, ts, price) for line_id, price in changed])
+                written += len(new_lines) + len(changed)
+            conn.commit()
+        return written
+
+    def record_pick(self, sport: str, event_id, home: str, away: str, commence_time,
+                    market: str, outcome: str, bookmaker: str, point=None, price: float = None):
+        """Quota a cui è stato inviato un pronostico (la prima, se inviato più volte)."""
+        conn = self._db()
+        with self._lock:
+            row = conn.execute(
+                "SELECT l.line_id, l.price FROM lines l JOIN events e ON e.eid = l.eid "
+                "WHERE e.event_key = ? AND l.market = ? AND l.outcome = ? AND l.bookmaker = ? AND l.point = ?",
+                (event_key(sport, event_id, home, away, commence_time), market, outcome, bookmaker, _point(point)),
+            ).fetchone()
+            if row is None:
+                return
+            conn.execute("INSERT OR IGNORE INTO picks (line_id, price, ts) VALUES (?, ?, ?)",
+                         (row[0], price if price is not None else row[1], int(time.time())))
+            conn.commit()
+
+    # --- letture indicizzate ---
+    def history(self, sport: str, event_id, home: str = None, away: str = None, commence_time=None,
+                market: str = None, outcome: str = None):
+        """Serie delle quote di una partita: [(market, outcome, bookmaker, point, ts, price)] in ordine di tempo."""
+        sql = ("SELECT l.market, l.outcome, l.bookmaker, l.point, p.ts, p.price FROM events e "
+               "JOIN lines l ON l.eid = e.eid JOIN prices p ON p.line_id = l.line_id WHERE e.event_key = ?")
+        args = [event_key(sport, event_id, home, away, commence_time)]
+        if market is not None:
+            sql += " AND l.market = ?"
+            args.append(market)
+        if outcome is not None:
+            sql += " AND l.outcome = ?"
+            args.append(outcome)
+        return self._db().execute(sql + " ORDER BY p.ts, l.line_id", args).fetchall()
+
+    def movement(self, sport: str, event_id, home: str, away: str, commence_time,
+                 market: str, outcome: str, point=None):
+        """
+        Movimento dell'esito su tutti i bookmaker: mediana delle quote di
+        apertura e attuali, variazione % e ore trascorse. None senza storico.
+        """
+        point = _point(point)
+        rows = self._db().execute(
+            "SELECT l.first_price, l.price, l.first_ts, l.ts FROM events e JOIN lines l ON l.eid = e.eid "
+            "WHERE e.event_key = ? AND l.market = ? AND l.outcome = ? AND l.point IN (?, ?)",
+            (event_key(sport, event_id, home, away, commence_time), market, outcome, point, -point),
+        ).fetchall()
+        if not rows:
+            return None
+        opening = statistics.median(r[0] for r in rows)
+        current = statistics.median(r[1] for r in rows)
+        hours = (max(r[3] for r in rows) - min(r[2] for r in rows)) / 3600
+        return {"opening": opening, "current": current, "pct": (current / opening - 1) * 100,
+                "hours": hours, "books": len(rows)}
+
+    def move_note(self, *args, threshold: float = None):
+        """Riga per il messaggio se l'esito si è mosso oltre ODDS_MOVE_PCT dall'apertura, altrimenti None."""
+        threshold = ODDS_MOVE_PCT if threshold is None else threshold
+        try:
+            m = self.movement(*args)
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Storico quote non leggibile: {e}")
+            return None
+        if m is None or abs(m["pct"]) < threshold:
+            return None
+        icon = "📉" if m["pct"] < 0 else "📈"
+        return (f"{icon} Linea mossa: {m['opening']:.2f} → {m['current']:.2f} ({m['pct']:+.1f}%) "
+                f"in {m['hours']:.0f}h su {m['books']} bookmaker")
+
+    # --- closing line value ---
+    def closing_line_value(self, now: float = None):
+        """
+        Per i pronostici di partite già iniziate e non ancora valutati fissa la
+        quota di chiusura (ultima prima del calcio d'inizio) e ritorna
+        [(quota presa, quota di chiusura)]: CLV = presa / chiusura - 1.
+        """
+        now = time.time() if now is None else now
+        conn = self._db()
+        with self._lock:
+            rows = conn.execute(
+                "SELECT k.line_id, k.price, (SELECT p.price FROM prices p WHERE p.line_id = k.line_id "
+                "AND p.ts <= e.commence_time ORDER BY p.ts DESC LIMIT 1) "
+                "FROM picks k JOIN lines l ON l.line_id = k.line_id JOIN events e ON e.eid = l.eid "
+                "WHERE k.closing_price IS NULL AND e.commence_time <= ?", (now,)
+            ).fetchall()
+            rows = [(line_id, taken, close) for line_id, taken, close in rows if close]
+            conn.executemany("UPDATE picks SET closing_price = ? WHERE line_id = ?",
+                             [(close, line_id) for line_id, _, close in rows])
+            conn.commit()
+        return [(taken, close) for _, taken, close in rows]
+
+    def log_clv(self, now: float = None):
+        values = [taken / close - 1 for taken, close in self.closing_line_value(now)]
+        if values:
+            beat = sum(v > 0 for v in values) / len(values) * 100
+            logging.info(f"📐 Closing line value: {len(values)} pronostici chiusi, media {statistics.mean(values) * 100:+.1f}%, "
+                         f"quota di chiusura battuta nel {beat:.0f}% dei casi.")
+
+    # --- ritenzione ---
+    def prune(self, now: float = None) -> dict:
+        """
+        Elimina le partite iniziate da più di ODDS_HISTORY_DAYS; per quelle
+        iniziate da più di ODDS_HISTORY_COMPACT_HOURS tiene solo la prima quota
+        e l'ultima prima dell'inizio. Restituisce le righe tolte.
+        """
+        now = time.time() if now is None else now
+        conn = self._db()
+        with self._lock:
+            expired = "SELECT eid FROM events WHERE commence_time < ?"
+            cutoff = (now - ODDS_HISTORY_DAYS * 86400,)
+            lines_in = f"SELECT line_id FROM lines WHERE eid IN ({expired})"
+            removed = {
+                "prices": conn.execute(f"DELETE FROM prices WHERE line_id IN ({lines_in})", cutoff).rowcount,
+            }
+            conn.execute(f"DELETE FROM picks WHERE line_id IN ({lines_in})", cutoff)
+            conn.execute(f"DELETE FROM lines WHERE eid IN ({expired})", cutoff)
+            removed["events"] = conn.execute("DELETE FROM events WHERE commence_time < ?", cutoff).rowcount
+            # compattazione: dopo l'inizio restano apertura e chiusura
+            removed["compacted"] = conn.execute(
+                "DELETE FROM prices WHERE (line_id, ts) IN ("
+                " SELECT p.line_id, p.ts FROM prices p JOIN lines l ON l.line_id = p.line_id"
+                " JOIN events e ON e.eid = l.eid WHERE e.commence_time < ? AND p.ts > l.first_ts"
+                " AND p.ts != (SELECT MAX(q.ts) FROM prices q WHERE q.line_id = p.line_id AND q.ts <= e.commence_time))",
+                (now - ODDS_HISTORY_COMPACT_HOURS * 3600,),
+            ).rowcount
+            conn.commit()
+            if removed["prices"] or removed["compacted"]:
+                conn.execute("PRAGMA incremental_vacuum")
+        if any(removed.values()):
+            logging.info(f"🧹 Storico quote: tolte {removed['events']} partite, {removed['prices']} quote scadute, "
+                         f"{removed['compacted']} quote intermedie compattate.")
+        return removed
+
+    def stats(self) -> dict:
+        conn = self._db()
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("events", "lines", "prices", "picks")}
+        try:
+            counts["mb"] = os.path.getsize(self.path) / 1024 / 1024
+        except OSError:
+            counts["mb"] = 0.0
+        return counts
@@ -0,0 +1,95 @@
+import time
+import datetime
+import threading
+
+# Ultimi risultati del job in memoria, letti dai comandi Telegram (telegram_commands.py)
+
+
+def _kickoff(match: dict):
+    try:
+        return datetime.datetime.fromisoformat(match["commence_time"].replace("Z", "+00:00"))
+    except (KeyError, AttributeError, ValueError):
+        return None
+
+
+class ResultsCache:
+    """
+    Per sport: le partite dell'ultima risposta dell'Odds API (con la quota
+    migliore per esito h2h) e i pronostici accettati, che restano finché la
+    partita non inizia (il dedup non li rimanda nei run successivi).
+    Il job scrive con update(), i comandi leggono con sports()/events()/picks();
+    version cambia a ogni update, così chi legge può tenere in cache le risposte.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sports = {}   # sport → {"updated_at", "events": {(home, away): evento}, "picks": {(home, away): [testi]}}
+        self.version = 0
+
+    def update(self, sport: str, matches: list, accepted: list, now: datetime.datetime = None):
+        """accepted: [((casa, trasferta), testo)] come ritornato da bot.analyze_matches."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        events = {}
+        for match in matches:
+            start = _kickoff(match)
+            if start is None or start <= now:
+                continue
+            home, away = match.get("home_team", "Home"), match.get("away_team", "Away")
+            best = {}
+            for bookmaker in match.get("bookmakers", []) or []:
+                for market in bookmaker.get("markets", []) or []:
+                    if market.get("key") != "h2h":
+                        continue
+                    for o in market.get("outcomes", []) or []:
+                        try:
+                            price = float(o["price"])
+                        except (KeyError, TypeError, ValueError):
+                            continue
+                        if price > best.get(o.get("name"), (0, None))[0]:
+                            best[o.get("name")] = (price, bookmaker.get("title", "Sconosciuto"))
+            events[(home, away)] = {"home": home, "away": away, "start": start, "best": best}
+
+        with self._lock:
+            old = self._sports.get(sport, {})
+            starts = {k: e["start"] for k, e in old.get("events", {}).items()}
+            starts.update({k: e["start"] for k, e in events.items()})
+            picks = {k: list(v) for k, v in old.get("picks", {}).items() if k in starts and starts[k] > now}
+            for key, msg in accepted:
+                key = tuple(key)
+                if key in starts and starts[key] > now and msg not in picks.setdefault(key, []):
+                    picks[key].append(msg)
+            # partite sparite dal payload ma con pronostici ancora validi: restano con l'orario noto
+            for key in picks:
+                if key not in events:
+                    events[key] = old["events"][key]
+            self._sports[sport] = {"updated_at": time.time(), "events": events, "picks": picks}
+            self.version += 1
+
+    # --- letture (copie, sicure fuori dal lock) ---
+    def sports(self) -> dict:
+        """sport → (partite in arrivo, pronostici, epoch dell'ultimo aggiornamento)."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            return {
+                s: (sum(e["start"] > now for e in d["events"].values()),
+                    sum(len(p) for k, p in d["picks"].items() if d["events"][k]["start"] > now),
+                    d["updated_at"])
+                for s, d in self._sports.items()
+            }
+
+    def events(self, sport: str = None) -> list:
+        """Partite non ancora iniziate (di uno sport o di tutti) in ordine di inizio, con i loro pronostici."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        out = []
+        with self._lock:
+            for s, d in self._sports.items():
+                if sport is not None and s != sport:
+                    continue
+                for key, e in d["events"].items():
+                    if e["start"] > now:
+                        out.append(dict(e, sport=s, picks=list(d["picks"].get(key, []))))
+        return sorted(out, key=lambda e: e["start"])
+
+    def picks(self, sport: str = None) -> list:
+        """Pronostici accettati per partite non ancora iniziate, in ordine di inizio."""
+        return [msg for e in self.events(sport) for msg in e["picks"]]
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import logging
+import datetime
+from collections import deque
+
+from odds_client import request_cost
+
+# Scheduler adattivo: ogni sport si interroga più spesso man mano che si avvicina il prossimo calcio d'inizio
+SCHEDULER_STATE = os.getenv("SCHEDULER_STATE", os.path.join("cache", "scheduler.json"))
+# "ore al prossimo inizio:minuti tra due richieste", dal più vicino al più lontano (finestra di 48h)
+SCHED_INTERVALS = os.getenv("SCHED_INTERVALS", "1:15,3:30,6:60,24:180,48:360")
+SCHED_IDLE_MINUTES = int(os.getenv("SCHED_IDLE_MINUTES", "480"))        # nessuna partita entro 48h: primo ritardo...
+SCHED_IDLE_MAX_MINUTES = int(os.getenv("SCHED_IDLE_MAX_MINUTES", "1440"))  # ...raddoppiato fino a questo tetto
+SCHED_DAILY_BUDGET = int(os.getenv("SCHED_DAILY_BUDGET", "0"))          # crediti Odds API in 24h (0 = come 3 run fissi)
+SCHED_BURST = int(os.getenv("SCHED_BURST", "0"))                        # crediti spendibili di fila (0 = un run completo)
+SCHED_TICK_SECONDS = int(os.getenv("SCHED_TICK_SECONDS", "60"))
+FIXED_RUNS_PER_DAY = 3   # 07:00, 11:00, 17:00: riferimento del budget di default
+
+
+def parse_intervals(spec: str):
+    """"1:10,3:20" → [(3600, 600), (10800, 1200)] in secondi, ordinati per orizzonte."""
+    out = []
+    for part in spec.split(","):
+        hours, minutes = part.split(":")
+        out.append((float(hours) * 3600, float(minutes) * 60))
+    return sorted(out)
+
+
+def _kickoffs(matches: list) -> list:
+    """Orari di inizio (epoch) del payload, ordinati; quelli non leggibili si ignorano."""
+    out = []
+    for match in matches:
+        ct = match.get("commence_time") if isinstance(match, dict) else None
+        try:
+            out.append(datetime.datetime.fromisoformat(ct.replace("Z", "+00:00")).timestamp())
+        except (AttributeError, ValueError):
+            continue
+    return sorted(out)
+
+
+class KickoffScheduler:
+    """
+    Decide quali sport interrogare a ogni tick in base ai commence_time
+    dell'ultima risposta:
+      - l'intervallo tra due richieste dipende dalle ore al prossimo inizio
+        (SCHED_INTERVALS: 15 minuti nell'ultima ora, 6 ore a due giorni);
+      - senza partite nelle 48h l'intervallo parte da SCHED_IDLE_MINUTES e
+        raddoppia a ogni risposta vuota fino a SCHED_IDLE_MAX_MINUTES;
+      - una richiesta fallita o rimandata per quota non conta come risposta
+        vuota: si tengono i calci d'inizio noti; dopo un errore si riprova
+        dopo l'intervallo più breve, un rimando per quota raddoppia l'attesa
+        a ogni volta (fino a SCHED_IDLE_MAX_MINUTES);
+      - la spesa stimata (request_cost) passa da un token bucket che
+        accumula al massimo SCHED_BURST crediti e si ricarica del resto di
+        SCHED_DAILY_BUDGET in 24h; se non bastano passano prima gli sport
+        con l'inizio più vicino, gli altri aspettano la ricarica. I crediti
+        si scalano in observe e solo per le richieste arrivate all'API (non
+        per le risposte servite dalla cache o rimandate).
+    Lo stato è salvato su disco: un riavvio non riparte da zero.
+    """
+
+    def __init__(self, sports, budget: int = None, priority: dict = None, intervals=None, path: str = None):
+        self.sports = list(sports)
+        self.priority = priority or {}
+        self.intervals = parse_intervals(intervals or SCHED_INTERVALS)
+        self.min_interval = self.intervals[0][1]
+        full_run = sum(request_cost(s) for s in self.sports)
+        self.budget = budget or SCHED_DAILY_BUDGET or FIXED_RUNS_PER_DAY * full_run
+        # capacità + ricarica in 24h = budget: nessuna finestra di 24h lo supera
+        self.capacity = max(min(SCHED_BURST or full_run, self.budget / 2), max(map(request_cost, self.sports), default=0))
+        self.rate = max(self.budget - self.capacity, 0) / 86400
+        self.tokens = float(self.capacity)
+        self.refilled_at = None   # primo tick
+        self.path = path or SCHEDULER_STATE
+        self.state = {s: {"last_fetch": None, "kickoffs": [], "empty": 0, "retry_at": None, "deferred": 0} for s in self.sports}
+        self.spent = deque()   # (epoch, crediti) delle richieste nelle ultime 24h, solo per il log
+        self._skipped = []
+        self._load()
+
+    # --- persistenza ---
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            for sport, st in saved.get("sports", {}).items():
+                if sport in self.state:
+                    self.state[sport].update(st)
+            self.spent = deque(tuple(x) for x in saved.get("spent", []))
+            if "tokens" in saved:
+                self.tokens = min(float(saved["tokens"]), self.capacity)
+                self.refilled_at = saved["refilled_at"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"⚠️ Stato scheduler non leggibile: {e}")
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"sports": self.state, "spent": list(self.spent),
+                           "tokens": self.tokens, "refilled_at": self.refilled_at}, f)
+            os.replace(self.path + ".tmp", self.path)
+        except Exception as e:
+            logging.warning(f"⚠️ Impossibile salvare stato scheduler: {e}")
+
+    # --- politica ---
+    def next_kickoff(self, sport: str, now: float):
+        return next((k for k in self.state[sport]["kickoffs"] if k > now), None)
+
+    def interval(self, sport: str, now: float) -> float:
+        """Secondi tra due richieste per lo sport, adesso."""
+        kickoff = self.next_kickoff(sport, now)
+        if kickoff is not None:
+            until = kickoff - now
+            for horizon, every in self.intervals:
+                if until <= horizon:
+                    return every
+        empty = self.state[sport]["empty"]
+        return min(SCHED_IDLE_MAX_MINUTES * 60, SCHED_IDLE_MINUTES * 60 * 2 ** max(0, empty - 1))
+
+    def due_at(self, sport: str, now: float) -> float:
+        st = self.state[sport]
+        if st.get("retry_at") is not None:
+            return st["retry_at"]
+        last = st["last_fetch"]
+        return now if last is None else last + self.interval(sport, now)
+
+    def _refill(self, now: float):
+        if self.refilled_at is None:
+            self.refilled_at = now
+        elif now > self.refilled_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+            self.refilled_at = now
+
+    def spent_24h(self, now: float) -> int:
+        while self.spent and self.spent[0][0] <= now - 86400:
+            self.spent.popleft()
+        return sum(c for _, c in self.spent)
+
+    def due(self, now: float = None) -> list:
+        """
+        Sport da interrogare adesso, entro i crediti disponibili: prima
+        l'inizio più vicino, poi SPORT_PRIORITY. Quelli esclusi restano in
+        attesa. I crediti si scalano poi in observe, a richiesta fatta.
+        """
+        now = time.time() if now is None else now
+        ready = [s for s in self.sports if self.due_at(s, now) <= now]
+        if not ready:
+            return []
+
+        def urgency(s):
+            kickoff = self.next_kickoff(s, now)
+            return (kickoff if kickoff is not None else float("inf"), -self.priority.get(s, 0))
+
+        self._refill(now)
+        chosen, skipped = [], []
+        available = self.tokens
+        for sport in sorted(ready, key=urgency):
+            cost = request_cost(sport)
+            if cost <= available:
+                chosen.append(sport)
+                available -= cost
+            else:
+                skipped.append(sport)
+        if skipped and skipped != self._skipped:   # una riga quando cambia l'elenco, non a ogni tick
+            logging.warning(
+                f"🪫 Budget scheduler ({self.budget} crediti/24h, {self.tokens:.0f} disponibili): "
+                f"in attesa {', '.join(skipped)}."
+            )
+        self._skipped = skipped
+        return sorted(chosen, key=self.sports.index)
+
+    def observe(self, odds: dict, sources: dict = None, now: float = None):
+        """
+        Aggiorna lo stato con le risposte appena scaricate ({sport: eventi}).
+        sources: {sport: metrica di odds_client.fetch_all}; solo le richieste
+        con source "api" consumano crediti (senza sources: tutte). Gli sport
+        con errore o rimandati tengono i calci d'inizio noti: dopo un errore
+        si riprova presto, un rimando per quota allunga l'attesa a ogni volta.
+        """
+        now = time.time() if now is None else now
+        sources = sources or {}
+        self._refill(now)
+        failed, deferred = [], []
+        for sport, matches in odds.items():
+            if sport not in self.state:
+                continue
+            st = self.state[sport]
+            m = sources.get(sport)
+            if m is None or m.get("source") == "api":
+                cost = request_cost(sport)
+                self.tokens = max(0.0, self.tokens - cost)
+                self.spent.append((now, cost))
+            if m is not None and m.get("source") == "deferred":
+                st["deferred"] = st.get("deferred", 0) + 1
+                st["retry_at"] = now + min(SCHED_IDLE_MAX_MINUTES * 60, self.min_interval * 2 ** st["deferred"])
+                deferred.append(sport)
+                continue
+            if m is not None and m.get("error"):
+                st["retry_at"] = now + self.min_interval
+                failed.append(sport)
+                continue
+            kickoffs = [k for k in _kickoffs(matches) if now < k <= now + 48 * 3600]
+            st["last_fetch"] = now
+            st["retry_at"] = None
+            st["deferred"] = 0
+            st["kickoffs"] = kickoffs
+            st["empty"] = 0 if kickoffs else st["empty"] + 1
+        if failed:
+            logging.warning(f"🔁 Scheduler: nessuna risposta valida per {', '.join(failed)}, nuovo tentativo tra {self.min_interval / 60:.0f} min.")
+        if deferred:
+            waits = ", ".join(f"{s} tra {(self.state[s]['retry_at'] - now) / 60:.0f} min" for s in deferred)
+            logging.warning(f"🪫 Scheduler: rimandati per quota, nuovo tentativo {waits}.")
+        self.save()
+
+    def log_plan(self, now: float = None):
+        """Una riga per i prossimi sport in scadenza, per leggere le decisioni nel log."""
+        now = time.time() if now is None else now
+        upcoming = sorted(self.sports, key=lambda s: self.due_at(s, now))[:5]
+        parts = []
+        for s in upcoming:
+            kickoff = self.next_kickoff(s, now)
+            ko = f"inizio tra {(kickoff - now) / 3600:.1f}h" if kickoff else "nessuna partita"
+            parts.append(f"{s} tra {max(0, self.due_at(s, now) - now) / 60:.0f} min ({ko})")
+        logging.info(f"🗓️ Prossimi controlli: {'; '.join(parts)} | spesi {self.spent_24h(now)}/{self.budget} crediti in 24h.")
@@ -0,0 +1,226 @@
+import re
+import logging
+import numpy as np
+import pandas as pd
+
+# Tabella partite canonica: tutto il codice a valle legge solo queste colonne
+CANONICAL_COLUMNS = ["date", "home", "away", "home_score", "away_score", "result"]
+RESULTS = ("H", "D", "A")
+# Quote 1X2 registrate, se il file le ha (servono al backtest per il ROI)
+ODDS_COLUMNS = ["odds_home", "odds_draw", "odds_away"]
+# football-data.co.uk: media di mercato, poi i singoli bookmaker
+_ODDS_SOURCES = (("AvgH", "AvgD", "AvgA"), ("B365H", "B365D", "B365A"), ("PSH", "PSD", "PSA"), ("BWH", "BWD", "BWA"))
+
+_SCORE_RE = re.compile(r"^\s*(\d+)\s*-\s*(\d+)\s*$")
+_ISO_DATE_RE = r"^\d{4}-\d{2}-\d{2}"
+
+# Registro adapter: (nome, colonne richieste, funzione df → frame canonico).
+# L'ordine conta: vince il primo adapter le cui colonne sono tutte presenti.
+ADAPTERS = []
+
+
+def adapter(name: str, columns):
+    def register(fn):
+        ADAPTERS.append((name, frozenset(columns), fn))
+        return fn
+    return register
+
+
+def detect(columns):
+    """Nome e funzione del primo adapter compatibile con le colonne, oppure None."""
+    cols = set(columns)
+    for name, required, fn in ADAPTERS:
+        if required <= cols:
+            return name, fn
+    return None
+
+
+def normalize(df):
+    """
+    Frame grezzo di un CSV → (tabella canonica, nome adapter).
+    Ritorna (None, None) se nessun adapter riconosce il formato.
+    """
+    found = detect(df.columns)
+    if found is None:
+        return None, None
+    name, fn = found
+    return _finish(fn(df)), name
+
+
+# --- Helper comuni ---
+def _dates(values, dayfirst: bool = False, fmt: str = None):
+    """
+    dayfirst vale solo per le date tipo 31/12/2024: le ISO (2025-05-12) si
+    leggono sempre anno-mese-giorno, altrimenti pandas scambia giorno e mese.
+    """
+    if fmt:
+        return pd.to_datetime(values, format=fmt, errors="coerce")
+    if not dayfirst:
+        return pd.to_datetime(values, format="mixed", errors="coerce")
+    values = pd.Series(values).astype("string").str.strip()
+    iso = values.str.match(_ISO_DATE_RE).fillna(False)
+    out = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    if iso.any():
+        out[iso] = pd.to_datetime(values[iso], format="mixed", errors="coerce")
+    if (~iso).any():
+        out[~iso] = pd.to_datetime(values[~iso], format="mixed", dayfirst=True, errors="coerce")
+    return out
+
+
+def _scores(values):
+    return pd.to_numeric(values, errors="coerce").astype("float64")
+
+
+def _split_score(values):
+    """'2 - 3' → (2, 3); tutto il resto → NaN."""
+    parts = values.astype("string").str.extract(_SCORE_RE)
+    return _scores(parts[0]), _scores(parts[1])
+
+
+def _frame(date, home, away, home_score, away_score, result=None, odds=None):
+    df = pd.DataFrame({
+        "date": date,
+        "home": home,
+        "away": away,
+        "home_score": home_score,
+        "away_score": away_score,
+        "result": result if result is not None else pd.NA,
+    })
+    if odds is not None:
+        for col, values in zip(ODDS_COLUMNS, odds):
+            df[col] = values
+    return df
+
+
+def _odds_1x2(df):
+    for cols in _ODDS_SOURCES:
+        if set(cols) <= set(df.columns):
+            return [_scores(df[c]) for c in cols]
+    return None
+
+
+def _finish(df):
+    """Tipi canonici, esito H/D/A e scarto delle partite senza squadre o senza risultato."""
+    home = df["home"].astype("string").str.strip()
+    away = df["away"].astype("string").str.strip()
+    hs = _scores(df["home_score"])
+    as_ = _scores(df["away_score"])
+
+    # l'esito dichiarato dal file vince (es. tennis con ritiro); altrimenti dal punteggio
+    given = df["result"].astype("string").str.strip()
+    derived = pd.Series(np.select([hs > as_, hs < as_, hs == as_], ["H", "A", "D"], default=""),
+                        index=df.index).replace("", pd.NA).astype("string")
+    result = given.where(given.isin(RESULTS), derived)
+
+    out = pd.DataFrame({
+        "date": pd.to_datetime(df["date"], errors="coerce"),
+        "home": home,
+        "away": away,
+        "home_score": hs.round().astype("Int16"),
+        "away_score": as_.round().astype("Int16"),
+        "result": result,
+    })
+    for col in ODDS_COLUMNS:
+        if col in df.columns:
+            out[col] = _scores(df[col]).astype("float32")
+    keep = out["home"].notna() & out["away"].notna() & (out["home"] != "") & (out["away"] != "")
+    keep &= out["result"].notna() | (out["home_score"].notna() & out["away_score"].notna())
+    return out[keep].reset_index(drop=True)
+
+
+# --- Adapter per formato sorgente ---
+@adapter("football_data", ["HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR"])
+def _football_data(df):
+    """football-data.co.uk (calcio, NHL); nelle stagioni recenti il punteggio sta in FTR ('2 - 3')."""
+    hs, as_ = _scores(df["FTHG"]), _scores(df["FTAG"])
+    fhs, fas = _split_score(df["FTR"])
+    date = _dates(df["Date"], dayfirst=True) if "Date" in df.columns else pd.NaT
+    return _frame(date, df["HomeTeam"], df["AwayTeam"], hs.fillna(fhs), as_.fillna(fas), df["FTR"], _odds_1x2(df))
+
+
+@adapter("nfl_scores", ["Season", "Date", "HomeTeam", "AwayTeam", "HomeScore", "AwayScore"])
+def _nfl_scores(df):
+    """Date senza anno ('09/10'): la stagione NFL finisce a inizio dell'anno successivo."""
+    if "GameStatus" in df.columns:
+        df = df[df["GameStatus"] == "FINAL"]   # UPCOMING/CANCELLED hanno 0-0 fittizi
+    md = df["Date"].astype("string").str.extract(r"^(\d{1,2})/(\d{1,2})$").apply(_scores)
+    season = _scores(df["Season"])
+    year = season + (md[0] < 7).astype(int)
+    date = pd.to_datetime(pd.DataFrame({"year": year, "month": md[0], "day": md[1]}), errors="coerce")
+    return _frame(date, df["HomeTeam"], df["AwayTeam"], df["HomeScore"], df["AwayScore"], df.get("FTR"))
+
+
+@adapter("home_away_score", ["HomeTeam", "AwayTeam", "HomeScore", "AwayScore"])
+def _home_away_score(df):
+    """NCAA infomatch: solo stagione, nessuna data."""
+    date = _dates(df["Date"]) if "Date" in df.columns else pd.NaT
+    return _frame(date, df["HomeTeam"], df["AwayTeam"], df["HomeScore"], df["AwayScore"], df.get("FTR"))
+
+
+@adapter("home_away_points", ["HomeTeam", "AwayTeam", "HomePoints", "AwayPoints"])
+def _home_away_points(df):
+    """MLB (date ISO)."""
+    date = _dates(df["Date"]) if "Date" in df.columns else pd.NaT
+    return _frame(date, df["HomeTeam"], df["AwayTeam"], df["HomePoints"], df["AwayPoints"], df.get("FTR"))
+
+
+@adapter("fixturedownload", ["Home Team", "Away Team", "Result"])
+def _fixturedownload(df):
+    """fixturedownload.com (NBA): risultato '132 - 109', date gg/mm/aaaa hh:mm."""
+    hs, as_ = _split_score(df["Result"])
+    return _frame(_dates(df["Date"], dayfirst=True), df["Home Team"], df["Away Team"], hs, as_)
+
+
+@adapter("pfr_games", ["Winner/tie", "Loser/tie", "PtsW", "PtsL"])
+def _pfr_games(df):
+    """pro-football-reference: vincente/perdente, '@' nella colonna senza nome se il vincente era in trasferta."""
+    at = next((c for c in df.columns if str(c).startswith("Unnamed")
+               and df[c].astype("string").eq("@").any()), None)
+    away_won = df[at].astype("string").eq("@").fillna(False) if at else pd.Series(False, index=df.index)
+    home = df["Loser/tie"].where(away_won, df["Winner/tie"])
+    away = df["Winner/tie"].where(away_won, df["Loser/tie"])
+    hs = df["PtsL"].where(away_won, df["PtsW"])
+    as_ = df["PtsW"].where(away_won, df["PtsL"])
+    return _frame(_dates(df["Date"]), home, away, hs, as_)
+
+
+@adapter("tennis_sets", ["Tournament", "HomeTeam", "AwayTeam", "score"])
+def _tennis_sets(df):
+    """Jeff Sackmann ATP: HomeTeam = vincitore, punteggio = set vinti ('6-4 3-6 7-6(5)')."""
+    sets = df["score"].astype("string").str.extractall(r"(\d+)-(\d+)").apply(pd.to_numeric)
+    won = pd.DataFrame({"h": sets[0] > sets[1], "a": sets[0] < sets[1]}).groupby(level=0).sum()
+    won = won.reindex(df.index)
+    date = _dates(df["Date"].astype("string"), fmt="%Y%m%d")
+    return _frame(date, df["HomeTeam"], df["AwayTeam"], won["h"], won["a"], df.get("FTR"))
+
+
+def compact(df):
+    """
+    Rappresentazione compatta della tabella canonica: squadre come categorie
+    condivise tra home e away, esito e file sorgente categorici, punteggi
+    nel più piccolo intero nullable che li contiene.
+    """
+    teams = pd.Index(pd.concat([df["home"], df["away"]]).dropna().unique()).sort_values()
+    out = df.copy()
+    out["home"] = pd.Categorical(df["home"], categories=teams)
+    out["away"] = pd.Categorical(df["away"], categories=teams)
+    out["result"] = pd.Categorical(df["result"], categories=list(RESULTS))
+    if "source" in df.columns:
+        out["source"] = df["source"].astype("category")
+    for col in ("home_score", "away_score"):
+        top = df[col].max()
+        out[col] = df[col].astype("Int8" if pd.isna(top) or top < 128 else "Int16")
+    out["date"] = pd.to_datetime(df["date"]).astype("datetime64[s]")
+    return out
+
+
+def memory_mb(df) -> float:
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def log_unmatched(categoria: str, unmatched: dict):
+    """Un solo avviso per i file senza adapter (nome file → colonne trovate)."""
+    if not unmatched:
+        return
+    dettaglio = "; ".join(f"{f} {cols[:6]}" for f, cols in sorted(unmatched.items()))
+    logging.warning(f"⚠️ Storici {categoria}: {len(unmatched)} file senza adapter, ignorati: {dettaglio}")
@@ -0,0 +1,35 @@
+# Sport seguiti dal bot: nessun effetto collaterale all'import (lo usano anche le CLI)
+
+# Sports da analizzare
+SPORTS = {
+    "soccer_italy_serie_a": "⚽ Serie A - Italia",
+    "soccer_italy_serie_b": "⚽ Serie B - Italia",
+    "soccer_spain_la_liga": "⚽ La Liga - Spagna",
+    "soccer_spain_segunda_division": "⚽ La Liga 2 - Spagna",
+    "soccer_epl": "⚽ Premier League - Inghilterra",
+    "soccer_efl_champ": "⚽ Championship - Inghilterra",
+    "soccer_germany_bundesliga": "⚽ Bundesliga - Germania",
+    "soccer_germany_bundesliga2": "⚽ Bundesliga 2 - Germania",
+    "soccer_france_ligue_one": "⚽ Ligue 1 - Francia",
+    "soccer_france_ligue_two": "⚽ Ligue 2 - Francia",
+    "soccer_uefa_champs_league": "⚽ Champions League",
+    "soccer_uefa_europa_league": "⚽ Europa League",
+    "basketball_nba": "🏀 NBA",
+    "americanfootball_nfl": "🏈 NFL",
+    "americanfootball_ncaaf": "🏈 NCAA Football",
+    "baseball_mlb": "⚾ MLB - Baseball",
+    "icehockey_nhl": "NHL - Hockey USA",
+    "tennis_atp_shanghai_masters": "ATP Shanghai Masters",
+}
+
+# Priorità per il budget quota Odds API: > 0 = scaricati anche con quota bassa
+SPORT_PRIORITY = {
+    "soccer_italy_serie_a": 2,
+    "soccer_epl": 2,
+    "soccer_spain_la_liga": 1,
+    "soccer_germany_bundesliga": 1,
+    "soccer_uefa_champs_league": 2,
+    "soccer_uefa_europa_league": 1,
+    "basketball_nba": 1,
+    "americanfootball_nfl": 1,
+}
@@ -0,0 +1,247 @@
+# stand_in.py
+"""
+Stand-in locale dell'Odds API e di Telegram, per provare la pipeline senza
+spendere crediti né scrivere nella chat.
+
+    python stand_in.py record [--sports soccer_epl basketball_nba] [--out fixtures/odds]
+    python stand_in.py serve  [--fixtures fixtures/odds] [--synthetic 200] [--port 8765]
+
+record scarica le quote vere (ODDS_API_KEY) e le salva come fixture JSON,
+una per sport. serve le ripropone su /v4/sports/<sport>/odds con gli orari
+spostati in avanti di quanto tempo è passato dalla registrazione (le partite
+restano nella finestra di 48h), oppure genera un palinsesto sintetico; i
+messaggi inviati a /bot<token>/sendMessage vengono solo registrati e
+/bot<token>/getUpdates consegna i comandi messi in coda con push_command.
+Per puntarci il bot: ODDS_API_BASE=http://127.0.0.1:8765/v4 e
+TELEGRAM_API_BASE=http://127.0.0.1:8765.
+"""
+import os
+import re
+import json
+import time
+import argparse
+import datetime
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import odds_client
+from sports import SPORTS
+
+FIXTURES_DIR = os.getenv("FIXTURES_DIR", os.path.join("fixtures", "odds"))
+_ODDS_PATH = re.compile(r"^/v4/sports/([^/]+)/odds/?$")
+_TELEGRAM_PATH = re.compile(r"^/bot[^/]+/sendMessage$")
+_UPDATES_PATH = re.compile(r"^/bot[^/]+/getUpdates$")
+
+
+# --- Fixture ---
+def record(sports, out_dir: str = None, api_key: str = None) -> dict:
+    """Scarica le quote vere di ogni sport e le salva in <out_dir>/<sport>.json. Ritorna {sport: eventi}."""
+    out_dir = out_dir or FIXTURES_DIR
+    api_key = api_key or os.getenv("ODDS_API_KEY")
+    if not api_key:
+        raise SystemExit("ODDS_API_KEY mancante: serve per registrare le fixture.")
+    os.makedirs(out_dir, exist_ok=True)
+    saved = {}
+    for sport in sports:
+        data, metric = odds_client.fetch_odds(sport, api_key)
+        if metric["error"] is not None:
+            logging.warning(f"⚠️ {sport}: non registrato ({metric['error']}).")
+            continue
+        path = os.path.join(out_dir, f"{sport}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"sport": sport, "recorded_at": time.time(), "data": data}, f)
+        os.replace(path + ".tmp", path)
+        saved[sport] = data
+        logging.info(f"💾 {sport}: {len(data)} partite in {path}.")
+    return saved
+
+
+def load_fixtures(fixtures_dir: str = None, now: float = None) -> dict:
+    """
+    Fixture registrate → {sport: eventi}, con commence_time spostati di
+    (adesso - momento della registrazione).
+    """
+    fixtures_dir = fixtures_dir or FIXTURES_DIR
+    now = time.time() if now is None else now
+    out = {}
+    if not os.path.isdir(fixtures_dir):
+        return out
+    for name in sorted(os.listdir(fixtures_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(fixtures_dir, name), encoding="utf-8") as f:
+            fixture = json.load(f)
+        shift = datetime.timedelta(seconds=now - fixture.get("recorded_at", now))
+        events = []
+        for match in fixture["data"]:
+            match = dict(match)
+            try:
+                ct = datetime.datetime.fromisoformat(match["commence_time"].replace("Z", "+00:00")) + shift
+                match["commence_time"] = ct.strftime("%Y-%m-%dT%H:%M:%SZ")
+            except (KeyError, AttributeError, ValueError):
+                pass
+            events.append(match)
+        out[fixture.get("sport", name[:-5])] = events
+    return out
+
+
+def synthetic_slate(sports, n_events: int, bookmakers: int = 20, seed: int = 0, teams: dict = None) -> dict:
+    """
+    Palinsesto sintetico di n_events partite in totale, divise tra gli sport
+    (formato Odds API). teams: {sport: squadre} per usare nomi reali.
+    """
+    from benchmark import make_payload
+    sports = list(sports)
+    teams = teams or {}
+    per_sport, extra = divmod(n_events, len(sports))
+    return {s: make_payload(s, per_sport + (i < extra), bookmakers, seed=seed + i, teams=teams.get(s))
+            for i, s in enumerate(sports)}
+
+
+# --- Server ---
+class StandIn:
+    """
+    Server HTTP in un thread: quote da `odds` ({sport: eventi}) e Telegram
+    finto. Conta le richieste e tiene i messaggi ricevuti in `messages`;
+    push_command simula un utente che scrive al bot.
+    """
+
+    def __init__(self, odds: dict, host: str = "127.0.0.1", port: int = 0, remaining: int = 100000):
+        self.odds = odds
+        self.remaining = remaining
+        self.messages = []
+        self.updates = []
+        self.requests = {"odds": 0, "telegram": 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def odds_url(self) -> str:
+        return self.base_url + "/v4"
+
+    def push_command(self, text: str, chat_id: int = 1):
+        """Accoda un messaggio in arrivo, servito al prossimo getUpdates."""
+        with self._lock:
+            update_id = len(self.updates) + 1
+            self.updates.append({"update_id": update_id, "message": {
+                "message_id": update_id, "date": int(time.time()), "text": text,
+                "chat": {"id": chat_id, "type": "private"}}})
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):   # niente righe per richiesta su stderr
+                pass
+
+            def _reply(self, status: int, body, headers=None):
+                raw = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, str(v))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _get_updates(self, query):
+                offset = int(query.get("offset", ["0"])[0] or 0)
+                deadline = time.monotonic() + min(float(query.get("timeout", ["0"])[0]), 5.0)
+                while True:   # long polling breve: risponde appena arriva qualcosa
+                    with stand_in._lock:
+                        pending = [u for u in stand_in.updates if u["update_id"] >= offset]
+                    if pending or time.monotonic() >= deadline:
+                        return self._reply(200, {"ok": True, "result": pending})
+                    time.sleep(0.02)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if _UPDATES_PATH.match(url.path):
+                    return self._get_updates(parse_qs(url.query))
+                m = _ODDS_PATH.match(url.path)
+                if not m:
+                    return self._reply(404, {"message": "not found"})
+                query = parse_qs(url.query)
+                if not query.get("apiKey"):
+                    return self._reply(401, {"message": "apiKey mancante"})
+                sport = m.group(1)
+                cost = len(query.get("markets", ["h2h"])[0].split(",")) * len(query.get("regions", ["eu"])[0].split(","))
+                with stand_in._lock:
+                    stand_in.requests["odds"] += 1
+                    stand_in.remaining -= cost
+                    remaining = stand_in.remaining
+                self._reply(200, stand_in.odds.get(sport, []), {
+                    "x-requests-remaining": remaining, "x-requests-used": 100000 - remaining,
+                    "x-requests-last": cost,
+                })
+
+            def do_POST(self):
+                if not _TELEGRAM_PATH.match(urlparse(self.path).path):
+                    return self._reply(404, {"ok": False})
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._reply(400, {"ok": False, "description": "JSON non valido"})
+                with stand_in._lock:
+                    stand_in.requests["telegram"] += 1
+                    stand_in.messages.append(payload.get("text", ""))
+                self._reply(200, {"ok": True, "result": {"message_id": len(stand_in.messages)}})
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stand-in", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="registra le quote vere come fixture")
+    rec.add_argument("--sports", nargs="+", help="sport da registrare (default tutti quelli del bot)")
+    rec.add_argument("--out", default=FIXTURES_DIR)
+    srv = sub.add_parser("serve", help="serve fixture o palinsesto sintetico")
+    srv.add_argument("--fixtures", default=FIXTURES_DIR)
+    srv.add_argument("--synthetic", type=int, default=0, help="partite sintetiche al posto delle fixture")
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.sports or list(SPORTS), args.out)
+        return
+    odds = synthetic_slate(SPORTS, args.synthetic) if args.synthetic else load_fixtures(args.fixtures)
+    stand_in = StandIn(odds, args.host, args.port)
+    logging.info(f"🧪 Stand-in su {stand_in.base_url}: {sum(map(len, odds.values()))} partite, {len(odds)} sport.")
+    logging.info(f"   ODDS_API_BASE={stand_in.odds_url} TELEGRAM_API_BASE={stand_in.base_url}")
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info(f"🧪 Servite {stand_in.requests['odds']} richieste quote, {len(stand_in.messages)} messaggi Telegram.")
+
+
+if __name__ == "__main__":
+    main()
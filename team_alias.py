@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import logging
+import threading
+import unicodedata
+from rapidfuzz import fuzz, process
+
+# Alias risolti (nome Odds API → nome negli storici), condivisi tra i run
+ALIAS_CACHE = os.getenv("TEAM_ALIAS_CACHE", os.path.join("cache", "team_aliases.json"))
+ALIAS_MIN_SCORE = float(os.getenv("ALIAS_MIN_SCORE", "86"))  # soglia rapidfuzz (0-100)
+
+# Parole che non distinguono una squadra dall'altra
+_STOPWORDS = {"fc", "cf", "afc", "ac", "sc", "ss", "ssc", "as", "cd", "ud", "rcd", "sd", "club", "calcio",
+              "de", "the", "1909", "1846", "1899", "1904", "1907", "1913"}
+# Abbreviazioni di football-data.co.uk
+_EXPAND = {"man": "manchester", "utd": "united", "nott'm": "nottingham", "nottm": "nottingham",
+           "wolves": "wolverhampton", "spurs": "tottenham", "sheff": "sheffield", "st": "saint"}
+
+_cache_lock = threading.Lock()
+
+
+def normalize_name(name: str) -> str:
+    """'Nott'm Forest' → 'nottingham forest', 'Inter Milan' → 'inter milan', accenti tolti."""
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii").lower()
+    words = []
+    for w in re.split(r"[\s\.\-/&]+", text):
+        w = _EXPAND.get(w, w).replace("'", "")
+        if w and w not in _STOPWORDS:
+            words.append(w)
+    return " ".join(words)
+
+
+class AliasCache:
+    """File JSON {categoria: {nome api: nome storico}}, scritto in modo atomico."""
+
+    def __init__(self, path: str = None):
+        self.path = path or ALIAS_CACHE
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self._data = {}
+            except Exception as e:
+                logging.warning(f"⚠️ Cache alias squadre non leggibile: {e}")
+                self._data = {}
+        return self._data
+
+    def section(self, categoria: str) -> dict:
+        with _cache_lock:
+            return dict(self._load().get(categoria, {}))
+
+    def update(self, categoria: str, aliases: dict):
+        with _cache_lock:
+            data = self._load()
+            data.setdefault(categoria, {}).update(aliases)
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+                os.replace(self.path + ".tmp", self.path)
+            except Exception as e:
+                logging.warning(f"⚠️ Impossibile salvare cache alias squadre: {e}")
+
+
+class AliasResolver:
+    """
+    Nome squadra dell'Odds API → nome usato negli storici della categoria.
+    Ordine: nome identico, alias già noto (memoria o cache su disco), nome
+    normalizzato identico, infine ricerca fuzzy rapidfuzz una sola volta per
+    nome. Dopo la prima risoluzione ogni lookup è un accesso a dizionario.
+    """
+
+    def __init__(self, names, categoria: str = None, cache: AliasCache = None, min_score: float = None):
+        self.names = set(names)
+        self.categoria = categoria
+        self.cache = cache if cache is not None else (AliasCache() if categoria else None)
+        self.min_score = ALIAS_MIN_SCORE if min_score is None else min_score
+        self._by_norm = {}
+        for n in sorted(self.names):
+            self._by_norm.setdefault(normalize_name(n), n)
+        self._choices = list(self._by_norm)
+        self._memo = {}
+        if self.cache is not None:
+            # alias salvati ancora validi per gli storici attuali
+            self._memo = {k: v for k, v in self.cache.section(categoria).items() if v in self.names}
+        self.counters = {"fuzzy": 0, "matched": 0, "missed": 0}
+
+    def resolve(self, name):
+        if name in self.names:
+            return name
+        if name in self._memo:
+            return self._memo[name]
+        target = self._search(name)
+        self._memo[name] = target   # anche i mancati: nessuna nuova ricerca in questo run
+        if target is not None and self.cache is not None:
+            self.cache.update(self.categoria, {name: target})
+        return target
+
+    def _search(self, name):
+        norm = normalize_name(name)
+        if norm in self._by_norm:
+            self.counters["matched"] += 1
+            return self._by_norm[norm]
+        if not self._choices:
+            return None
+        self.counters["fuzzy"] += 1
+        found = process.extract(norm, self._choices, scorer=fuzz.token_set_ratio,
+                                score_cutoff=self.min_score, limit=3)
+        if not found:
+            self.counters["missed"] += 1
+            logging.info(f"🔎 Nessun alias per '{name}' negli storici {self.categoria or ''}.")
+            return None
+        # a parità di punteggio ('inter milan' ~ 'inter' e ~ 'milan') vince la prima parola
+        first = norm.split(" ")[0]
+        best = max(found, key=lambda m: (m[1], m[0].split(" ")[0] == first, fuzz.ratio(norm, m[0])))
+        self.counters["matched"] += 1
+        target = self._by_norm[best[0]]
+        logging.info(f"🔗 Alias squadra: '{name}' → '{target}' (score {best[1]:.0f}).")
+        return target
@@ -0,0 +1,134 @@
+import logging
+import math
+import pandas as pd
+
+from team_alias import AliasResolver
+
+# Colonne minime (tabella canonica di schema.py) per costruire l'indice
+REQUIRED_COLUMNS = {"home", "away", "home_score", "away_score", "result"}
+
+# Pesi di prob_csv: % vittorie casa, % non-vittorie ospite, differenza reti casa, differenza reti ospite
+PROB_CSV_WEIGHTS = (0.4, 0.2, 5, 5)
+
+
+class TeamStatsIndex:
+    """
+    Indice pre-calcolato delle statistiche per squadra e per campo.
+    Si costruisce una volta per ogni storico caricato: prob_csv e BTTS
+    diventano lookup su dizionari invece di scansioni del DataFrame.
+    """
+
+    def __init__(self, home: dict, away: dict, pairs: dict, categoria: str = None):
+        self.home = home    # squadra → statistiche in casa
+        self.away = away    # squadra → statistiche in trasferta
+        self.pairs = pairs  # (casa, trasferta) → scontri diretti
+        # nomi Odds API ("Inter Milan") → nomi degli storici ("Inter")
+        self.aliases = AliasResolver(set(home) | set(away), categoria)
+
+    @classmethod
+    def build(cls, hist_df, categoria: str = None):
+        """
+        Ritorna l'indice, o None se lo storico non ha le colonne richieste.
+        Con categoria gli alias trovati vengono salvati nella cache su disco.
+        """
+        if hist_df is None or hist_df.empty:
+            return None
+        if not REQUIRED_COLUMNS.issubset(hist_df.columns):
+            logging.info("ℹ️ Storico senza colonne canoniche home/away/home_score/away_score/result: indice squadre non creato.")
+            return None
+
+        df = pd.DataFrame({
+            "HomeTeam": hist_df["home"],
+            "AwayTeam": hist_df["away"],
+            "FTHG": pd.to_numeric(hist_df["home_score"], errors="coerce").astype("float64"),
+            "FTAG": pd.to_numeric(hist_df["away_score"], errors="coerce").astype("float64"),
+            "home_win": (hist_df["result"] == "H").fillna(False).astype(int),
+            "away_win": (hist_df["result"] == "A").fillna(False).astype(int),
+        })
+        df["btts"] = ((df["FTHG"] > 0) & (df["FTAG"] > 0)).astype(int)
+
+        agg = {
+            "games": ("btts", "size"),
+            "btts": ("btts", "sum"),
+            "hg_sum": ("FTHG", "sum"),
+            "hg_cnt": ("FTHG", "count"),
+            "ag_sum": ("FTAG", "sum"),
+            "ag_cnt": ("FTAG", "count"),
+        }
+        home = df.groupby("HomeTeam", sort=False, observed=True).agg(wins=("home_win", "sum"), **agg)
+        away = df.groupby("AwayTeam", sort=False, observed=True).agg(wins=("away_win", "sum"), **agg)
+        pairs = df.groupby(["HomeTeam", "AwayTeam"], sort=False, observed=True).agg(
+            games=("btts", "size"), btts=("btts", "sum")
+        )
+
+        return cls(
+            home.to_dict(orient="index"),
+            away.to_dict(orient="index"),
+            pairs.to_dict(orient="index"),
+            categoria,
+        )
+
+    def _union(self, home: str, away: str):
+        """
+        Statistiche delle partite con HomeTeam == home oppure AwayTeam == away,
+        cioè lo stesso sottoinsieme che analyze_matches filtrava sul DataFrame.
+        """
+        home = self.aliases.resolve(home)
+        away = self.aliases.resolve(away)
+        h = self.home.get(home)
+        a = self.away.get(away)
+        if h is None and a is None:
+            return None
+        p = self.pairs.get((home, away), {"games": 0, "btts": 0})
+        games = (h["games"] if h else 0) + (a["games"] if a else 0) - p["games"]
+        btts = (h["btts"] if h else 0) + (a["btts"] if a else 0) - p["btts"]
+        return h, a, games, btts
+
+    def prob_csv(self, home: str, away: str):
+        """Probabilità storica (0-100) con gli stessi pesi usati in analyze_matches."""
+        u = self._union(home, away)
+        if u is None:
+            return None
+        h, a, total_matches, _ = u
+
+        home_wins = h["wins"] if h else 0
+        away_wins = a["wins"] if a else 0
+        home_win_rate = (home_wins / total_matches) * 100 if total_matches > 0 else 0
+        away_win_rate = (away_wins / total_matches) * 100 if total_matches > 0 else 0
+
+        home_goals_scored   = _mean(h, "hg")
+        home_goals_conceded = _mean(h, "ag")
+        away_goals_scored   = _mean(a, "ag")
+        away_goals_conceded = _mean(a, "hg")
+
+        w_home, w_away, w_hgoals, w_agoals = PROB_CSV_WEIGHTS
+        prob_csv = (
+            (home_win_rate * w_home) +
+            ((100 - away_win_rate) * w_away) +
+            ((home_goals_scored - home_goals_conceded) * w_hgoals) +
+            ((away_goals_conceded - away_goals_scored) * w_agoals)
+        )
+        return max(0, min(100, prob_csv))
+
+    def games(self, home: str, away: str) -> int:
+        """Partite dello storico dietro prob_csv/btts_rate (0 = squadre sconosciute)."""
+        u = self._union(home, away)
+        return u[2] if u is not None else 0
+
+    def weight(self, home: str, away: str) -> int:
+        """Peso dello storico nella media col prior di lega: qui ogni partita vale uno."""
+        return self.games(home, away)
+
+    def btts_rate(self, home: str, away: str):
+        """Percentuale di partite in cui entrambe hanno segnato (None se nessuno storico)."""
+        u = self._union(home, away)
+        if u is None or u[2] <= 0:
+            return None
+        return round((u[3] / u[2]) * 100, 1)
+
+
+def _mean(stats, prefix: str) -> float:
+    # come Series.mean(): NaN se non ci sono valori
+    if not stats or not stats[f"{prefix}_cnt"]:
+        return math.nan
+    return stats[f"{prefix}_sum"] / stats[f"{prefix}_cnt"]
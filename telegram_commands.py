@@ -0,0 +1,171 @@
+import os
+import time
+import logging
+import threading
+import requests
+
+import telegram_queue
+from results_cache import ResultsCache
+from telegram_queue import TelegramQueue, BATCH_SEPARATOR
+
+# Comandi Telegram (/picks, /match, /sports) serviti dagli ultimi risultati in memoria, mai con nuove richieste Odds API
+TELEGRAM_COMMANDS = os.getenv("TELEGRAM_COMMANDS", "1") == "1"
+COMMANDS_POLL_SECONDS = int(os.getenv("COMMANDS_POLL_SECONDS", "30"))   # long polling di getUpdates
+COMMANDS_MAX_AGE = 300    # secondi: comandi arrivati a bot spento e più vecchi di così si ignorano
+COMMANDS_MAX_ITEMS = 10   # pronostici / partite per risposta
+
+HELP = (
+    "🤖 Comandi disponibili:\n"
+    "/picks <campionato> — pronostici in arrivo (es. /picks serie_a, /picks nba)\n"
+    "/picks — quanti pronostici per campionato\n"
+    "/match <squadra> — partite, quote migliori e pronostici (es. /match Inter)\n"
+    "/sports — campionati seguiti e ultimo aggiornamento\n"
+    "I dati sono quelli dell'ultimo controllo del bot."
+)
+
+
+class CommandBot:
+    """
+    Legge i messaggi con getUpdates (long polling) e risponde dai risultati
+    del job (ResultsCache). Le risposte sono memorizzate per (versione della
+    cache, minuto): la stessa domanda da più utenti costa una lookup.
+    """
+
+    def __init__(self, token: str, cache: ResultsCache, sports: dict, session=None, base_url: str = None):
+        self.token = token
+        self.cache = cache
+        self.sports = sports
+        self.session = session or requests.Session()
+        self.base_url = base_url or telegram_queue.TELEGRAM_API
+        self.sender = TelegramQueue(token, None, session=self.session, base_url=self.base_url, min_interval=0.0)
+        self.offset = None
+        self._memo = {}
+        self._memo_key = None
+
+    # --- risposte ---
+    def resolve_sport(self, query: str) -> list:
+        """"serie_a" → ["soccer_italy_serie_a"]: chiave esatta, poi suffisso, poi parte della chiave o del nome."""
+        q = query.strip().lower().replace(" ", "_")
+        if q in self.sports:
+            return [q]
+        for match in (lambda k: k.endswith("_" + q), lambda k: q in k,
+                      lambda k: query.strip().lower() in self.sports[k].lower()):
+            found = [k for k in self.sports if match(k)]
+            if found:
+                return found
+        return []
+
+    def reply(self, text: str) -> str:
+        parts = text.strip().split(maxsplit=1)
+        command = parts[0].split("@")[0].lower() if parts else ""   # /picks@NomeBot
+        arg = parts[1].strip() if len(parts) > 1 else ""
+        key = (self.cache.version, int(time.time() // 60))
+        if key != self._memo_key:
+            self._memo, self._memo_key = {}, key
+        memo_key = (command, arg.lower())
+        if memo_key not in self._memo:
+            handler = {"/picks": self._picks, "/match": self._match, "/sports": self._sports_status}.get(command)
+            self._memo[memo_key] = handler(arg) if handler else HELP
+        return self._memo[memo_key]
+
+    def _picks(self, arg: str) -> str:
+        if not self.cache.version:
+            return "⏳ Nessun risultato ancora: il primo controllo è in corso."
+        if not arg:
+            counts = [(s, n_picks) for s, (_, n_picks, _) in self.cache.sports().items() if n_picks]
+            if not counts:
+                return "ℹ️ Nessun pronostico per le partite in arrivo."
+            return "📋 Pronostici in arrivo:\n" + "\n".join(
+                f"{self.sports.get(s, s)}: {n} → /picks {s}" for s, n in sorted(counts, key=lambda x: -x[1]))
+        sports = self.resolve_sport(arg)
+        if not sports:
+            return f"❓ Campionato \"{arg}\" non trovato. /sports per l'elenco."
+        if len(sports) > 1:
+            return f"❓ \"{arg}\" è ambiguo: " + ", ".join(sports)
+        sport = sports[0]
+        picks = self.cache.picks(sport)
+        if not picks:
+            return f"ℹ️ {self.sports.get(sport, sport)}: nessun pronostico per le partite in arrivo."
+        text = BATCH_SEPARATOR.join(picks[:COMMANDS_MAX_ITEMS])
+        if len(picks) > COMMANDS_MAX_ITEMS:
+            text += f"\n\n… e altri {len(picks) - COMMANDS_MAX_ITEMS}: /match <squadra> per una partita."
+        return text
+
+    def _match(self, arg: str) -> str:
+        if not arg:
+            return "❓ Uso: /match <squadra>, es. /match Inter"
+        if not self.cache.version:
+            return "⏳ Nessun risultato ancora: il primo controllo è in corso."
+        q = arg.lower()
+        events = [e for e in self.cache.events() if q in e["home"].lower() or q in e["away"].lower()]
+        if not events:
+            return f"ℹ️ Nessuna partita in arrivo per \"{arg}\"."
+        blocks = []
+        for e in events[:COMMANDS_MAX_ITEMS]:
+            best = ", ".join(f"{name} {price} ({book})" for name, (price, book) in e["best"].items())
+            blocks.append(
+                f"{self.sports.get(e['sport'], e['sport'])}\n"
+                f"📌 {e['home']} vs {e['away']}\n"
+                f"📅 {e['start'].strftime('%d/%m/%Y %H:%M')}\n"
+                + (f"💰 Quote migliori: {best}\n" if best else "")
+                + (f"✅ {len(e['picks'])} pronostici:\n\n" + "\n\n".join(e["picks"]) if e["picks"]
+                   else "Nessun pronostico.")
+            )
+        return BATCH_SEPARATOR.join(blocks)
+
+    def _sports_status(self, arg: str = "") -> str:
+        status = self.cache.sports()
+        lines = []
+        for sport, label in self.sports.items():
+            if sport not in status:
+                lines.append(f"{label}: non ancora controllato")
+                continue
+            n_events, n_picks, updated_at = status[sport]
+            lines.append(f"{label}: {n_events} partite, {n_picks} pronostici "
+                         f"(aggiornato {(time.time() - updated_at) / 60:.0f} min fa)")
+        return "📡 Campionati seguiti:\n" + "\n".join(lines)
+
+    # --- getUpdates ---
+    def poll_once(self) -> int:
+        """Una chiamata getUpdates (attende fino a COMMANDS_POLL_SECONDS); ritorna i comandi gestiti."""
+        r = self.session.get(
+            f"{self.base_url}/bot{self.token}/getUpdates",
+            params={"offset": self.offset, "timeout": COMMANDS_POLL_SECONDS, "allowed_updates": '["message"]'},
+            timeout=COMMANDS_POLL_SECONDS + 10,
+        )
+        r.raise_for_status()
+        handled = 0
+        for update in r.json().get("result", []):
+            self.offset = update["update_id"] + 1
+            msg = update.get("message") or {}
+            text = msg.get("text") or ""
+            if not text.startswith("/") or time.time() - msg.get("date", 0) > COMMANDS_MAX_AGE:
+                continue
+            t0 = time.perf_counter()
+            answer = self.reply(text)
+            elapsed = (time.perf_counter() - t0) * 1000
+            self.sender.send_now(answer, msg["chat"]["id"])
+            logging.info(f"💬 {text.split()[0]} da chat {msg['chat']['id']}: risposta in {elapsed:.1f} ms.")
+            handled += 1
+        return handled
+
+    def run(self):
+        backoff = 1.0
+        while True:
+            try:
+                self.poll_once()
+                backoff = 1.0
+            except Exception as e:
+                logging.warning(f"⚠️ Comandi Telegram: getUpdates fallito ({e}), riprovo tra {backoff:.0f}s.")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+
+def start(token: str, cache: ResultsCache, sports: dict):
+    """Avvia il polling dei comandi in un thread daemon; None se disattivato o senza token."""
+    if not TELEGRAM_COMMANDS or not token:
+        return None
+    t = threading.Thread(target=CommandBot(token, cache, sports).run, name="telegram-commands", daemon=True)
+    t.start()
+    logging.info("💬 Comandi Telegram attivi: /picks, /match, /sports.")
+    return t
@@ -0,0 +1,178 @@
+import os
+import time
+import queue
+import logging
+import threading
+import requests
+
+TELEGRAM_API = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+MAX_MESSAGE_LEN = 4096                                                   # limite Telegram per sendMessage
+TELEGRAM_MIN_INTERVAL = float(os.getenv("TELEGRAM_MIN_INTERVAL", "1.0"))  # secondi tra due invii
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+BATCH_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LEN) -> list:
+    """Spezza un testo troppo lungo sulle righe (o a forza, se una riga supera il limite)."""
+    if len(text) <= limit:
+        return [text]
+    parts, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+class TelegramQueue:
+    """
+    Coda di invio verso Telegram servita da un thread in background.
+    - unisce più pronostici in un solo messaggio fino a MAX_MESSAGE_LEN;
+    - rispetta retry_after sui 429 e ritenta con backoff esponenziale;
+    - tiene contatori di invii, retry, scarti e latenza (accodamento → consegna).
+    """
+
+    def __init__(self, token: str, chat_id: str, session=None, base_url: str = None,
+                 min_interval: float = None, max_retries: int = None, linger: float = 0.5):
+        self.token = token
+        self.chat_id = chat_id
+        self.session = session or requests.Session()
+        self.base_url = base_url or TELEGRAM_API
+        self.min_interval = TELEGRAM_MIN_INTERVAL if min_interval is None else min_interval
+        self.max_retries = TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+        self.linger = linger   # attesa per raccogliere altri messaggi da accorpare
+        self._queue = queue.Queue()
+        self._carry = None
+        self._last_send = 0.0
+        self._worker = None
+        self._lock = threading.Lock()
+        self.counters = {"queued": 0, "sent": 0, "batches": 0, "retries": 0, "dropped": 0,
+                         "latency_total": 0.0, "latency_max": 0.0}
+
+    # --- API pubblica ---
+    def put(self, message: str):
+        for part in split_message(message):
+            self._queue.put((time.monotonic(), part))
+            self.counters["queued"] += 1
+        self._ensure_worker()
+
+    def send_now(self, text: str, chat_id=None) -> bool:
+        """Invio sincrono fuori dalla coda (es. risposte ai comandi), anche verso un'altra chat."""
+        return all([self._deliver(part, chat_id) for part in split_message(text)])
+
+    def flush(self, timeout: float = 120.0) -> bool:
+        """Attende che la coda sia svuotata (True) o che scada il timeout (False)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self) -> dict:
+        c = dict(self.counters)
+        c["pending"] = self._queue.unfinished_tasks
+        c["latency_avg"] = c["latency_total"] / c["sent"] if c["sent"] else 0.0
+        return c
+
+    def log_stats(self):
+        s = self.stats()
+        logging.info(
+            f"📨 Telegram: {s['sent']} messaggi in {s['batches']} invii, {s['retries']} retry, "
+            f"{s['dropped']} persi, {s['pending']} in coda | latenza media {s['latency_avg']:.1f}s, "
+            f"max {s['latency_max']:.1f}s"
+        )
+
+    # --- worker ---
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="telegram-queue", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self):
+        """Primo messaggio in attesa + quelli che entrano nello stesso invio."""
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch = [first]
+        length = len(first[1])
+        deadline = time.monotonic() + self.linger
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if length + len(BATCH_SEPARATOR) + len(item[1]) > MAX_MESSAGE_LEN:
+                self._carry = item   # non entra: apre il prossimo invio
+                break
+            batch.append(item)
+            length += len(BATCH_SEPARATOR) + len(item[1])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                text = BATCH_SEPARATOR.join(msg for _, msg in batch)
+                if self._deliver(text):
+                    now = time.monotonic()
+                    for queued_at, _ in batch:
+                        latency = now - queued_at
+                        self.counters["latency_total"] += latency
+                        self.counters["latency_max"] = max(self.counters["latency_max"], latency)
+                    self.counters["sent"] += len(batch)
+                    self.counters["batches"] += 1
+                else:
+                    self.counters["dropped"] += len(batch)
+            except Exception as e:
+                self.counters["dropped"] += len(batch)
+                logging.error(f"Errore Telegram: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, text: str, chat_id=None) -> bool:
+        url = f"{self.base_url}/bot{self.token}/sendMessage"
+        payload = {"chat_id": chat_id or self.chat_id, "text": text}
+        backoff = 1.0
+        for attempt in range(1, self.max_retries + 1):
+            wait = self.min_interval - (time.monotonic() - self._last_send)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                r = self.session.post(url, json=payload, timeout=10)
+                self._last_send = time.monotonic()
+                if r.status_code == 200:
+                    return True
+                if r.status_code == 429:
+                    try:
+                        retry_after = float(r.json().get("parameters", {}).get("retry_after", backoff))
+                    except ValueError:
+                        retry_after = backoff
+                    logging.warning(f"⏳ Telegram 429: riprovo tra {retry_after:.0f}s (tentativo {attempt}).")
+                    self.counters["retries"] += 1
+                    time.sleep(retry_after)
+                    continue
+                if 400 <= r.status_code < 500:
+                    logging.error(f"Errore Telegram: {r.text}")
+                    return False   # richiesta non valida: inutile ritentare
+                logging.warning(f"Errore Telegram {r.status_code}: {r.text}")
+            except Exception as e:
+                self._last_send = time.monotonic()
+                logging.warning(f"Errore Telegram: {e}")
+            self.counters["retries"] += 1
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+        logging.error(f"❌ Telegram: messaggio perso dopo {self.max_retries} tentativi.")
+        return False
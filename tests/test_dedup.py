@@ -0,0 +1,38 @@
+import datetime
+
+import pytest
+
+import bot
+from dedup_store import DedupStore
+from odds_history import OddsHistory
+
+
+def _payload(home_price: float, away_price: float):
+    start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    return [{
+        "id": "ev1",
+        "commence_time": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "home_team": "Boston Celtics",
+        "away_team": "New York Knicks",
+        "bookmakers": [{"key": "book", "title": "Book", "markets": [{"key": "h2h", "outcomes": [
+            {"name": "Boston Celtics", "price": home_price},
+            {"name": "New York Knicks", "price": away_price},
+        ]}]}],
+    }]
+
+
+@pytest.mark.parametrize("engine", ["loop", "vector"])
+def test_rejected_pick_does_not_block_a_later_accepted_one(monkeypatch, engine):
+    monkeypatch.setattr(bot, "ANALYSIS_ENGINE", engine)
+    monkeypatch.setattr(bot, "sent_predictions", DedupStore(":memory:"))
+    monkeypatch.setattr(bot, "odds_history", OddsHistory(":memory:"))
+    sport = "basketball_nba"
+
+    accepted, rejected = bot.analyze_matches(sport, _payload(1.90, 2.00))   # 52.6% < MIN_PROB
+    assert accepted == [] and len(rejected) == 1
+
+    accepted, rejected = bot.analyze_matches(sport, _payload(1.55, 3.00))   # 64.5%, quota 1.55
+    assert [key for key, _ in accepted] == [("Boston Celtics", "New York Knicks")]
+
+    accepted, rejected = bot.analyze_matches(sport, _payload(1.55, 3.00))   # già inviato
+    assert accepted == [] and rejected == []
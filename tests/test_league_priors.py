@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from league_priors import LeaguePriors
+
+SPORT = "soccer_epl"
+
+
+def _priors():
+    table = pd.DataFrame([{"league": SPORT, "home_win_rate": 45.0, "draw_rate": 25.0, "away_win_rate": 30.0,
+                           "over25_rate": 52.0, "btts_rate": 50.0}]).set_index("league")
+    return LeaguePriors(table, min_games=20, strength=10)
+
+
+def test_home_outcome_blends_prob_csv_with_prior():
+    priors = _priors()
+    prior = priors.prior(SPORT, "h2h", "Arsenal", home="Arsenal", away="Chelsea")
+    same = priors.team_outcome("h2h", "Arsenal", "Arsenal")
+    prob, tier = priors.apply(80.0, 10, prior, same_outcome=same)
+    assert tier == "misto"
+    assert prob == (10 * 80.0 + 10 * 45.0) / 20
+
+
+def test_away_outcome_uses_prior_alone():
+    priors = _priors()
+    prior = priors.prior(SPORT, "h2h", "Chelsea", home="Arsenal", away="Chelsea")
+    same = priors.team_outcome("h2h", "Chelsea", "Arsenal")
+    assert not same
+    for n_games in (5, 50):
+        assert priors.apply(80.0, n_games, prior, same_outcome=same) == (30.0, "lega")
+
+
+def test_vector_matches_scalar():
+    priors = _priors()
+    market = ["h2h", "h2h", "h2h", "totals"]
+    outcome = ["Arsenal", "Chelsea", "Draw", "Over"]
+    point = [np.nan, np.nan, np.nan, 2.5]
+    home, away = ["Arsenal"] * 4, ["Chelsea"] * 4
+    prior = priors.prior_vector(SPORT, market, outcome, point, home, away)
+    same = priors.team_outcome_vector(market, outcome, home)
+    got = priors.apply_vector([80.0] * 4, [10] * 4, prior, None, same)
+    want = [priors.apply(80.0, 10, priors.prior(SPORT, m, o, None if np.isnan(p) else p, h, a),
+                         same_outcome=priors.team_outcome(m, o, h))[0]
+            for m, o, p, h, a in zip(market, outcome, point, home, away)]
+    assert list(got) == want
@@ -0,0 +1,30 @@
+import pandas as pd
+
+import schema
+
+
+def test_football_data_iso_dates_are_not_dayfirst():
+    raw = pd.DataFrame({
+        "Date": ["2025-05-12", "2025-05-19", "2025-01-03"],
+        "HomeTeam": ["Winnipeg Jets", "Dallas Stars", "Florida Panthers"],
+        "AwayTeam": ["Dallas Stars", "Winnipeg Jets", "Toronto Maple Leafs"],
+        "FTHG": [3, 1, 2],
+        "FTAG": [2, 1, 4],
+        "FTR": ["H", "D", "A"],
+    })
+    df, adapter = schema.normalize(raw)
+    assert adapter == "football_data"
+    assert list(df["date"]) == [pd.Timestamp("2025-05-12"), pd.Timestamp("2025-05-19"), pd.Timestamp("2025-01-03")]
+
+
+def test_football_data_slash_dates_stay_dayfirst():
+    raw = pd.DataFrame({
+        "Date": ["05/12/2024", "12/05/2025"],
+        "HomeTeam": ["Inter", "Milan"],
+        "AwayTeam": ["Milan", "Inter"],
+        "FTHG": [1, 0],
+        "FTAG": [0, 0],
+        "FTR": ["H", "D"],
+    })
+    df, _ = schema.normalize(raw)
+    assert list(df["date"]) == [pd.Timestamp("2024-12-05"), pd.Timestamp("2025-05-12")]